@@ -1,4 +1,5 @@
 import os
+import sys
 import logging
 import gc
 from pathlib import Path
@@ -194,6 +195,9 @@ TEMPERATURE = float(os.getenv("GROQ_TEMPERATURE", 0.7))
 CONTENT_PATH = os.getenv("CONTENT_PATH_LINKEDIN", "./content_linkedin")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-MiniLM-L3-v2")
 FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR_LINKEDIN", "index_faiss_linkedin")
+# Serviço de recuperação compartilhado (huggingface_space/retrieval_service.py); vazio = FAISS em processo
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL", "")
+RETRIEVAL_INDEX_NAME = os.getenv("RETRIEVAL_INDEX_NAME", "linkedin")
 
 # -------------------------
 # LLM loader
@@ -239,6 +243,17 @@ def extract_text_pdf(file_path):
 # -------------------------
 def config_retriever(folder_path: str = CONTENT_PATH):
     try:
+        # Serviço compartilhado: um único processo com o modelo de embeddings atende todos os apps
+        if RETRIEVAL_SERVICE_URL:
+            sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "huggingface_space"))
+            try:
+                from retrieval_client import RemoteRetriever
+            except ImportError:
+                logger.warning("retrieval_client indisponível (huggingface_space fora do deploy): usando FAISS local")
+            else:
+                logger.info(f"Usando serviço de recuperação em {RETRIEVAL_SERVICE_URL} (índice '{RETRIEVAL_INDEX_NAME}')")
+                return RemoteRetriever(service_url=RETRIEVAL_SERVICE_URL, index_name=RETRIEVAL_INDEX_NAME, k=3, fetch_k=4)
+
         # Verificar se índice FAISS já existe (otimização para cold start)
         faiss_path = Path(FAISS_INDEX_DIR)
         if faiss_path.exists() and (faiss_path / "index.faiss").exists():
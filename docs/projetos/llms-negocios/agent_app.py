@@ -1,4 +1,5 @@
 import os
+import sys
 import logging
 from pathlib import Path
 from typing import List, Dict, Any
@@ -208,6 +209,17 @@ TEMPERATURE = float(os.getenv("GROQ_TEMPERATURE", 0.7))
 CONTENT_PATH = os.getenv("CONTENT_PATH", "/content")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")  # or sentence-transformers/all-mpnet-base-v2
 FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "index_faiss")
+# Serviço de recuperação compartilhado (huggingface_space/retrieval_service.py); vazio = FAISS em processo
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL", "")
+RETRIEVAL_INDEX_NAME = os.getenv("RETRIEVAL_INDEX_NAME", "safebank")
+
+# Módulos compartilhados do huggingface_space (chunking, dedup, cliente do serviço de recuperação).
+# Só existem no repositório completo: a imagem do Cloud Run (DEPLOY.md) copia apenas esta pasta,
+# e aí o app volta ao splitter original e ao índice local.
+_APP_PARENTS = Path(__file__).resolve().parents
+SHARED_DIR = _APP_PARENTS[3] / "huggingface_space" if len(_APP_PARENTS) > 3 else None
+if SHARED_DIR is not None and SHARED_DIR.is_dir() and str(SHARED_DIR) not in sys.path:
+    sys.path.insert(0, str(SHARED_DIR))
 
 # -------------------------
 # LLM loader
@@ -264,6 +276,16 @@ def config_retriever(folder_path: str = CONTENT_PATH):
     Retorna um retriever (objeto com get_relevant_documents).
     """
     try:
+        # Serviço compartilhado: um único processo com o modelo de embeddings atende todos os apps
+        if RETRIEVAL_SERVICE_URL:
+            try:
+                from retrieval_client import RemoteRetriever
+            except ImportError:
+                logger.warning("retrieval_client indisponível (huggingface_space fora da imagem): usando FAISS local")
+            else:
+                logger.info(f"Usando serviço de recuperação em {RETRIEVAL_SERVICE_URL} (índice '{RETRIEVAL_INDEX_NAME}')")
+                return RemoteRetriever(service_url=RETRIEVAL_SERVICE_URL, index_name=RETRIEVAL_INDEX_NAME, k=3, fetch_k=4)
+
         docs_path = Path(folder_path)
         
         # Validar se o diretório existe
@@ -281,16 +303,35 @@ def config_retriever(folder_path: str = CONTENT_PATH):
             st.info("💡 Adicione arquivos PDF na pasta para começar.")
             st.stop()
 
-        # Carrega e concatena textos
-        logger.info("Processando documentos PDF...")
-        loaded_documents = [extract_text_pdf(pdf) for pdf in pdf_files]
-
-        # Splitter
-        logger.info("Criando chunks de texto...")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = []
-        for doc_text in loaded_documents:
-            chunks.extend(text_splitter.split_text(doc_text))
+        try:
+            from chunk_dedup import DEDUP_ENABLED, dedup_chunks
+            from chunking import chunk_pdfs, chunking_params, retrieval_params, write_index_meta
+            from index_partitions import build_partitions, partition_summary
+            shared = True
+        except ImportError:
+            logger.warning("Módulos do huggingface_space indisponíveis: splitter padrão 1000/200, sem dedup")
+            shared = False
+
+        dedup_report = None
+        if shared:
+            # Extração + splitter: mesmos parâmetros gravados no index_meta.json pelo chunk_tuner/builders.
+            # O retriever do LangChain usado aqui não expande filhos em pais: sempre chunks simples
+            chunking = {**chunking_params(FAISS_INDEX_DIR), "child_chunk_size": 0}
+            logger.info(f"Processando documentos PDF e criando chunks ({chunking})...")
+            chunks, metadatas = chunk_pdfs(pdf_files, chunking, extract_text_pdf)
+            positions = range(len(chunks))
+            # Cabeçalhos/rodapés repetidos viram um único chunk com referências às ocorrências
+            if DEDUP_ENABLED:
+                chunks, metadatas, positions, dedup_report = dedup_chunks(chunks, metadatas)
+        else:
+            logger.info("Processando documentos PDF e criando chunks...")
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+            chunks, metadatas = [], []
+            for pdf in pdf_files:
+                pdf_chunks = text_splitter.split_text(extract_text_pdf(pdf))
+                chunks.extend(pdf_chunks)
+                metadatas.extend({"source": pdf.name} for _ in pdf_chunks)
+            positions = range(len(chunks))
         logger.info(f"Total de {len(chunks)} chunks criados")
 
         # Embeddings
@@ -299,14 +340,21 @@ def config_retriever(folder_path: str = CONTENT_PATH):
 
         # Vectorstore (FAISS)
         logger.info("Criando índice FAISS...")
-        vectorstore = FAISS.from_texts(chunks, embedding=embeddings)
+        vectorstore = FAISS.from_texts(
+            chunks, embedding=embeddings, metadatas=metadatas, ids=[f"chunk-{p}" for p in positions]
+        )
 
         # Persistir index local
         vectorstore.save_local(FAISS_INDEX_DIR)
+        search_kwargs = {"k": 3, "fetch_k": 4}
+        if shared:
+            write_index_meta(FAISS_INDEX_DIR, chunking, EMBEDDING_MODEL, len(chunks), dedup=dedup_report,
+                             partitions=partition_summary(build_partitions(vectorstore)))
+            search_kwargs = retrieval_params(FAISS_INDEX_DIR)
         logger.info(f"Índice salvo em: {FAISS_INDEX_DIR}")
 
         # Criar retriever (objeto compatível com get_relevant_documents)
-        retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 3, "fetch_k": 4})
+        retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs=search_kwargs)
         logger.info("Retriever configurado com sucesso")
 
         return retriever
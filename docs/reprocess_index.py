@@ -1,10 +1,14 @@
 """Script para reprocessar índice FAISS com modelo de embeddings menor"""
 import os
+import sys
 from pathlib import Path
 from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+
+# Embeddings por lotes de comprimento compartilhados com o create_index do HF Space
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "huggingface_space"))
+from chunking import chunking_params, index_chunks, save_parents, write_index_meta
+from index_embedding import build_vectorstore, EMBED_MEMORY_BUDGET_MB
 
 # Configurar modelo menor
 EMBEDDING_MODEL = "sentence-transformers/paraphrase-MiniLM-L3-v2"
@@ -19,19 +23,14 @@ pdf_files = list(docs_path.glob("*.pdf"))
 print(f"📄 Encontrados {len(pdf_files)} arquivos PDF")
 
 # Extrair texto
-loaded_documents = []
-for pdf in pdf_files:
+def extract_text(pdf):
     loader = PyMuPDFLoader(str(pdf))
     pages = loader.load()
-    content = "\n".join([p.page_content for p in pages])
-    loaded_documents.append(content)
-print(f"✅ PDFs carregados")
-
-# Criar chunks
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-chunks = []
-for doc_text in loaded_documents:
-    chunks.extend(text_splitter.split_text(doc_text))
+    return "\n".join([p.page_content for p in pages])
+
+# Criar chunks (na estratégia layout, direto dos blocos do PDF, com página e seção)
+chunking = chunking_params(FAISS_INDEX_DIR)
+chunks, metadatas, parents = index_chunks(pdf_files, chunking, extract_text)
 print(f"✅ {len(chunks)} chunks criados")
 
 # Criar embeddings com modelo menor
@@ -40,12 +39,19 @@ embeddings = HuggingFaceEmbeddings(
     model_name=EMBEDDING_MODEL,
     cache_folder="./cache",
     model_kwargs={'device': 'cpu'},
-    encode_kwargs={'batch_size': 1, 'show_progress_bar': True}
+    encode_kwargs={'show_progress_bar': False}
 )
 
 # Criar e salvar índice FAISS
 print("💾 Criando índice FAISS...")
-vectorstore = FAISS.from_texts(chunks, embedding=embeddings)
+vectorstore, report = build_vectorstore(chunks, embeddings, EMBED_MEMORY_BUDGET_MB, metadatas=metadatas)
+print(f"⚡ {report['bucketed']['chunks_per_sec']:.1f} chunks/s em {report['bucketed']['batches']} lotes")
+if "dedup" in report:
+    print(f"🧹 {report['dedup']['duplicates']} chunks quase duplicados removidos "
+          f"(~{report['dedup']['embed_seconds_saved']:.1f}s de embedding economizados)")
 vectorstore.save_local(FAISS_INDEX_DIR)
+save_parents(FAISS_INDEX_DIR, parents)
+write_index_meta(FAISS_INDEX_DIR, chunking, EMBEDDING_MODEL, vectorstore.index.ntotal,
+                 dedup=report.get("dedup"), parents=len(parents), partitions=report["partitions"])
 print(f"✅ Índice salvo em: {FAISS_INDEX_DIR}")
 print("🎉 Reprocessamento concluído!")
@@ -0,0 +1,255 @@
+"""
+Backend HTTP (ASGI) do assistente de currículo, independente do script do Streamlit
+O app Streamlit (com RAG_BACKEND_URL), as páginas estáticas e o load test usam o mesmo pipeline
+
+Uso:
+    GROQ_API_KEY=... python api_server.py --workers 4 --port 8000
+    # ou: uvicorn api_server:app --workers 4 --port 8000
+
+Endpoints:
+    POST /chat      -> {"question", "language", "session_id", "history"} => SSE:
+                       token* (chunks da resposta), done (resposta + debug) e state (histórico com o
+                       turno novo); o stream fecha logo depois do state
+    POST /retrieve  -> {"query"} => chunks recuperados com metadados
+    GET  /health    -> status, modelo, versão do índice e sessões ativas no worker
+    GET  /metrics   -> métricas no formato texto do Prometheus
+
+A API não guarda o histórico entre requisições: o cliente reenvia o "state" recebido na
+resposta anterior, então qualquer worker atende qualquer sessão. O resumo dos turnos antigos
+termina em background depois que o stream fecha; se a próxima pergunta da sessão chega ao
+mesmo worker com esse state, ela já usa (e devolve) o histórico resumido.
+"""
+import os
+import json
+import asyncio
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Literal, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+# Limitar threads de OMP/MKL pela cota de CPU antes de qualquer import do torch
+from runtime_tuning import apply_thread_env
+apply_thread_env()
+
+from cancellation import submit_session_task
+from history_manager import HistoryManager
+from logging_setup import setup_logging
+from memory_governor import get_governor
+from profiling import PROFILE_QUERY_PARAM
+from rag_core import (
+    CONTENT_PATH,
+    ID_MODEL,
+    SessionState,
+    chat_llm_flow,
+    get_llm,
+    index_version,
+    load_retriever,
+    refresh_faq,
+)
+from tracing import REGISTRY, span
+
+logger = logging.getLogger("api_server")
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", 8000))
+API_WORKERS = int(os.getenv("API_WORKERS", 1))
+# Origens autorizadas (site estático, docs); "*" libera todas
+API_CORS_ORIGINS = os.getenv("API_CORS_ORIGINS", "*")
+# Sessões por worker lembradas para cancelar a pergunta anterior da mesma sessão
+API_MAX_SESSIONS = int(os.getenv("API_MAX_SESSIONS", 1000))
+
+ACTIVE_STREAMS = REGISTRY.gauge("rag_api_active_streams", "Respostas SSE em andamento no worker")
+
+
+class ChatRequest(BaseModel):
+    question: str = Field(..., max_length=5000)
+    language: Literal["pt", "en"] = "pt"
+    session_id: Optional[str] = None
+    # "state" devolvido pela resposta anterior: {"summary", "messages": [{"role", "content"}]}
+    history: Optional[Dict] = None
+    # Só tem efeito com PROFILE_QUERY_PARAM=1 (como o ?profile=1 do app)
+    profile: bool = False
+
+
+class RetrieveRequest(BaseModel):
+    query: str = Field(..., max_length=5000)
+
+
+# -------------------------
+# Sessões (só para cancelamento; o histórico vem do cliente)
+# -------------------------
+_sessions: "OrderedDict[str, Dict]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def session_slot(session_id: Optional[str]) -> Dict:
+    """
+    Dicionário da sessão com a tarefa ativa (submit_session_task cancela a anterior) e o
+    histórico da última resposta ("history", com o resumo em background) e o state enviado dele
+    """
+    if not session_id:
+        return {}
+    with _sessions_lock:
+        slot = _sessions.pop(session_id, None) or {}
+        _sessions[session_id] = slot
+        while len(_sessions) > API_MAX_SESSIONS:
+            _sessions.popitem(last=False)
+        return slot
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# -------------------------
+# App
+# -------------------------
+_resources = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    if not os.getenv("GROQ_API_KEY"):
+        raise RuntimeError("GROQ_API_KEY não configurada")
+    get_governor()
+    # Cada worker carrega seu retriever; com RETRIEVAL_SERVICE_URL o modelo de embeddings fica em um só processo
+    _resources["retriever"] = await run_in_threadpool(load_retriever, CONTENT_PATH)
+    _resources["llm"] = await run_in_threadpool(get_llm)
+    await run_in_threadpool(refresh_faq, _resources["retriever"], _resources["llm"])
+    logger.info(f"Worker {os.getpid()} pronto")
+    yield
+
+
+app = FastAPI(title="Assistente de Currículo - RAG API", lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[o.strip() for o in API_CORS_ORIGINS.split(",") if o.strip()],
+    allow_methods=["GET", "POST"],
+    allow_headers=["*"],
+)
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok" if "retriever" in _resources else "starting",
+        "model": ID_MODEL,
+        "index_version": await run_in_threadpool(index_version),
+        "worker": os.getpid(),
+        "sessions": len(_sessions),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return REGISTRY.render()
+
+
+@app.post("/retrieve")
+async def retrieve(body: RetrieveRequest):
+    retriever = _resources.get("retriever")
+    if retriever is None:
+        raise HTTPException(status_code=503, detail="Índice ainda carregando")
+
+    def search():
+        with span("retrieval"):
+            return retriever.invoke(body.query)
+
+    docs = await run_in_threadpool(search)
+    return {
+        "query": body.query,
+        "results": [{"content": d.page_content, "metadata": d.metadata} for d in docs],
+    }
+
+
+@app.post("/chat")
+async def chat(body: ChatRequest, request: Request):
+    if "retriever" not in _resources:
+        raise HTTPException(status_code=503, detail="Índice ainda carregando")
+    return StreamingResponse(
+        chat_events(body, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def chat_events(body: ChatRequest, request: Request):
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slot = session_slot(body.session_id)
+    if body.history and slot.get("state") == body.history:
+        # Continuação da última resposta deste worker: o resumo terminado em background já vale
+        history = slot["history"]
+    else:
+        history = HistoryManager.from_payload(body.history)
+    state = SessionState(history_manager=history, chat_history=list(history.messages))
+
+    def on_token(chunk: str):
+        loop.call_soon_threadsafe(queue.put_nowait, chunk)
+
+    def flow():
+        # FAQ gerada para outro índice (ex.: serviço de recuperação reindexado): regenera em background
+        refresh_faq(_resources["retriever"], _resources["llm"])
+        return chat_llm_flow(
+            _resources["retriever"], body.question, body.language, llm=_resources["llm"],
+            session_state=state, profile=body.profile and PROFILE_QUERY_PARAM, on_token=on_token,
+        )
+
+    task = submit_session_task(slot, flow)
+    result = asyncio.wrap_future(task.future)
+    # Chega depois dos chunks já enfileirados (mesma ordem do call_soon_threadsafe)
+    result.add_done_callback(lambda _: queue.put_nowait(None))
+    ACTIVE_STREAMS.inc()
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield sse("token", {"text": chunk})
+
+        try:
+            answer, debug = result.result()
+        except Exception as e:
+            logger.error(f"Erro no /chat: {e}")
+            yield sse("error", {"error": str(e)})
+            return
+        if debug.get("cancelled"):
+            yield sse("cancelled", {})
+            return
+        yield sse("done", {"answer": answer, **debug})
+        # Estado já com o turno novo; o stream fecha sem esperar o resumo, que continua em
+        # background e chega ao cliente no state da próxima pergunta
+        state_payload = history.to_payload()
+        if body.session_id:
+            slot["history"], slot["state"] = history, state_payload
+        yield sse("state", state_payload)
+    finally:
+        # Cliente desconectou (ou nova pergunta da sessão): interrompe a geração
+        if not task.done():
+            task.cancel()
+        ACTIVE_STREAMS.dec()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Backend HTTP do assistente de currículo")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    args = parser.parse_args()
+
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
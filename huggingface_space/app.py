@@ -1,140 +1,64 @@
 import os
+import uuid
 import logging
-import gc
-from pathlib import Path
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-# LangChain core pieces
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import AIMessage, HumanMessage
+# Limitar threads de OMP/MKL pela cota de CPU antes de qualquer import do torch
+from runtime_tuning import apply_thread_env
+apply_thread_env()
 
-# LLM provider (Groq)
-from langchain_groq import ChatGroq
+from langchain_core.messages import AIMessage, HumanMessage
 
-# Document handling / splits / embeddings / vectorstore
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from rag_core import (
+    TRANSLATIONS,
+    CONTENT_PATH,
+    load_llm,
+    load_retriever,
+    chat_llm_flow,
+    refresh_faq,
+)
+from backend_client import BackendClient
+from cancellation import submit_session_task
+from faq_store import SUGGESTED_QUESTIONS
+from logging_setup import setup_logging
+from memory_governor import get_governor
+from profiling import query_param_requested
+from tracing import record_cache, span, start_metrics_server
 
 # -------------------------
 # Logging config
 # -------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app_linkedin.log'),
-        logging.StreamHandler()
-    ]
-)
+# Fila + thread de escrita: arquivo rotativo em JSON, sem I/O de disco no caminho da resposta
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Endpoint /metrics em thread lateral quando METRICS_PORT está definido (uma vez por processo)
+start_metrics_server()
+# RSS amostrado em background; coleta só sob pressão de memória (MEMORY_BUDGET_MB / cgroup)
+get_governor()
+
+# Com o backend HTTP (api_server.py) a UI é só cliente: sem LLM nem índice neste processo
+BACKEND_URL = os.getenv("RAG_BACKEND_URL", "")
+
 # -------------------------
 # Validações de ambiente
 # -------------------------
 # HuggingFace Spaces disponibiliza secrets como variáveis de ambiente
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-if not groq_api_key:
+if not groq_api_key and not BACKEND_URL:
     logger.error("GROQ_API_KEY não encontrada")
     # Idioma padrão para erro de configuração
     st.error("⚠️ Configuração incompleta: GROQ_API_KEY não configurada. Configure em Settings → Repository secrets")
     st.error("⚠️ Incomplete configuration: GROQ_API_KEY not set. Configure in Settings → Repository secrets")
     st.stop()
 
-os.environ["GROQ_API_KEY"] = groq_api_key
-
-# -------------------------
-# Multilingual Support
-# -------------------------
-TRANSLATIONS = {
-    "pt": {
-        "page_title": "Thiago Milanez - Assistente Virtual 💼",
-        "main_title": "💼 Assistente Virtual de Currículo",
-        "subtitle": "Converse comigo para saber mais sobre a experiência profissional de Thiago Milanez",
-        "language": "🌐 Idioma",
-        "about_title": "ℹ️ Sobre este Assistente",
-        "about_text": "Sou um assistente de IA que responde perguntas sobre o currículo e experiência profissional de **Thiago Milanez C Pinheiro**.",
-        "features_title": "✨ Recursos",
-        "feature1": "💬 Conversação natural",
-        "feature2": "📄 Baseado no CV real",
-        "feature3": "⚡ Respostas em < 1 segundo",
-        "feature4": "🎯 Informações precisas",
-        "tech_title": "🛠️ Tecnologias",
-        "portfolio_button": "🏠 Voltar ao Portfólio",
-        "chat_placeholder": "Pergunte sobre a experiência profissional de Thiago...",
-        "loading_index": "🔄 Carregando índice FAISS...",
-        "processing": "🤖 Processando sua pergunta...",
-        "error_config": "⚠️ Configuração incompleta: GROQ_API_KEY não configurada. Configure em Settings → Repository secrets",
-        "error_llm": "⚠️ Erro ao conectar com o serviço de IA:",
-        "error_docs": "⚠️ Erro ao processar documentos:",
-        "no_info": "Essa informação específica não está disponível no meu currículo atual. Posso ajudar com outras questões sobre minha experiência profissional.",
-        "welcome_msg": "👋 Olá! Sou o assistente virtual de Thiago Milanez. Posso responder perguntas sobre experiência profissional, projetos, habilidades técnicas e formação acadêmica. Como posso ajudar?",
-        "system_prompt_qa": """Você é um assistente virtual profissional representando Thiago Milanez C Pinheiro.
-
-INSTRUÇÕES CRÍTICAS:
-1. Use EXCLUSIVAMENTE as informações encontradas no CONTEXTO abaixo
-2. NÃO invente, suponha ou adicione informações que não estejam no contexto
-3. Se a informação não estiver no contexto, responda: "Essa informação específica não está disponível no meu currículo atual. Posso ajudar com outras questões sobre minha experiência profissional."
-4. Seja objetivo, profissional e cite apenas fatos concretos do contexto
-5. Para perguntas técnicas, mencione SOMENTE tecnologias e projetos listados no contexto
-6. Responda em primeira pessoa como se fosse o próprio Thiago
-7. Mantenha respostas concisas (máximo 5-7 linhas), focando no essencial
-
-CONTEXTO DO CURRÍCULO:
-{context}
-
-PERGUNTA DO RECRUTADOR: {input}
-
-RESPOSTA (baseada APENAS no contexto acima):""",
-        "context_system_prompt": "Given the following chat history and the follow-up question which might reference context in the chat history, formulate a standalone question which can be understood without the chat history. Do NOT answer the question, only reformulate it if needed; otherwise return it as-is."
-    },
-    "en": {
-        "page_title": "Thiago Milanez - Virtual Assistant 💼",
-        "main_title": "💼 CV Virtual Assistant",
-        "subtitle": "Chat with me to learn more about Thiago Milanez's professional experience",
-        "language": "🌐 Language",
-        "about_title": "ℹ️ About this Assistant",
-        "about_text": "I am an AI assistant that answers questions about **Thiago Milanez C Pinheiro**'s resume and professional experience.",
-        "features_title": "✨ Features",
-        "feature1": "💬 Natural conversation",
-        "feature2": "📄 Based on real CV",
-        "feature3": "⚡ Answers in < 1 second",
-        "feature4": "🎯 Accurate information",
-        "tech_title": "🛠️ Technologies",
-        "portfolio_button": "🏠 Back to Portfolio",
-        "chat_placeholder": "Ask about Thiago's professional experience...",
-        "loading_index": "🔄 Loading FAISS index...",
-        "processing": "🤖 Processing your question...",
-        "error_config": "⚠️ Incomplete configuration: GROQ_API_KEY not set. Configure in Settings → Repository secrets",
-        "error_llm": "⚠️ Error connecting to AI service:",
-        "error_docs": "⚠️ Error processing documents:",
-        "no_info": "This specific information is not available in my current resume. I can help with other questions about my professional experience.",
-        "welcome_msg": "👋 Hello! I'm Thiago Milanez's virtual assistant. I can answer questions about professional experience, projects, technical skills, and academic background. How can I help?",
-        "system_prompt_qa": """You are a professional virtual assistant representing Thiago Milanez C Pinheiro.
-
-CRITICAL INSTRUCTIONS:
-1. Use EXCLUSIVELY the information found in the CONTEXT below
-2. DO NOT invent, assume or add information that is not in the context
-3. If the information is not in the context, respond: "This specific information is not available in my current resume. I can help with other questions about my professional experience."
-4. Be objective, professional and cite only concrete facts from the context
-5. For technical questions, mention ONLY technologies and projects listed in the context
-6. Respond in first person as if you were Thiago himself
-7. Keep answers concise (maximum 5-7 lines), focusing on essentials
-
-RESUME CONTEXT:
-{context}
-
-RECRUITER QUESTION: {input}
-
-ANSWER (based ONLY on the context above):""",
-        "context_system_prompt": "Given the following chat history and the follow-up question which might reference context in the chat history, formulate a standalone question which can be understood without the chat history. Do NOT answer the question, only reformulate it if needed; otherwise return it as-is."
-    }
-}
+if groq_api_key:
+    os.environ["GROQ_API_KEY"] = groq_api_key
 
 # -------------------------
 # Streamlit UI config
@@ -296,52 +220,15 @@ else:
 """, unsafe_allow_html=True)
 
 # -------------------------
-# Configs / hyperparams
-# -------------------------
-ID_MODEL = os.getenv("GROQ_MODEL_ID", "llama-3.3-70b-versatile")
-TEMPERATURE = float(os.getenv("GROQ_TEMPERATURE", 0.7))
-CONTENT_PATH = os.getenv("CONTENT_PATH_LINKEDIN", "./content_linkedin")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
-FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR_LINKEDIN", "index_faiss_linkedin")
-
+# LLM
 # -------------------------
-# LLM loader
-# -------------------------
-def load_llm(model_id: str = ID_MODEL, temperature: float = TEMPERATURE):
+llm = None
+if not BACKEND_URL:
     try:
-        logger.info(f"Inicializando LLM com modelo: {model_id}")
-        llm = ChatGroq(
-            model=model_id,
-            temperature=temperature,
-            max_tokens=None,
-            timeout=60,
-            max_retries=2,
-        )
-        return llm
+        llm = load_llm()
     except Exception as e:
-        logger.error(f"Erro ao inicializar LLM: {str(e)}")
-        raise
-
-try:
-    llm = load_llm()
-except Exception as e:
-    st.error(f"⚠️ Erro ao conectar com o serviço de IA: {str(e)}")
-    st.stop()
-
-# -------------------------
-# Utilidades
-# -------------------------
-def extract_text_pdf(file_path):
-    try:
-        logger.info(f"Extraindo texto do PDF: {file_path}")
-        loader = PyMuPDFLoader(str(file_path))
-        pages = loader.load()
-        content = "\n".join([p.page_content for p in pages])
-        logger.info(f"PDF processado com sucesso: {len(pages)} páginas")
-        return content
-    except Exception as e:
-        logger.error(f"Erro ao processar PDF {file_path}: {str(e)}")
-        raise
+        st.error(f"⚠️ Erro ao conectar com o serviço de IA: {str(e)}")
+        st.stop()
 
 # -------------------------
 # Retriever / Index config
@@ -349,240 +236,104 @@ def extract_text_pdf(file_path):
 @st.cache_resource(show_spinner="🔄 Carregando índice FAISS...")
 def config_retriever(folder_path: str = CONTENT_PATH):
     try:
-        # Verificar se índice FAISS já existe (otimização para cold start)
-        faiss_path = Path(FAISS_INDEX_DIR)
-        if faiss_path.exists() and (faiss_path / "index.faiss").exists():
-            logger.info(f"Carregando índice FAISS existente de {FAISS_INDEX_DIR}")
-            # Configurar embeddings com cache reduzido para economizar memória
-            embeddings = HuggingFaceEmbeddings(
-                model_name=EMBEDDING_MODEL,
-                cache_folder="./cache",
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'batch_size': 1, 'show_progress_bar': False}
-            )
-            vectorstore = FAISS.load_local(FAISS_INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
-            retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 3, "fetch_k": 4})
-            logger.info("Índice FAISS carregado com sucesso")
-            # Forçar garbage collection após carregar modelo pesado
-            gc.collect()
-            return retriever
-        
-        docs_path = Path(folder_path)
-        
-        if not docs_path.exists():
-            logger.error(f"Diretório não encontrado: {docs_path}")
-            st.error(f"⚠️ Diretório de conteúdo não encontrado: {folder_path}")
-            st.info("💡 Dica: Crie a pasta './content_linkedin' e adicione arquivos PDF com o currículo.")
-            st.stop()
-        
-        pdf_files = list(docs_path.glob("*.pdf"))
-        logger.info(f"Encontrados {len(pdf_files)} arquivos PDF em {docs_path}")
-
-        if len(pdf_files) < 1:
-            st.error("Nenhum arquivo PDF encontrado em: " + str(docs_path))
-            st.info("💡 Adicione o currículo em PDF na pasta para começar.")
-            st.stop()
-
-        logger.info("Processando documentos PDF...")
-        loaded_documents = [extract_text_pdf(pdf) for pdf in pdf_files]
-
-        logger.info("Criando chunks de texto...")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = []
-        for doc_text in loaded_documents:
-            chunks.extend(text_splitter.split_text(doc_text))
-        logger.info(f"Total de {len(chunks)} chunks criados")
-
-        logger.info(f"Gerando embeddings com modelo: {EMBEDDING_MODEL}")
-        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-
-        logger.info("Criando índice FAISS...")
-        vectorstore = FAISS.from_texts(chunks, embedding=embeddings)
-
-        vectorstore.save_local(FAISS_INDEX_DIR)
-        logger.info(f"Índice salvo em: {FAISS_INDEX_DIR}")
-
-        retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 3, "fetch_k": 4})
-        logger.info("Retriever configurado com sucesso")
-
-        return retriever
-    
+        return load_retriever(folder_path)
+    except FileNotFoundError as e:
+        st.error(f"⚠️ {str(e)}")
+        st.info("💡 Dica: Crie a pasta './content_linkedin' e adicione o currículo em PDF para começar.")
+        st.stop()
     except Exception as e:
         logger.error(f"Erro ao configurar retriever: {str(e)}")
         st.error(f"⚠️ Erro ao processar documentos: {str(e)}")
         st.stop()
 
 # -------------------------
-# RAG: contextualize question -> retrieve -> answer
+# Execução cancelável da pergunta
 # -------------------------
-def get_context_prompt(language="pt"):
-    """Retorna o prompt de contexto no idioma especificado"""
-    return TRANSLATIONS[language]["context_system_prompt"]
-
-def get_qa_prompt(language="pt"):
-    """Retorna o prompt QA no idioma especificado"""
-    return TRANSLATIONS[language]["system_prompt_qa"]
-
-def history_aware_retriever_fn(input_dict, retriever, language="pt"):
-    """Reformula a pergunta considerando histórico e retorna documentos relevantes"""
-    question = input_dict.get("input")
-    chat_history = input_dict.get("chat_history", [])
-
-    # Criar chain de contextualização dinamicamente
-    context_q_system_prompt = get_context_prompt(language)
-    context_q_prompt = ChatPromptTemplate.from_messages([
-        ("system", context_q_system_prompt),
-        MessagesPlaceholder("chat_history"),
-        ("human", "Question: {input}"),
-    ])
-    contextualize_chain = context_q_prompt | llm | StrOutputParser()
-
-    reformulated = contextualize_chain.invoke({"input": question, "chat_history": chat_history})
-    logger.info(f"Pergunta reformulada: '{reformulated}'")
-
+def run_chat_task(input_text):
+    """
+    Roda o chat_llm_flow em uma tarefa da sessão (cancelando a pergunta anterior ainda em andamento).
+    A espera tem um ponto de interrupção periódico: se o usuário enviar outra pergunta, o rerun do
+    Streamlit interrompe esta espera e a tarefa é cancelada.
+    """
+    ctx = get_script_run_ctx()
+    retriever = st.session_state.retriever
+    language = st.session_state.language
+    profile = query_param_requested(st.query_params)
+
+    def flow():
+        # A thread da tarefa acessa st.session_state: precisa do contexto da sessão
+        add_script_run_ctx(threading.current_thread(), ctx)
+        # FAQ gerada para outro índice: regenera em background, sem atrasar esta resposta
+        refresh_faq(retriever, llm)
+        return chat_llm_flow(retriever, input_text, language, llm=llm, session_state=st.session_state, profile=profile)
+
+    task = submit_session_task(st.session_state, flow)
+    heartbeat = st.empty()
     try:
-        if hasattr(retriever, "get_relevant_documents"):
-            retrieved = retriever.get_relevant_documents(reformulated)
-        elif hasattr(retriever, "get_relevant_texts"):
-            retrieved = retriever.get_relevant_texts(reformulated)
-        else:
-            retrieved = retriever.invoke(reformulated)
-        
-        logger.info(f"Retriever retornou {len(retrieved)} documentos")
-        
-    except Exception as e:
-        logger.error(f"Erro ao recuperar documentos: {e}")
-        retrieved = []
-
-    texts = []
-    for d in retrieved:
-        if isinstance(d, str):
-            texts.append(d)
-        else:
-            content = getattr(d, "page_content", None)
-            if content is None:
-                texts.append(str(d))
-            else:
-                texts.append(content)
-
-    logger.info(f"Extraídos {len(texts)} textos dos documentos")
-    if texts:
-        logger.info(f"Preview do primeiro texto: {texts[0][:200]}")
-    else:
-        logger.warning("Nenhum texto extraído dos documentos!")
-
-    return texts
-
-def make_rag_response(question, chat_history, retriever, language="pt"):
-    logger.info(f"make_rag_response chamado para pergunta: '{question[:100]}'")
-    
-    # Configurar prompts no idioma correto
-    context_q_system_prompt = get_context_prompt(language)
-    context_q_prompt = ChatPromptTemplate.from_messages([
-        ("system", context_q_system_prompt),
-        MessagesPlaceholder("chat_history"),
-        ("human", "Question: {input}"),
-    ])
-    
-    qa_system_prompt = get_qa_prompt(language)
-    qa_prompt = ChatPromptTemplate.from_messages([
-        ("system", qa_system_prompt),
-    ])
-    
-    contextualize_chain = context_q_prompt | llm | StrOutputParser()
-    answer_chain = qa_prompt | llm | StrOutputParser()
-    
-    # Passar idioma para retriever function
-    texts = history_aware_retriever_fn({"input": question, "chat_history": chat_history}, retriever, language)
-    logger.info(f"history_aware_retriever_fn retornou {len(texts)} textos")
-
-    max_context_len = 4000
-    context_builder = []
-    current_len = 0
-    for t in texts:
-        t_len = len(t)
-        if current_len + t_len > max_context_len:
-            break
-        context_builder.append(t)
-        current_len += t_len
-    context = "\n\n---\n\n".join(context_builder) if context_builder else ""
-    
-    logger.info(f"Contexto final tem {len(context)} caracteres")
-
-    if not context:
-        logger.warning("Contexto vazio - retriever não encontrou documentos relevantes!")
-        reformulated = contextualize_chain.invoke({"input": question, "chat_history": chat_history})
-        no_info_msg = TRANSLATIONS[language]["no_info"]
-        return {
-            "answer": no_info_msg,
-            "reformulated_question": reformulated,
-            "similarity_used": 0.0,
-            "used_chunks_preview": [],
-        }
-
-    final_input = {"input": question, "context": context}
-    answer = answer_chain.invoke(final_input)
-
-    previews = [t[:300].replace("\n", " ") + "..." for t in texts[:5]]
-
-    return {
-        "answer": answer,
-        "reformulated_question": contextualize_chain.invoke({"input": question, "chat_history": chat_history}),
-        "similarity_used": None,
-        "used_chunks_preview": previews,
-    }
-
-# -------------------------
-# Chat handlers (Streamlit)
-# -------------------------
-def chat_llm_flow(retriever, user_input, language="pt"):
+        while True:
+            try:
+                return task.result(timeout=0.25)
+            except FuturesTimeoutError:
+                heartbeat.empty()
+    finally:
+        if not task.done():
+            task.cancel()
+
+def run_backend_chat(input_text, placeholder):
+    """
+    Envia a pergunta ao backend e renderiza a resposta em streaming no placeholder.
+    Um rerun (nova pergunta) interrompe a leitura e fecha a conexão; o backend cancela a geração.
+    """
+    client = BackendClient(BACKEND_URL)
+    language = st.session_state.language
+    session_id = st.session_state.setdefault("backend_session_id", uuid.uuid4().hex)
+    placeholder.markdown(f"_{TRANSLATIONS[language]['processing']}_")
+
+    answer, debug, parts = "", {}, []
+    events = client.chat_events(input_text, language, session_id, st.session_state.get("backend_state"))
     try:
-        # Inicializar histórico com mensagem de boas-vindas no idioma correto
-        if "chat_history" not in st.session_state:
-            welcome_msg = TRANSLATIONS[language]["welcome_msg"]
-            st.session_state.chat_history = [AIMessage(content=welcome_msg)]
-
-        if not user_input or len(user_input.strip()) == 0:
-            logger.warning("Input vazio recebido")
-            if language == "pt":
-                return "Por favor, digite uma pergunta.", {}
-            else:
-                return "Please type a question.", {}
-        
-        if len(user_input) > 5000:
-            logger.warning(f"Input muito longo: {len(user_input)} caracteres")
-            if language == "pt":
-                return "Pergunta muito longa. Por favor, seja mais conciso (máximo 5000 caracteres).", {}
+        for event, data in events:
+            if event == "token":
+                parts.append(data["text"])
+                placeholder.markdown("".join(parts) + "▌")
+            elif event == "cancelled":
+                st.stop()
+            elif event == "done":
+                answer = data.pop("answer", "")
+                debug = data
+                render_answer(placeholder, answer, debug)
+                st.session_state.chat_history.append(HumanMessage(content=input_text))
+                st.session_state.chat_history.append(AIMessage(content=answer))
+                st.session_state.chat_history = st.session_state.chat_history[-20:]
+            elif event == "state":
+                # Resumo + últimos turnos, reenviados na próxima pergunta
+                st.session_state.backend_state = data
+    finally:
+        events.close()
+    return answer, debug
+
+
+def render_answer(placeholder, answer, debug):
+    """Resposta final e expander com as fontes"""
+    with span("render"):
+        placeholder.markdown(answer)
+
+        if debug and "error" not in debug:
+            # Expander bilíngue
+            if st.session_state.language == "pt":
+                expander_title = "🔍 Fontes do Currículo"
+                reformulated_label = "**Pergunta reformulada:**"
+                chunks_label = "**Trechos do currículo utilizados:**"
             else:
-                return "Question too long. Please be more concise (maximum 5000 characters).", {}
+                expander_title = "🔍 Resume Sources"
+                reformulated_label = "**Reformulated question:**"
+                chunks_label = "**Resume excerpts used:**"
 
-        logger.info(f"Processando pergunta: {user_input[:100]}...")
-        
-        st.session_state.chat_history.append(HumanMessage(content=user_input))
-        
-        # Limitar histórico a 20 mensagens para economizar memória
-        if len(st.session_state.chat_history) > 20:
-            st.session_state.chat_history = st.session_state.chat_history[-20:]
-
-        rag_result = make_rag_response(user_input, st.session_state.chat_history, retriever, language)
-
-        res_text = rag_result.get("answer", "").strip()
-        st.session_state.chat_history.append(AIMessage(content=res_text))
-        
-        # Limpar memória após resposta
-        gc.collect()
-        
-        logger.info("Resposta gerada com sucesso")
-
-        return res_text, rag_result
-    
-    except Exception as e:
-        logger.error(f"Erro no fluxo de chat: {str(e)}")
-        if language == "pt":
-            error_msg = "Desculpe, ocorreu um erro ao processar sua pergunta. Tente novamente."
-        else:
-            error_msg = "Sorry, an error occurred while processing your question. Please try again."
-        return error_msg, {"error": str(e)}
+            with st.expander(expander_title, expanded=False):
+                st.markdown(f"{reformulated_label} `{debug.get('reformulated_question')}`")
+                st.markdown(chunks_label)
+                for i, p in enumerate(debug.get("used_chunks_preview", []), 1):
+                    st.markdown(f"{i}. {p}")
 
 # -------------------------
 # Streamlit UI main
@@ -608,6 +359,8 @@ with st.sidebar:
         # Limpar o histórico do chat ao trocar idioma
         if "chat_history" in st.session_state:
             del st.session_state.chat_history
+        st.session_state.pop("history_manager", None)
+        st.session_state.pop("backend_state", None)
         st.rerun()
     
     st.markdown("---")
@@ -633,27 +386,14 @@ with st.sidebar:
 </div>"""
     st.markdown(info_html, unsafe_allow_html=True)
     
-    # Perguntas sugeridas (bilíngue)
+    # Perguntas sugeridas (bilíngue); clicáveis, respondidas pela FAQ pré-calculada
     if st.session_state.language == "pt":
         st.markdown("### 💡 Perguntas Sugeridas")
-        st.markdown("""
-- Qual sua experiência profissional?
-- Quais tecnologias você domina?
-- Pode falar sobre seus projetos?
-- Quais suas certificações?
-- Qual sua formação acadêmica?
-- Experiência com LLMs e IA?
-        """)
     else:
         st.markdown("### 💡 Suggested Questions")
-        st.markdown("""
-- What is your professional experience?
-- What technologies do you master?
-- Can you talk about your projects?
-- What are your certifications?
-- What is your academic background?
-- Experience with LLMs and AI?
-        """)
+    for i, question in enumerate(SUGGESTED_QUESTIONS[st.session_state.language]):
+        if st.button(question, key=f"suggested_{i}", use_container_width=True):
+            st.session_state.pending_question = question
     
     # Links profissionais
     if st.session_state.language == "pt":
@@ -775,6 +515,8 @@ if len(st.session_state.get("chat_history", [])) <= 1:
 # Input do chat (bilíngue)
 chat_placeholder = TRANSLATIONS[st.session_state.language]["chat_placeholder"]
 input_text = st.chat_input(chat_placeholder)
+if input_text is None:
+    input_text = st.session_state.pop("pending_question", None)
 
 # initialize state variables - com idioma correto
 if "chat_history" not in st.session_state:
@@ -782,7 +524,10 @@ if "chat_history" not in st.session_state:
     st.session_state.chat_history = [AIMessage(content=welcome_msg)]
 
 # Carregar retriever uma única vez (cache_resource mantém entre reruns)
-if "retriever" not in st.session_state or st.session_state.retriever is None:
+retriever_cached = st.session_state.get("retriever") is not None
+if not BACKEND_URL:
+    record_cache("session_retriever", retriever_cached)
+if not retriever_cached and not BACKEND_URL:
     logger.info("Inicializando retriever...")
     try:
         st.session_state.retriever = config_retriever(CONTENT_PATH)
@@ -810,29 +555,20 @@ if input_text is not None:
 
     with st.chat_message("assistant", avatar="💼"):
         try:
-            # Mensagem de carregamento bilíngue
-            processing_msg = TRANSLATIONS[st.session_state.language]["processing"]
-            with st.spinner(processing_msg):
-                answer, debug = chat_llm_flow(st.session_state.retriever, input_text, st.session_state.language)
-            
-            st.markdown(answer)
-
-            if debug and "error" not in debug:
-                # Expander bilíngue
-                if st.session_state.language == "pt":
-                    expander_title = "🔍 Fontes do Currículo"
-                    reformulated_label = "**Pergunta reformulada:**"
-                    chunks_label = "**Trechos do currículo utilizados:**"
-                else:
-                    expander_title = "🔍 Resume Sources"
-                    reformulated_label = "**Reformulated question:**"
-                    chunks_label = "**Resume excerpts used:**"
-                
-                with st.expander(expander_title, expanded=False):
-                    st.markdown(f"{reformulated_label} `{debug.get('reformulated_question')}`")
-                    st.markdown(chunks_label)
-                    for i, p in enumerate(debug.get("used_chunks_preview", []), 1):
-                        st.markdown(f"{i}. {p}")
+            answer_placeholder = st.empty()
+            if BACKEND_URL:
+                run_backend_chat(input_text, answer_placeholder)
+            else:
+                # Mensagem de carregamento bilíngue
+                processing_msg = TRANSLATIONS[st.session_state.language]["processing"]
+                with st.spinner(processing_msg):
+                    answer, debug = run_chat_task(input_text)
+
+                # Pergunta substituída por outra mais nova da mesma sessão: nada a exibir
+                if debug.get("cancelled"):
+                    st.stop()
+
+                render_answer(answer_placeholder, answer, debug)
         
         except Exception as e:
             logger.error(f"Erro crítico na interface: {str(e)}")
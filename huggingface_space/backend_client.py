@@ -0,0 +1,72 @@
+"""
+Cliente do backend HTTP (api_server.py)
+Usado pelo app Streamlit quando RAG_BACKEND_URL está definido: a UI só renderiza e o
+pipeline RAG roda (e escala) no backend
+"""
+import json
+import logging
+import urllib.error
+import urllib.request
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BackendError(RuntimeError):
+    """Erro HTTP ou evento "error" devolvido pelo backend"""
+
+
+def iter_sse(response) -> Iterator[Tuple[str, Dict]]:
+    """Eventos (nome, dados JSON) de uma resposta text/event-stream"""
+    event, data = "message", []
+    for raw in response:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+
+class BackendClient:
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path: str, payload: Dict, accept: str = "application/json"):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Accept": accept},
+            method="POST",
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")
+            logger.error(f"Backend retornou {e.code} em {path}: {detail}")
+            raise BackendError(f"Erro no backend ({e.code}): {detail}") from e
+
+    def chat_events(self, question: str, language: str = "pt", session_id: Optional[str] = None,
+                    history: Optional[Dict] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        Eventos SSE do /chat: token, done, state, cancelled ou error.
+        Fechar o gerador antes do fim fecha a conexão, e o backend cancela a geração.
+        """
+        payload = {"question": question, "language": language, "session_id": session_id, "history": history}
+        with self._post("/chat", payload, accept="text/event-stream") as response:
+            for event, data in iter_sse(response):
+                if event == "error":
+                    raise BackendError(data.get("error", "erro desconhecido"))
+                yield event, data
+
+    def retrieve(self, query: str) -> Dict:
+        with self._post("/retrieve", {"query": query}) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def health(self) -> Dict:
+        with urllib.request.urlopen(self.base_url + "/health", timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
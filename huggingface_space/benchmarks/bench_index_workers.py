@@ -0,0 +1,56 @@
+"""
+Benchmark: escalabilidade do encoding multi-processo na construção do índice
+O startup (spawn dos workers + carga do modelo em cada um) é medido à parte: chunks/s e
+speedup são só do encoding, e a coluna total mostra o tempo de parede com o startup.
+
+Uso:
+    python benchmarks/bench_index_workers.py --chunks 2000
+    python benchmarks/bench_index_workers.py --workers 1 2 4 8 --model BAAI/bge-m3
+"""
+import os
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from index_embedding import embed_texts_multiprocess
+from fixtures import synthetic_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de encoding multi-processo")
+    parser.add_argument("--model", default="sentence-transformers/paraphrase-MiniLM-L3-v2")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    chunks = synthetic_chunks(args.chunks)
+    print(f"{len(chunks)} chunks sintéticos, {cpus} núcleos, modelo {args.model}\n")
+    print(f"{'workers':>7} {'threads':>7} {'startup s':>9} {'encode s':>8} {'total s':>7} "
+          f"{'chunks/s':>10} {'speedup':>8} {'eficiência':>10}")
+
+    reference = None
+    base_rate = None
+    for workers in args.workers:
+        threads = max(1, cpus // workers)
+        vectors, report = embed_texts_multiprocess(args.model, chunks, workers, threads)
+        rate = report["chunks_per_sec"]
+        base_rate = base_rate or rate
+        speedup = rate / base_rate
+        print(f"{workers:>7} {threads:>7} {report['startup_seconds']:>9.1f} {report['seconds']:>8.1f} "
+              f"{report['total_seconds']:>7.1f} {rate:>10.1f} {speedup:>7.2f}x {speedup / workers:>9.0%}")
+
+        # A ordem final precisa ser a mesma independente do número de workers
+        current = np.asarray(vectors)
+        if reference is None:
+            reference = current
+        elif not np.allclose(reference, current, atol=1e-4):
+            print(f"  ⚠️ Vetores divergem do resultado com {args.workers[0]} worker(s)")
+
+
+if __name__ == "__main__":
+    main()
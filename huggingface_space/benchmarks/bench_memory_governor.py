@@ -0,0 +1,102 @@
+"""
+Benchmark: gc.collect() a cada resposta vs governador de memória
+Simula o heap do app carregado (muitos objetos Python vivos, como modelo/LangChain)
+e um laço de requisições que aloca documentos, mensagens e strings temporárias
+
+Uso:
+    python benchmarks/bench_memory_governor.py
+    python benchmarks/bench_memory_governor.py --heap-objects 3000000 --requests 300
+"""
+import gc
+import sys
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from memory_governor import MemoryGovernor, freeze_startup_heap, read_rss_bytes
+
+MODES = ["gc_per_request", "governor", "governor_frozen"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_heap(objects: int):
+    """Grafo de objetos de vida longa, equivalente aos módulos/modelo carregados"""
+    return [{"id": i, "tokens": [i, i + 1], "meta": {"page": i % 11}} for i in range(objects)]
+
+
+def fake_request(rng: random.Random, history: list):
+    """Alocações típicas de uma resposta: chunks recuperados, prompt, mensagens e um ciclo de referência"""
+    chunks = [{"page_content": "x" * rng.randint(200, 1000), "metadata": {"score": rng.random()}} for _ in range(8)]
+    prompt = "\n\n---\n\n".join(c["page_content"] for c in chunks)
+    message = {"content": prompt[:500], "parent": None}
+    message["parent"] = message  # ciclo: só o gc libera
+    history.append(message)
+    del history[:-20]
+    return len(prompt)
+
+
+def run_mode(mode: str, args) -> dict:
+    heap = build_heap(args.heap_objects)
+    governor = None
+    if mode.startswith("governor"):
+        if mode == "governor_frozen":
+            freeze_startup_heap()
+        budget = int(read_rss_bytes() * args.budget_factor)
+        governor = MemoryGovernor(budget_bytes=budget, interval_s=args.interval_s, cooldown_s=args.interval_s)
+        governor.start()
+
+    rng = random.Random(42)
+    history = []
+    latencies = []
+    peak_rss = read_rss_bytes()
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        fake_request(rng, history)
+        if mode == "gc_per_request":
+            gc.collect()
+        latencies.append((time.perf_counter() - start) * 1000)
+        peak_rss = max(peak_rss, read_rss_bytes())
+
+    if governor is not None:
+        governor.stop()
+    final_rss = read_rss_bytes()
+    del heap
+    gc.unfreeze()
+    gc.collect()
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "mean_ms": statistics.mean(latencies),
+        "peak_rss_mb": peak_rss / 1024 / 1024,
+        "final_rss_mb": final_rss / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência por requisição: gc a cada resposta vs governador")
+    parser.add_argument("--heap-objects", type=int, default=1_000_000, help="Objetos de vida longa no heap")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--budget-factor", type=float, default=1.2,
+                        help="Orçamento do governador como múltiplo do RSS após carregar o heap")
+    parser.add_argument("--interval-s", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'modo':<18} {'p50 (ms)':>9} {'p95 (ms)':>9} {'média (ms)':>11} {'pico RSS (MB)':>14} {'RSS final (MB)':>15}")
+    for mode in args.modes:
+        r = run_mode(mode, args)
+        print(f"{mode:<18} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['mean_ms']:>11.2f} "
+              f"{r['peak_rss_mb']:>14.1f} {r['final_rss_mb']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
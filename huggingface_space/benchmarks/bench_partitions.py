@@ -0,0 +1,176 @@
+"""
+Benchmark: latência da busca filtrada em função do número de partições
+Vetores sintéticos (normalizados, dimensão do bge-m3) divididos em P partições de mesmo
+tamanho. Para cada P, mede a busca de k vizinhos em uma partição com:
+  - full: índice inteiro, sem filtro (referência)
+  - range: IDSelectorRange, partição contígua (um documento inteiro)
+  - batch: IDSelectorBatch, partição espalhada pelo índice (um idioma, uma tag)
+  - post: busca sem filtro com k ampliado e descarte do que é de outra partição
+    (como o filter do FAISS do LangChain), com o recall que sobra
+  - split: um índice separado por partição (referência de custo mínimo)
+No HNSW, o seletor não poda o grafo, então partições pequenas custam quase o índice inteiro
+e podem perder vizinhos: o recall@k é medido contra a busca exata na partição. Vetores
+aleatórios são o pior caso do HNSW, então o recall absoluto dele fica abaixo do de embeddings reais.
+
+Uso:
+    python benchmarks/bench_partitions.py
+    python benchmarks/bench_partitions.py --vectors 50000 --partitions 1 4 16 64 --index-types flat hnsw
+"""
+import os
+import sys
+import json
+import platform
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import numpy as np
+
+from index_partitions import search_positions
+from run_benchmarks import RESULTS_DIR, git_commit, measure
+
+INDEX_TYPES = ["flat", "hnsw"]
+MODES = ["full", "range", "batch", "post", "split"]
+
+
+def build_index(index_type: str, vectors, ef_search: int = 64):
+    import faiss
+
+    dim = vectors.shape[1]
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    else:
+        index = faiss.IndexHNSWFlat(dim, 32)
+        index.hnsw.efSearch = ef_search
+    index.add(vectors)
+    return index
+
+
+def partition_ids(n: int, partitions: int, part: int, layout: str) -> np.ndarray:
+    """Posições da partição `part`: bloco contíguo (range) ou uma a cada `partitions` (batch)"""
+    if layout == "range":
+        size = n // partitions
+        return np.arange(part * size, (part + 1) * size, dtype="int64")
+    return np.arange(part, n, partitions, dtype="int64")
+
+
+def recall(found, expected) -> float:
+    expected = set(int(i) for i in expected)
+    return len(expected & set(int(i) for i in found)) / max(1, len(expected))
+
+
+def bench_partitions(index_type, index, vectors, queries, partitions, k, post_factor, repeat, ef_search):
+    rows = []
+    n = len(vectors)
+    exact = {}
+    for mode in MODES:
+        layout = "batch" if mode in ("batch", "post") else "range"
+        ids = partition_ids(n, partitions, 0, layout)
+        if layout not in exact:
+            flat = build_index("flat", vectors[ids])
+            exact[layout] = [ids[flat.search(q[None, :], k)[1][0]] for q in queries]
+        found = []
+
+        if mode == "full":
+            def run():
+                found[:] = [search_positions(index, q[None, :], k, None)[1] for q in queries]
+        elif mode in ("range", "batch"):
+            def run():
+                found[:] = [search_positions(index, q[None, :], k, ids)[1] for q in queries]
+        elif mode == "post":
+            allowed = np.zeros(n, dtype=bool)
+            allowed[ids] = True
+
+            def run():
+                found[:] = []
+                for q in queries:
+                    positions = search_positions(index, q[None, :], min(n, k * post_factor), None)[1]
+                    found.append(positions[allowed[positions]][:k])
+        else:
+            part_index = build_index(index_type, vectors[ids], ef_search)
+
+            def run():
+                found[:] = [ids[search_positions(part_index, q[None, :], k, None)[1]] for q in queries]
+
+        stats = measure(run, repeat)
+        per_query = {key: value / len(queries) for key, value in stats.items() if key.endswith("_ms")}
+        rows.append({
+            "index_type": index_type,
+            "partitions": partitions,
+            "mode": mode,
+            "partition_size": n if mode == "full" else len(ids),
+            **per_query,
+            # full busca no índice inteiro, sem filtro: não há recall da partição
+            f"recall@{k}": None if mode == "full" else float(np.mean([recall(f, e) for f, e in zip(found, exact[layout])])),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência da busca filtrada x número de partições")
+    parser.add_argument("--vectors", type=int, default=20000, help="Chunks no índice")
+    parser.add_argument("--dim", type=int, default=1024, help="Dimensão (1024 = bge-m3)")
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=INDEX_TYPES)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=4, help="Vizinhos por busca (fetch_k do MMR)")
+    parser.add_argument("--post-factor", type=int, default=2,
+                        help="Multiplicador de k na filtragem posterior (o LangChain usa fetch_k * 2)")
+    parser.add_argument("--ef-search", type=int, default=64, help="efSearch do HNSW (o padrão do FAISS é 16)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: benchmarks/results/partitions-<commit>.json)")
+    args = parser.parse_args()
+
+    import faiss
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    faiss.normalize_L2(queries)
+
+    rows = []
+    recall_key = f"recall@{args.k}"
+    header = f"{'índice':<6} {'P':>4} {'modo':<6} {'tamanho':>8} {'mediana ms':>11} {'p95 ms':>8} {recall_key:>9}"
+    print(f"{args.vectors} vetores x {args.dim} dims, {args.queries} queries, k={args.k}\n")
+    print(header)
+    print("-" * len(header))
+    for index_type in args.index_types:
+        index = build_index(index_type, vectors, args.ef_search)
+        for partitions in args.partitions:
+            for row in bench_partitions(index_type, index, vectors, queries, partitions, args.k,
+                                        args.post_factor, args.repeat, args.ef_search):
+                rows.append(row)
+                print(
+                    f"{row['index_type']:<6} {row['partitions']:>4} {row['mode']:<6} {row['partition_size']:>8} "
+                    f"{row['median_ms']:>11.3f} {row['p95_ms']:>8.3f} "
+                    + (f"{row[recall_key]:>9.3f}" if row[recall_key] is not None else f"{'-':>9}")
+                )
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "faiss": faiss.__version__,
+            "vectors": args.vectors,
+            "dim": args.dim,
+            "k": args.k,
+            "ef_search": args.ef_search,
+        },
+        "results": rows,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"partitions-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n💾 Resultados salvos em {output}")
+
+
+if __name__ == "__main__":
+    main()
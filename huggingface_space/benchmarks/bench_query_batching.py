@@ -0,0 +1,107 @@
+"""
+Benchmark: embeddings de queries sob carga concorrente, com e sem micro-batching
+
+Uso:
+    python benchmarks/bench_query_batching.py --threads 16 --queries 20
+    python benchmarks/bench_query_batching.py --max-batch 32 --max-wait-ms 10
+"""
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from embedding_batcher import BatchingEmbeddings
+
+QUESTIONS = [
+    "Qual sua experiência profissional?",
+    "Quais tecnologias você domina?",
+    "Pode falar sobre seus projetos?",
+    "Quais suas certificações?",
+    "Qual sua formação acadêmica?",
+    "Experiência com LLMs e IA?",
+    "What is your professional experience?",
+    "What technologies do you master?",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_load(embeddings, threads: int, queries_per_thread: int):
+    """Dispara `threads` sessões simultâneas, cada uma com `queries_per_thread` queries"""
+    latencies = []
+
+    def session(worker_id: int):
+        local = []
+        for i in range(queries_per_thread):
+            question = QUESTIONS[(worker_id + i) % len(QUESTIONS)]
+            start = time.perf_counter()
+            embeddings.embed_query(f"{question} #{worker_id}-{i}")
+            local.append(time.perf_counter() - start)
+        return local
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for local in pool.map(session, range(threads)):
+            latencies.extend(local)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "queries": len(latencies),
+        "seconds": elapsed,
+        "qps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }
+
+
+def print_row(label, result):
+    print(
+        f"{label:<28} {result['qps']:>8.1f} q/s  "
+        f"p50 {result['p50_ms']:>7.1f} ms  p95 {result['p95_ms']:>7.1f} ms  p99 {result['p99_ms']:>7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de micro-batching de queries")
+    parser.add_argument("--model", default="sentence-transformers/paraphrase-MiniLM-L3-v2")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=20, help="Queries por thread")
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[2, 5, 10])
+    args = parser.parse_args()
+
+    print(f"Carregando modelo: {args.model}")
+    base = HuggingFaceEmbeddings(
+        model_name=args.model,
+        cache_folder="./cache",
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'batch_size': max(args.max_batch), 'show_progress_bar': False}
+    )
+    base.embed_query("aquecimento")
+
+    print(f"\n{args.threads} threads x {args.queries} queries\n")
+    print_row("sem batching (batch=1)", run_load(base, args.threads, args.queries))
+
+    for max_batch in args.max_batch:
+        for max_wait in args.max_wait_ms:
+            batcher = BatchingEmbeddings(base, max_batch_size=max_batch, max_wait_ms=max_wait)
+            result = run_load(batcher, args.threads, args.queries)
+            stats = batcher.stats()
+            print_row(f"batch<={max_batch} wait={max_wait:g}ms", result)
+            print(f"{'':<28} lote médio {stats['avg_batch_size']:.1f} (máx {stats['max_batch_size_seen']})")
+
+
+if __name__ == "__main__":
+    main()
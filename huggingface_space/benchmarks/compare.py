@@ -0,0 +1,50 @@
+"""
+Compara dois resultados da suite de benchmarks (mediana por etapa)
+
+Uso:
+    python benchmarks/compare.py benchmarks/results/abc1234.json benchmarks/results/def5678.json
+    python benchmarks/compare.py antes.json depois.json --threshold 10
+"""
+import sys
+import json
+import argparse
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff de resultados de benchmark entre commits")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Variação percentual da mediana considerada regressão")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}\n")
+    print(f"{'corpus':<16} {'etapa':<14} {'antes (ms)':>11} {'depois (ms)':>12} {'variação':>9}")
+
+    regressions = 0
+    for corpus, stages in sorted(after["results"].items()):
+        for stage, stats in sorted(stages.items()):
+            if not isinstance(stats, dict) or "median_ms" not in stats:
+                continue
+            old = before["results"].get(corpus, {}).get(stage)
+            if not old:
+                print(f"{corpus:<16} {stage:<14} {'-':>11} {stats['median_ms']:>12.2f} {'novo':>9}")
+                continue
+            change = (stats["median_ms"] - old["median_ms"]) / old["median_ms"] * 100 if old["median_ms"] else 0.0
+            flag = " ⚠️" if change > args.threshold else ""
+            regressions += bool(flag)
+            print(f"{corpus:<16} {stage:<14} {old['median_ms']:>11.2f} {stats['median_ms']:>12.2f} {change:>+8.1f}%{flag}")
+
+    if regressions:
+        print(f"\n{regressions} etapa(s) acima de +{args.threshold:g}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Avaliação de qualidade x custo da recuperação
+Para cada combinação (modelo de embeddings, chunk_size, tipo de índice) mede recall@k e MRR
+nos conjuntos rotulados de benchmarks/eval_sets.py, junto com a latência de encode (documentos
+e queries), a latência de busca, o tamanho do índice e o RSS do processo. A tabela final marca
+as combinações na fronteira de Pareto (nenhuma outra é melhor em qualidade e mais barata).
+
+Uso:
+    python benchmarks/eval_retrieval.py
+    python benchmarks/eval_retrieval.py --models sentence-transformers/paraphrase-MiniLM-L3-v2 \\
+        --chunk-sizes 500 1000 --index-types flat hnsw --k 3
+"""
+import gc
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from eval_sets import EVAL_SETS, is_relevant
+from fixtures import available_pdfs
+from run_benchmarks import RESULTS_DIR, git_commit, measure
+
+DEFAULT_MODELS = ["BAAI/bge-m3", "sentence-transformers/paraphrase-MiniLM-L3-v2"]
+# flat: busca exata (padrão do FAISS.from_embeddings); mmr: flat + MMR com fetch_k como no
+# ScoredFAISSRetriever; hnsw e ivf: índices aproximados do FAISS
+INDEX_TYPES = ["flat", "mmr", "hnsw", "ivf"]
+MMR_FETCH_K = 4
+
+
+# -------------------------
+# Índices
+# -------------------------
+def build_index(index_type: str, vectors):
+    import faiss
+
+    dim = vectors.shape[1]
+    if index_type in ("flat", "mmr"):
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, 32)
+    elif index_type == "ivf":
+        # Corpora pequenos: ~sqrt(n) listas, com no mínimo 39 vetores por lista para o treino
+        nlist = max(1, min(int(len(vectors) ** 0.5), len(vectors) // 39))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        index.train(vectors)
+        index.nprobe = max(1, nlist // 4)
+    else:
+        raise ValueError(f"Tipo de índice desconhecido: {index_type}")
+    index.add(vectors)
+    return index
+
+
+def ranked_ids(index_type: str, index, vectors, query_vector, k: int):
+    """Posições dos chunks retornados para a query, na ordem do ranking"""
+    import numpy as np
+
+    if index_type == "mmr":
+        from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+        _, ids = index.search(query_vector[None, :], max(MMR_FETCH_K, k))
+        candidates = [i for i in ids[0] if i >= 0]
+        selected = maximal_marginal_relevance(query_vector, vectors[candidates], k=k)
+        return [candidates[i] for i in selected]
+    _, ids = index.search(np.asarray(query_vector[None, :]), k)
+    return [i for i in ids[0] if i >= 0]
+
+
+def index_bytes(index) -> int:
+    import faiss
+
+    return int(faiss.serialize_index(index).nbytes)
+
+
+# -------------------------
+# Métricas
+# -------------------------
+def score_rankings(rankings, relevance, ks):
+    """
+    recall@k: fração das perguntas com algum chunk relevante entre os k primeiros
+    (os rótulos são por trecho de evidência, não por chunk). MRR: média de 1/posição
+    do primeiro chunk relevante, 0 quando nenhum aparece no ranking.
+    """
+    recall = {k: 0.0 for k in ks}
+    reciprocal_ranks = []
+    for ranking, relevant in zip(rankings, relevance):
+        first = next((pos for pos, chunk in enumerate(ranking, 1) if chunk in relevant), None)
+        reciprocal_ranks.append(1 / first if first else 0.0)
+        for k in ks:
+            recall[k] += 1.0 if first and first <= k else 0.0
+    total = max(1, len(rankings))
+    return {f"recall@{k}": value / total for k, value in recall.items()}, statistics.mean(reciprocal_ranks or [0.0])
+
+
+def pareto_front(rows, quality_key: str):
+    """Marca as linhas não dominadas: maior recall/MRR com menor latência e menor índice"""
+    def dominates(a, b):
+        better_or_equal = (
+            a[quality_key] >= b[quality_key] and a["mrr"] >= b["mrr"]
+            and a["query_ms"] <= b["query_ms"] and a["index_bytes"] <= b["index_bytes"]
+        )
+        strictly = (
+            a[quality_key] > b[quality_key] or a["mrr"] > b["mrr"]
+            or a["query_ms"] < b["query_ms"] or a["index_bytes"] < b["index_bytes"]
+        )
+        return better_or_equal and strictly
+
+    for row in rows:
+        row["pareto"] = not any(dominates(other, row) for other in rows if other is not row)
+
+
+# -------------------------
+# Avaliação
+# -------------------------
+def evaluate_corpus(name, text, embeddings, chunk_size, overlap, index_types, ks, repeat):
+    import numpy as np
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from memory_governor import read_rss_bytes
+
+    items = EVAL_SETS[name]
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=int(chunk_size * overlap))
+    chunks = splitter.split_text(text)
+    relevance = [{i for i, chunk in enumerate(chunks) if is_relevant(chunk, item["evidence"])} for item in items]
+    unlabeled = [item["question"] for item, relevant in zip(items, relevance) if not relevant]
+    if unlabeled:
+        print(f"  ⚠️ {name}: evidência não encontrada no texto para {len(unlabeled)} pergunta(s): {unlabeled}")
+
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(chunks), dtype="float32")
+    doc_seconds = time.perf_counter() - start
+
+    questions = [item["question"] for item in items]
+    query_embed = measure(lambda: [embeddings.embed_query(q) for q in questions], repeat)
+    query_vectors = np.asarray([embeddings.embed_query(q) for q in questions], dtype="float32")
+    query_ms = query_embed["median_ms"] / len(questions)
+
+    rows = []
+    k_max = max(ks)
+    for index_type in index_types:
+        index = build_index(index_type, vectors)
+        rankings = [ranked_ids(index_type, index, vectors, qv, k_max) for qv in query_vectors]
+        recall, mrr = score_rankings(rankings, relevance, ks)
+        search = measure(lambda: [ranked_ids(index_type, index, vectors, qv, k_max) for qv in query_vectors], repeat)
+        search_ms = search["median_ms"] / len(questions)
+        rows.append({
+            "corpus": name,
+            "chunk_size": chunk_size,
+            "index_type": index_type,
+            "chunks": len(chunks),
+            **recall,
+            "mrr": mrr,
+            "doc_chunks_per_sec": len(chunks) / doc_seconds,
+            "query_embed_ms": query_ms,
+            "search_ms": search_ms,
+            "query_ms": query_ms + search_ms,
+            "index_bytes": index_bytes(index),
+            "rss_mb": read_rss_bytes() / 2 ** 20,
+        })
+    return rows
+
+
+def print_table(rows, quality_key: str):
+    header = (
+        f"{'':2}{'modelo':<40} {'chunk':>5} {'índice':<6} {quality_key:>9} {'MRR':>6} "
+        f"{'query ms':>9} {'docs/s':>8} {'índice KB':>10} {'RSS MB':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in sorted(rows, key=lambda r: (-r[quality_key], -r["mrr"], r["query_ms"])):
+        print(
+            f"{'*' if row['pareto'] else ' ':2}{row['model'][-40:]:<40} {row['chunk_size']:>5} "
+            f"{row['index_type']:<6} {row[quality_key]:>9.3f} {row['mrr']:>6.3f} {row['query_ms']:>9.2f} "
+            f"{row['doc_chunks_per_sec']:>8.1f} {row['index_bytes'] / 1024:>10.1f} {row['rss_mb']:>8.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qualidade x latência da recuperação por modelo, chunk e índice")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, 1000, 1500])
+    parser.add_argument("--overlap", type=float, default=0.2, help="Sobreposição como fração do chunk_size")
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=INDEX_TYPES)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="Valores de k do recall@k")
+    parser.add_argument("--pareto-k", type=int, default=3, help="k do recall usado na fronteira de Pareto")
+    parser.add_argument("--corpora", nargs="+", choices=sorted(EVAL_SETS), default=sorted(EVAL_SETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: benchmarks/results/eval-<commit>.json)")
+    args = parser.parse_args()
+    if args.pareto_k not in args.k:
+        args.k.append(args.pareto_k)
+    quality_key = f"recall@{args.pareto_k}"
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from memory_governor import read_rss_bytes
+    from rag_core import extract_text_pdf
+
+    pdfs = {name: path for name, path in available_pdfs().items() if name in args.corpora}
+    if not pdfs:
+        print("ERRO: nenhum PDF de fixture disponível (arquivos do Git LFS baixados?)")
+        return
+    texts = {name: extract_text_pdf(path) for name, path in pdfs.items()}
+
+    rows = []
+    for model in args.models:
+        gc.collect()
+        rss_before = read_rss_bytes()
+        print(f"Carregando modelo de embeddings: {model}")
+        embeddings = HuggingFaceEmbeddings(
+            model_name=model,
+            cache_folder="./cache",
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'show_progress_bar': False}
+        )
+        embeddings.embed_query("aquecimento")
+        model_rss_mb = (read_rss_bytes() - rss_before) / 2 ** 20
+        for name, text in texts.items():
+            for chunk_size in args.chunk_sizes:
+                for row in evaluate_corpus(name, text, embeddings, chunk_size, args.overlap,
+                                           args.index_types, sorted(set(args.k)), args.repeat):
+                    row.update({"model": model, "model_rss_mb": model_rss_mb})
+                    rows.append(row)
+                print(f"  ✅ {model} | {name} | chunk {chunk_size}")
+        del embeddings
+
+    # Fronteira calculada por corpus: qualidade e custo de corpora diferentes não se comparam
+    for name in texts:
+        corpus_rows = [row for row in rows if row["corpus"] == name]
+        pareto_front(corpus_rows, quality_key)
+        print(f"\n📊 {name} ({len(EVAL_SETS[name])} perguntas) — * = fronteira de Pareto")
+        print_table(corpus_rows, quality_key)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "models": args.models,
+            "chunk_sizes": args.chunk_sizes,
+            "overlap": args.overlap,
+            "pareto_k": args.pareto_k,
+        },
+        "results": rows,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"eval-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n💾 Resultados salvos em {output}")
+
+
+if __name__ == "__main__":
+    main()
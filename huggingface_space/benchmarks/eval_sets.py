@@ -0,0 +1,55 @@
+"""
+Conjuntos rotulados pergunta -> evidência para a avaliação de recuperação
+Cada pergunta traz trechos que só aparecem no(s) chunk(s) que a respondem. Um chunk é
+relevante se contém algum dos trechos (sem acentos/maiúsculas), o que mantém os rótulos
+válidos para qualquer chunk_size, ao contrário de IDs de chunk fixos.
+"""
+import re
+import unicodedata
+
+EVAL_SETS = {
+    "cv": [
+        {"question": "Onde você fez a pós-graduação em IA?", "evidence": ["PUC Minas"]},
+        {"question": "Quais suas certificações?", "evidence": ["ITIL® Foundation", "TIBCO Certified"]},
+        {"question": "Tem certificação da Oracle?", "evidence": ["Oracle Cloud Infrastructure"]},
+        {"question": "Onde você trabalha atualmente?", "evidence": ["Compass UOL"]},
+        {"question": "Qual sua experiência na Shell?", "evidence": ["Reservoir Engineering"]},
+        {"question": "Qual sua formação acadêmica?", "evidence": ["Infnet"]},
+        {"question": "Quais ferramentas de automação você usa?", "evidence": ["UiPath"]},
+        {"question": "Qual seu nível em Power BI?", "evidence": ["DAX"]},
+        {"question": "Você já trabalhou com dados públicos da ANP?", "evidence": ["dados públicos da ANP"]},
+        {"question": "Como você valida dados antes de publicar um dashboard?", "evidence": ["Duplicidades"]},
+        {"question": "Quais seus objetivos para os próximos anos?", "evidence": ["objetivos profissionais"]},
+        {"question": "Como você versiona dashboards em produção?", "evidence": ["Controle de versões com Git"]},
+    ],
+    "safebank": [
+        {"question": "Como faço para cadastrar uma chave Pix?", "evidence": ["Minhas chaves"]},
+        {"question": "Como ativar a autenticação em dois fatores?", "evidence": ["Google Authenticator"]},
+        {"question": "Qual o prazo para encerramento da conta?", "evidence": ["10 dias úteis"]},
+        {"question": "Qual o telefone do suporte?", "evidence": ["0800-123-4567"]},
+        {"question": "Qual o e-mail de atendimento?", "evidence": ["suporte@safebank.com"]},
+        {"question": "Como falo com a ouvidoria?", "evidence": ["ouvidoria@safebank.com"]},
+        {"question": "Onde posso sacar dinheiro?", "evidence": ["Banco24Horas"]},
+        {"question": "Quanto tempo leva para a conta ser ativada?", "evidence": ["2 dias úteis"]},
+        {"question": "Como desbloqueio meu cartão?", "evidence": ["Desbloquear cartão"]},
+        {"question": "Quais investimentos estão disponíveis?", "evidence": ["Tesouro Direto", "CDB"]},
+        {"question": "Posso fazer TED e DOC pelo app?", "evidence": ["TED"]},
+        {"question": "Como altero minha senha?", "evidence": ["Alterar senha"]},
+        {"question": "Como meus dados pessoais são protegidos?", "evidence": ["LGPD"]},
+        {"question": "Em quanto tempo um depósito por boleto cai na conta?", "evidence": ["após o pagamento"]},
+        {"question": "Posso pagar por aproximação?", "evidence": ["NFC"]},
+        {"question": "O app tem recursos de acessibilidade?", "evidence": ["Libras"]},
+    ],
+}
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços colapsados (quebras de linha do PDF viram espaço)"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def is_relevant(chunk: str, evidence) -> bool:
+    normalized = normalize_text(chunk)
+    return any(normalize_text(phrase) in normalized for phrase in evidence)
@@ -0,0 +1,80 @@
+"""
+Corpora fixos para os benchmarks
+PDFs reais do repositório (currículo e manual SafeBank) e versões sintéticas ampliadas,
+geradas de forma determinística para que resultados entre commits sejam comparáveis
+"""
+import random
+from pathlib import Path
+
+SPACE_DIR = Path(__file__).resolve().parents[1]
+REPO_DIR = SPACE_DIR.parent
+
+FIXTURE_PDFS = {
+    "cv": SPACE_DIR / "content_linkedin" / "CV_TiagoMilanez_AI_Optimized.pdf",
+    "safebank": REPO_DIR / "docs" / "projetos" / "llms-negocios" / "content" / "manual-safebank.pdf",
+}
+
+SCALE_FACTORS = (10, 100)
+
+QUERIES = {
+    "cv": [
+        "Qual sua experiência profissional?",
+        "Quais tecnologias você domina?",
+        "Quais suas certificações?",
+        "Experiência com LLMs e IA?",
+    ],
+    "safebank": [
+        "Como faço para cadastrar uma chave Pix?",
+        "Qual o prazo para encerramento da conta?",
+        "Como ativar a autenticação em dois fatores?",
+        "Qual o telefone do suporte?",
+    ],
+}
+
+WORDS = (
+    "experiência projetos python machine learning llm rag langchain faiss embeddings "
+    "engenharia dados análise dashboards automação cloud certificação itil oracle "
+    "conta cartão pix transferência boleto segurança autenticação investimentos crédito"
+).split()
+
+
+def is_real_pdf(path: Path) -> bool:
+    """Arquivos no Git LFS podem estar presentes apenas como ponteiro de texto"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(5) == b"%PDF-"
+    except OSError:
+        return False
+
+
+def available_pdfs():
+    """Fixtures PDF presentes e válidos neste checkout"""
+    return {name: path for name, path in FIXTURE_PDFS.items() if is_real_pdf(path)}
+
+
+def scaled_corpus(text: str, factor: int, seed: int = 42) -> str:
+    """
+    Amplia um texto `factor` vezes embaralhando os parágrafos a cada cópia,
+    para que os chunks não sejam idênticos entre si.
+    """
+    rng = random.Random(seed)
+    paragraphs = [p for p in text.split("\n") if p.strip()]
+    copies = []
+    for i in range(factor):
+        shuffled = paragraphs[:]
+        rng.shuffle(shuffled)
+        copies.append(f"Cópia {i + 1}\n" + "\n".join(shuffled))
+    return "\n".join(copies)
+
+
+def synthetic_chunks(count: int, seed: int = 42):
+    """Chunks sintéticos com comprimentos variados (100 a 1000 caracteres)"""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        target = rng.randint(100, 1000)
+        words = []
+        while sum(len(w) + 1 for w in words) < target:
+            words.append(rng.choice(WORDS))
+        chunks.append(" ".join(words))
+    return chunks
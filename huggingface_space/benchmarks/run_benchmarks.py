@@ -0,0 +1,213 @@
+"""
+Suite de benchmarks do caminho crítico do RAG
+Mede cada etapa (extração do PDF, split, embeddings, carga do FAISS, busca/MMR,
+montagem do contexto e fluxo completo com LLM fake) e grava o resultado em JSON
+por commit, para comparar regressões com benchmarks/compare.py
+
+Uso:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --stages split search mmr --scales 10
+    python benchmarks/compare.py benchmarks/results/<antes>.json benchmarks/results/<depois>.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from fixtures import QUERIES, SCALE_FACTORS, available_pdfs, scaled_corpus
+
+STAGES = [
+    "pdf_extract", "split", "doc_embed", "query_embed", "faiss_load",
+    "search", "mmr", "context_pack", "end_to_end",
+]
+RESULTS_DIR = BENCH_DIR / "results"
+
+
+def measure(fn, repeat: int, warmup: int = 1) -> dict:
+    """Executa fn `warmup + repeat` vezes e resume os tempos (ms) das medições"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(samples)
+    return {
+        "repeat": repeat,
+        "min_ms": ordered[0],
+        "median_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))],
+        "mean_ms": statistics.mean(ordered),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# -------------------------
+# Etapas
+# -------------------------
+def bench_corpus(name, text, queries, embeddings, args, stages, llm=None):
+    from langchain_community.vectorstores import FAISS
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from index_embedding import embed_texts_bucketed
+    from rag_core import SessionState, chat_llm_flow, pack_context
+
+    results = {"chars": len(text)}
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    chunks = splitter.split_text(text)
+    results["chunks"] = len(chunks)
+
+    if "split" in stages:
+        results["split"] = measure(lambda: splitter.split_text(text), args.repeat)
+
+    embed_chunks = chunks[:args.max_embed_chunks]
+    vectors, _ = embed_texts_bucketed(embeddings, embed_chunks, calibrate=False)
+    if "doc_embed" in stages:
+        stats = measure(lambda: embed_texts_bucketed(embeddings, embed_chunks, calibrate=False), 1, warmup=0)
+        stats["chunks_per_sec"] = len(embed_chunks) / (stats["median_ms"] / 1000)
+        results["doc_embed"] = stats
+
+    if "query_embed" in stages:
+        results["query_embed"] = measure(lambda: [embeddings.embed_query(q) for q in queries], args.repeat)
+        results["query_embed"]["queries"] = len(queries)
+
+    vectorstore = FAISS.from_embeddings(list(zip(embed_chunks, vectors)), embedding=embeddings)
+    query_vector = embeddings.embed_query(queries[0])
+
+    if "faiss_load" in stages:
+        with tempfile.TemporaryDirectory() as tmp:
+            vectorstore.save_local(tmp)
+            results["faiss_load"] = measure(
+                lambda: FAISS.load_local(tmp, embeddings, allow_dangerous_deserialization=True), args.repeat
+            )
+            results["faiss_load"]["index_bytes"] = sum(p.stat().st_size for p in Path(tmp).iterdir())
+
+    if "search" in stages:
+        results["search"] = measure(lambda: vectorstore.similarity_search_by_vector(query_vector, k=3), args.repeat)
+    if "mmr" in stages:
+        results["mmr"] = measure(
+            lambda: vectorstore.max_marginal_relevance_search_by_vector(query_vector, k=3, fetch_k=4), args.repeat
+        )
+
+    if "context_pack" in stages:
+        retrieved = [d.page_content for d in vectorstore.similarity_search_by_vector(query_vector, k=5)]
+        results["context_pack"] = measure(lambda: pack_context(retrieved), args.repeat * 10)
+
+    if "end_to_end" in stages and llm is not None:
+        retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 3, "fetch_k": 4})
+        cycle = iter(range(10 ** 9))
+
+        def one_turn():
+            question = queries[next(cycle) % len(queries)]
+            _, rag_result = chat_llm_flow(retriever, question, "pt", llm=llm, session_state=SessionState())
+            if "error" in rag_result:
+                raise RuntimeError(rag_result["error"])
+
+        results["end_to_end"] = measure(one_turn, args.repeat)
+
+    print(f"  ✅ {name}: {len(chunks)} chunks")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do caminho crítico do RAG")
+    parser.add_argument("--model", default="sentence-transformers/paraphrase-MiniLM-L3-v2")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--scales", type=int, nargs="*", default=list(SCALE_FACTORS),
+                        help="Fatores de ampliação sintética de cada PDF")
+    parser.add_argument("--max-embed-chunks", type=int, default=2000,
+                        help="Limite de chunks por corpus nas etapas de embedding/índice")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="Latência do LLM fake no fluxo completo (0 = só overhead do pipeline)")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+    stages = set(args.stages)
+    # Sem FAQ: no fluxo completo, as perguntas seriam respondidas pelo arquivo, sem LLM
+    os.environ["FAQ_ENABLED"] = "0"
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from rag_core import extract_text_pdf, load_llm
+
+    pdfs = available_pdfs()
+    if not pdfs:
+        print("ERRO: nenhum PDF de fixture disponível (arquivos do Git LFS baixados?)")
+        return
+
+    texts = {}
+    results = {}
+    for name, path in pdfs.items():
+        texts[name] = extract_text_pdf(path)
+        if "pdf_extract" in stages:
+            results.setdefault(name, {})["pdf_extract"] = measure(lambda: extract_text_pdf(path), args.repeat)
+
+    print(f"Carregando modelo de embeddings: {args.model}")
+    embeddings = HuggingFaceEmbeddings(
+        model_name=args.model,
+        cache_folder="./cache",
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'show_progress_bar': False}
+    )
+
+    llm = None
+    server = None
+    if "end_to_end" in stages:
+        from fake_groq_server import FakeGroqConfig, start_server
+
+        server, base_url = start_server(FakeGroqConfig(
+            latency_dist="fixed", latency_ms=args.llm_latency_ms, tokens_per_sec=0, error_rate_429=0.0
+        ))
+        os.environ.setdefault("GROQ_API_KEY", "fake-key")
+        llm = load_llm(base_url=base_url)
+
+    for name, text in texts.items():
+        corpora = {name: text}
+        corpora.update({f"{name}_x{factor}": scaled_corpus(text, factor) for factor in args.scales})
+        for corpus_name, corpus_text in corpora.items():
+            corpus_results = bench_corpus(corpus_name, corpus_text, QUERIES[name], embeddings, args, stages, llm)
+            results.setdefault(corpus_name, {}).update(corpus_results)
+
+    if server:
+        server.shutdown()
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "model": args.model,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"💾 Resultados salvos em {output}")
+
+
+if __name__ == "__main__":
+    main()
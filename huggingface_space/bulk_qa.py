@@ -0,0 +1,225 @@
+"""
+Perguntas em lote pelo mesmo pipeline do chat (reformulação -> recuperação -> resposta)
+Para avaliação e aquecimento de cache: concorrência limitada, prioridade de lote no limitador
+da Groq (respostas ao usuário passam na frente) e saída JSONL retomável
+
+Uso:
+    python bulk_qa.py perguntas.txt --output respostas.jsonl --concurrency 4
+    python bulk_qa.py perguntas.jsonl --bot safebank --output safebank.jsonl
+    python bulk_qa.py perguntas.txt --output respostas.jsonl --groq-api-base http://127.0.0.1:8900
+
+Entrada: um texto por linha (linhas vazias e iniciadas por # são ignoradas) ou JSONL com
+{"question", "id"?, "language"?}. Cada linha da saída traz resposta, IDs e scores dos chunks,
+tokens e tempos por etapa. Rodar de novo com o mesmo --output pula as perguntas já respondidas
+e repete as que falharam.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List
+
+from load_test import percentile
+
+# Índice e prompts por bot; "linkedin" usa os padrões do rag_core
+BOTS = {
+    "linkedin": {},
+    "safebank": {
+        "env": {
+            "FAISS_INDEX_DIR_LINKEDIN": os.getenv(
+                "FAISS_INDEX_DIR_SAFEBANK", "../docs/projetos/llms-negocios/index_faiss"
+            ),
+            "CONTENT_PATH_LINKEDIN": os.getenv("CONTENT_PATH_SAFEBANK", "../docs/projetos/llms-negocios/content"),
+            "RETRIEVAL_INDEX_NAME": "safebank",
+        },
+        "prompts": {
+            "pt": {
+                "system_prompt_qa": (
+                    "Você é um assistente virtual prestativo e está respondendo perguntas gerais sobre os "
+                    "serviços de uma empresa.\nUse somente o contexto fornecido para responder a pergunta. "
+                    "Se o contexto não contiver a resposta, seja honesto e diga que não há informação "
+                    "suficiente.\nMantenha a resposta concisa e responda em português.\n\n"
+                    "Pergunta: {input}\n\nContexto:\n{context}"
+                ),
+                "no_info": (
+                    "Desculpe — não encontrei contexto suficiente nos documentos carregados para "
+                    "responder com segurança."
+                ),
+            },
+            "en": {
+                "system_prompt_qa": (
+                    "You are a helpful virtual assistant answering general questions about a company's "
+                    "services.\nUse only the provided context to answer the question. If the context does "
+                    "not contain the answer, be honest and say there is not enough information.\n"
+                    "Keep the answer concise and answer in English.\n\n"
+                    "Question: {input}\n\nContext:\n{context}"
+                ),
+                "no_info": "Sorry — I could not find enough context in the loaded documents to answer safely.",
+            },
+        },
+    },
+}
+
+
+def question_id(question: str, language: str) -> str:
+    """ID estável da pergunta (não depende da posição no arquivo)"""
+    return hashlib.sha1(f"{language}\n{question.strip()}".encode("utf-8")).hexdigest()[:12]
+
+
+def read_questions(path: str, default_language: str) -> List[Dict]:
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                item = json.loads(line)
+                question = item["question"]
+                language = item.get("language", default_language)
+                qid = str(item.get("id") or question_id(question, language))
+            else:
+                question, language = line, default_language
+                qid = question_id(question, language)
+            questions.append({"id": qid, "question": question, "language": language})
+    return questions
+
+
+def load_done(path: Path) -> Dict[str, Dict]:
+    """
+    Respostas já gravadas sem erro; o arquivo é reescrito só com elas, descartando falhas
+    e uma última linha truncada por interrupção
+    """
+    if not path.exists():
+        return {}
+    done = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not record.get("error"):
+                done[record["id"]] = record
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in done.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return done
+
+
+def answer_question(item, retriever, llm, model, version, stop):
+    from cancellation import cancel_scope
+    from rag_core import make_rag_response
+    from rate_limiter import PRIORITY_BATCH
+    from tracing import span, start_trace
+
+    record = {"id": item["id"], "question": item["question"], "language": item["language"]}
+    start = time.perf_counter()
+    with cancel_scope(stop), start_trace() as trace:
+        try:
+            with span("rag_total"):
+                result = make_rag_response(
+                    item["question"], [], retriever, llm, item["language"], priority=PRIORITY_BATCH
+                )
+            record.update({
+                "answer": result["answer"].strip(),
+                "reformulated_question": result["reformulated_question"],
+                "sources": result.get("sources", []),
+                "error": None,
+            })
+        except Exception as e:
+            if stop.cancelled:
+                raise
+            record.update({"answer": None, "sources": [], "error": f"{type(e).__name__}: {e}"})
+    record.update({
+        "tokens": trace.tokens,
+        "timings_ms": {stage: round(seconds * 1000, 2) for stage, seconds in trace.timings.items()},
+        "seconds": round(time.perf_counter() - start, 3),
+        "model": model,
+        "index_version": version,
+    })
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perguntas em lote pelo pipeline RAG, com saída JSONL")
+    parser.add_argument("input", help="Arquivo .txt (uma pergunta por linha) ou .jsonl")
+    parser.add_argument("--output", required=True, help="JSONL de saída (retomado se já existir)")
+    parser.add_argument("--bot", choices=sorted(BOTS), default="linkedin")
+    parser.add_argument("--language", choices=["pt", "en"], default="pt", help="Idioma padrão das perguntas")
+    parser.add_argument("--concurrency", type=int, default=4, help="Perguntas em andamento ao mesmo tempo")
+    parser.add_argument("--limit", type=int, default=0, help="Processar no máximo N perguntas pendentes")
+    parser.add_argument("--groq-api-base", default="", help="Endpoint compatível com a Groq (ex.: fake_groq_server.py)")
+    args = parser.parse_args()
+
+    # Antes de importar o rag_core: índice e serviço de recuperação são lidos na importação
+    bot = BOTS[args.bot]
+    for key, value in bot.get("env", {}).items():
+        os.environ[key] = value
+    if args.groq_api_base:
+        os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    if not os.getenv("GROQ_API_KEY"):
+        parser.error("GROQ_API_KEY não configurada")
+
+    from cancellation import CancelToken
+    from logging_setup import setup_logging
+    from rag_core import ID_MODEL, TRANSLATIONS, index_version, load_llm, load_retriever
+
+    setup_logging()
+    for language, prompts in bot.get("prompts", {}).items():
+        TRANSLATIONS[language].update(prompts)
+
+    questions = read_questions(args.input, args.language)
+    output = Path(args.output)
+    done = load_done(output)
+    pending = [q for q in questions if q["id"] not in done]
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"📋 {len(questions)} perguntas: {len(questions) - len(pending)} já respondidas, {len(pending)} pendentes")
+    if not pending:
+        return
+
+    llm = load_llm(base_url=args.groq_api_base) if args.groq_api_base else load_llm()
+    retriever = load_retriever()
+    version = index_version()
+
+    stop = CancelToken()
+    lock = threading.Lock()
+    records = []
+    start = time.perf_counter()
+    with open(output, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(answer_question, q, retriever, llm, ID_MODEL, version, stop) for q in pending]
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                with lock:
+                    # Uma linha completa por pergunta: uma interrupção perde no máximo a linha em escrita
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    records.append(record)
+                if len(records) % 10 == 0 or len(records) == len(pending):
+                    print(f"  {len(records)}/{len(pending)} ({time.perf_counter() - start:.0f}s)")
+        except KeyboardInterrupt:
+            print("\n⏹️ Interrompido: cancelando perguntas em andamento (rode de novo para retomar)")
+            stop.cancel()
+            for future in futures:
+                future.cancel()
+            sys.exit(130)
+
+    latencies = [r["seconds"] for r in records if not r["error"]]
+    errors = sum(1 for r in records if r["error"])
+    total_tokens = sum(t["prompt"] + t["completion"] for r in records for t in r["tokens"].values())
+    print(f"\nRespondidas: {len(latencies)} | erros: {errors} | tokens: {total_tokens}")
+    print(f"Latência:    p50 {percentile(latencies, 50):.2f}s | p95 {percentile(latencies, 95):.2f}s")
+    print(f"💾 Saída em {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Tarefas canceláveis por sessão
+Cada pergunta roda em uma tarefa com um CancelToken; uma nova pergunta da mesma sessão
+cancela a anterior, que é interrompida no próximo ponto de checagem (entre etapas, na fila
+do rate limiter ou entre os chunks do streaming da Groq, fechando a conexão)
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from tracing import REGISTRY, current_stage
+
+logger = logging.getLogger(__name__)
+
+SESSION_TASK_WORKERS = int(os.getenv("SESSION_TASK_WORKERS", 16))
+
+CANCELLATIONS = REGISTRY.counter("rag_requests_cancelled_total", "Requisições canceladas, por etapa interrompida")
+
+
+class RequestCancelled(Exception):
+    """A requisição foi substituída por uma mais nova da mesma sessão"""
+
+
+class CancelToken:
+    """Token de cancelamento; um token filho também fica cancelado quando o pai é cancelado"""
+
+    def __init__(self, parent: Optional["CancelToken"] = None):
+        self._event = threading.Event()
+        self.parent = parent
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def wait(self, timeout: float) -> bool:
+        """Dorme até timeout ou até o cancelamento (retorna True se cancelado)"""
+        if self.parent is None:
+            return self._event.wait(timeout)
+        deadline = time.monotonic() + timeout
+        while not self.cancelled:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._event.wait(min(remaining, 0.25))
+        return True
+
+
+_current_token: contextvars.ContextVar = contextvars.ContextVar("rag_cancel_token", default=None)
+_chunk_sink: contextvars.ContextVar = contextvars.ContextVar("rag_chunk_sink", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]):
+    """Torna o token visível aos pontos de checagem chamados dentro do bloco"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_chunk_sink() -> Optional[Callable[[str], None]]:
+    return _chunk_sink.get()
+
+
+@contextmanager
+def stream_chunks(sink: Optional[Callable[[str], None]]):
+    """Encaminha a sink(chunk) os chunks gerados por invoke_cancellable dentro do bloco (SSE da API)"""
+    reset = _chunk_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _chunk_sink.reset(reset)
+
+
+def check_cancelled():
+    """Ponto de checagem: interrompe a requisição atual se ela foi cancelada"""
+    token = _current_token.get()
+    if token is not None and token.cancelled:
+        CANCELLATIONS.inc(stage=current_stage())
+        raise RequestCancelled()
+
+
+def invoke_cancellable(chain, inputs):
+    """
+    chain.invoke para chains que terminam em texto (StrOutputParser); com um token ativo usa
+    streaming e abandona a geração ao cancelar, fechando a conexão com a Groq.
+    Dentro de stream_chunks, cada chunk também é repassado ao sink.
+    """
+    sink = _chunk_sink.get()
+    if _current_token.get() is None and sink is None:
+        return chain.invoke(inputs)
+    check_cancelled()
+    parts = []
+    stream = chain.stream(inputs)
+    try:
+        for chunk in stream:
+            parts.append(chunk)
+            if sink is not None:
+                sink(chunk)
+            check_cancelled()
+    finally:
+        stream.close()
+    return "".join(parts)
+
+
+class SessionTask:
+    def __init__(self, future: Future, token: CancelToken):
+        self.future = future
+        self.token = token
+
+    def cancel(self):
+        self.token.cancel()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: Optional[float] = None):
+        return self.future.result(timeout)
+
+
+_executor = ThreadPoolExecutor(max_workers=SESSION_TASK_WORKERS, thread_name_prefix="rag-session")
+
+
+def _run(token, fn, args, kwargs):
+    with cancel_scope(token):
+        return fn(*args, **kwargs)
+
+
+def submit_session_task(session_state, fn, *args, **kwargs) -> SessionTask:
+    """
+    Executa fn(*args, **kwargs) em uma tarefa da sessão, cancelando a tarefa anterior
+    ainda em andamento (nova pergunta enviada antes da resposta da anterior)
+    """
+    previous = session_state.get("active_task")
+    if previous is not None and not previous.done():
+        logger.info("Nova pergunta na sessão: cancelando a requisição anterior")
+        previous.cancel()
+
+    token = CancelToken()
+    context = contextvars.copy_context()
+    future = _executor.submit(context.run, _run, token, fn, args, kwargs)
+    task = SessionTask(future, token)
+    session_state["active_task"] = task
+    return task
@@ -0,0 +1,147 @@
+"""
+Remoção de chunks quase duplicados na indexação (MinHash + LSH)
+Cabeçalhos, rodapés, blocos de contato e avisos legais se repetem a cada página e, com a
+sobreposição do splitter, geram chunks quase idênticos que custam tempo de embedding,
+memória do índice e vagas do MMR. Cada grupo de quase duplicados vira um único chunk
+guardado, com referências (id, página, seção) para as ocorrências descartadas.
+Chunks com números diferentes nunca se juntam ("10 dias úteis" x "2 dias úteis"): um fato
+trocado muda poucos shingles de um chunk longo e passaria por qualquer limiar de Jaccard.
+"""
+import os
+import re
+import random
+import hashlib
+import logging
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEDUP_ENABLED = os.getenv("INDEX_DEDUP", "1") == "1"
+# Similaridade de Jaccard (entre shingles de palavras) a partir da qual dois chunks são o mesmo
+DEDUP_THRESHOLD = float(os.getenv("INDEX_DEDUP_THRESHOLD", 0.95))
+DEDUP_NUM_PERM = int(os.getenv("INDEX_DEDUP_NUM_PERM", 64))
+DEDUP_SHINGLE_WORDS = int(os.getenv("INDEX_DEDUP_SHINGLE_WORDS", 3))
+
+_PRIME = (1 << 61) - 1
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+# Campos dos metadados copiados para as referências das ocorrências descartadas; com
+# parent-child, o parent_id mantém o pai do filho descartado alcançável (expand_to_parents)
+REFERENCE_FIELDS = ("source", "language", "page", "section", "parent_id")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sem acentos"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def numbers(text: str) -> Tuple[str, ...]:
+    """Números do texto, em ordem: só chunks com os mesmos números podem ser duplicados"""
+    return tuple(_NUMBER_RE.findall(text))
+
+
+def shingles(text: str, size: int = DEDUP_SHINGLE_WORDS) -> set:
+    """n-gramas de palavras do texto normalizado (minúsculas, sem acentos)"""
+    words = re.findall(r"\w+", normalize(text))
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def permutations(num_perm: int, seed: int = 1) -> List[Tuple[int, int]]:
+    """Funções de hash (a*x + b) mod p que fazem o papel das permutações do MinHash"""
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+
+def minhash(items: set, perms: Sequence[Tuple[int, int]]) -> Tuple[int, ...]:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in items]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in perms)
+
+
+def lsh_bands(num_perm: int, threshold: float, min_recall: float = 0.95) -> Tuple[int, int]:
+    """
+    (bandas, linhas por banda) com mais linhas por banda (menos candidatos falsos) em que um
+    par com similaridade igual ao limiar ainda cai no mesmo bucket com probabilidade
+    1 - (1 - t^r)^b >= min_recall; os candidatos são confirmados depois pela assinatura
+    """
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    good = [(b, r) for b, r in options if 1 - (1 - threshold ** r) ** b >= min_recall]
+    return max(good, key=lambda br: br[1]) if good else (num_perm, 1)
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Jaccard estimado: fração das posições em que as assinaturas coincidem"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def dedup_chunks(chunks: Sequence[str], metadatas: Optional[Sequence[Dict]] = None,
+                 threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM
+                 ) -> Tuple[List[str], Optional[List[Dict]], List[int], Dict]:
+    """
+    Mantém a primeira ocorrência de cada grupo de quase duplicados. Só os chunks mantidos
+    entram nos buckets do LSH e cada candidato é confirmado pela similaridade estimada com
+    o representante (e pelos mesmos números), então grupos não crescem por encadeamento
+    (A~B, B~C, A≁C).
+    Retorna chunks e metadados mantidos, suas posições originais e o relatório.
+    """
+    start = time.perf_counter()
+    perms = permutations(num_perm)
+    bands, rows = lsh_bands(num_perm, threshold)
+    buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(bands)]
+    signatures: Dict[int, Tuple[int, ...]] = {}
+    facts: Dict[int, Tuple[str, ...]] = {}
+    duplicates: Dict[int, List[int]] = {}
+    kept: List[int] = []
+
+    for position, text in enumerate(chunks):
+        signature = minhash(shingles(text), perms)
+        keys = [signature[band * rows:(band + 1) * rows] for band in range(bands)]
+        found = numbers(text)
+        candidates = {
+            rep for band, key in enumerate(keys) for rep in buckets[band].get(key, ()) if facts[rep] == found
+        }
+        match = max(candidates, key=lambda rep: similarity(signature, signatures[rep]), default=None)
+        if match is not None and similarity(signature, signatures[match]) >= threshold:
+            duplicates.setdefault(match, []).append(position)
+            continue
+        kept.append(position)
+        signatures[position] = signature
+        facts[position] = found
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(position)
+
+    kept_metadatas = None
+    if metadatas is not None or duplicates:
+        kept_metadatas = []
+        for position in kept:
+            metadata = dict(metadatas[position]) if metadatas is not None else {}
+            if position in duplicates:
+                metadata["duplicates"] = [
+                    {"id": f"chunk-{dup}", **{
+                        key: metadatas[dup][key] for key in REFERENCE_FIELDS
+                        if metadatas is not None and key in metadatas[dup]
+                    }}
+                    for dup in duplicates[position]
+                ]
+            kept_metadatas.append(metadata)
+
+    dropped = [dup for dups in duplicates.values() for dup in dups]
+    report = {
+        "chunks_in": len(chunks),
+        "chunks_out": len(kept),
+        "duplicates": len(dropped),
+        "groups": len(duplicates),
+        "chars_saved": sum(len(chunks[dup]) for dup in dropped),
+        "threshold": threshold,
+        "bands": bands,
+        "rows": rows,
+        "seconds": time.perf_counter() - start,
+    }
+    logger.info(
+        f"Dedup: {len(chunks)} -> {len(kept)} chunks ({len(dropped)} quase duplicados em "
+        f"{len(duplicates)} grupos, {report['seconds']:.2f}s)"
+    )
+    return [chunks[p] for p in kept], kept_metadatas, kept, report
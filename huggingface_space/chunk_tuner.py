@@ -0,0 +1,192 @@
+"""
+Ajuste dos parâmetros de chunking (tamanho, sobreposição e estratégia)
+Varre as combinações sobre o corpus e mede, para cada uma: chunks gerados, tempo de build,
+bytes do índice salvo (FAISS + docstore), tamanho médio dos chunks, texto duplicado pela
+sobreposição, recall@k nas perguntas rotuladas de benchmarks/eval_sets.py e tokens médios do
+prompt de resposta. O vencedor é a combinação mais barata em tokens (depois em bytes) entre as de melhor recall.
+Com --child-sizes, mede também o parent-child (recall e tokens já com os pais expandidos).
+Com --apply, o índice é reconstruído com ela e os parâmetros vão para o index_meta.json,
+lido pelo rag_core, create_index.py, reprocess_index.py e agent_app.py.
+
+Uso:
+    python chunk_tuner.py                                  # currículo, só relatório
+    python chunk_tuner.py --apply
+    python chunk_tuner.py --content-path ../docs/projetos/llms-negocios/content \\
+        --index-dir ../docs/projetos/llms-negocios/index_faiss --eval-set safebank --apply
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from itertools import product
+from pathlib import Path
+
+from benchmarks.eval_sets import EVAL_SETS, is_relevant
+from chunking import STRATEGIES, index_chunks, save_parents, write_index_meta
+
+
+def index_size_bytes(vectorstore, parents) -> int:
+    """Bytes do índice salvo: FAISS, docstore e, no parent-child, o parents.json"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vectorstore.save_local(tmp)
+        save_parents(tmp, parents)
+        return sum(p.stat().st_size for p in Path(tmp).iterdir())
+
+
+def evaluate(chunking, pdf_files, extract_text, embeddings, items, k, fetch_k, language="pt"):
+    from index_embedding import build_vectorstore
+    from rag_core import ScoredFAISSRetriever, get_qa_prompt, pack_context
+    from rate_limiter import GROQ_EXPECTED_COMPLETION_TOKENS, estimate_tokens
+
+    start = time.perf_counter()
+    chunks, metadatas, parents = index_chunks(pdf_files, chunking, extract_text)
+    vectorstore, _ = build_vectorstore(chunks, embeddings, metadatas=metadatas)
+    build_seconds = time.perf_counter() - start
+    stored = [vectorstore.docstore.search(doc_id).page_content for doc_id in vectorstore.index_to_docstore_id.values()]
+    # Mesmo retriever do runtime: MMR com k/fetch_k e expansão para as seções pai
+    retriever = ScoredFAISSRetriever(vectorstore=vectorstore, k=k, fetch_k=fetch_k, parents=parents)
+
+    hits = []
+    prompt_tokens = []
+    qa_prompt = get_qa_prompt(language)
+    for item in items:
+        texts_found = [doc.page_content for doc in retriever.invoke(item["question"])]
+        context = pack_context(texts_found)
+        hits.append(any(is_relevant(text, item["evidence"]) for text in texts_found))
+        prompt_tokens.append(
+            estimate_tokens(qa_prompt, item["question"], context) - GROQ_EXPECTED_COMPLETION_TOKENS
+        )
+
+    total_chars = sum(len(extract_text(pdf)) for pdf in pdf_files)
+    return {
+        **chunking,
+        "chunks": len(stored),
+        "build_seconds": build_seconds,
+        "parents": len(parents),
+        "index_bytes": index_size_bytes(vectorstore, parents),
+        "avg_chunk_chars": sum(len(c) for c in stored) / max(1, len(stored)),
+        "duplication": sum(len(c) for c in stored) / max(1, total_chars),
+        f"recall@{k}": statistics.mean(hits) if hits else 0.0,
+        "avg_prompt_tokens": statistics.mean(prompt_tokens) if prompt_tokens else 0.0,
+    }
+
+
+def choose(rows, recall_key: str, tolerance: float):
+    """Entre as combinações a até `tolerance` do melhor recall, a de menos tokens e menor índice"""
+    best_recall = max(row[recall_key] for row in rows)
+    candidates = [row for row in rows if row[recall_key] >= best_recall - tolerance]
+    return min(candidates, key=lambda row: (row["avg_prompt_tokens"], row["index_bytes"], row["chunks"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ajuste de chunk_size, sobreposição e estratégia de chunking")
+    parser.add_argument("--content-path", help="Diretório dos PDFs (padrão: CONTENT_PATH do rag_core)")
+    parser.add_argument("--index-dir", help="Diretório do índice (padrão: FAISS_INDEX_DIR do rag_core)")
+    parser.add_argument("--model", help="Modelo de embeddings (padrão: EMBEDDING_MODEL do rag_core)")
+    parser.add_argument("--eval-set", choices=sorted(EVAL_SETS), default="cv", help="Perguntas rotuladas do corpus")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[400, 600, 800, 1000, 1200])
+    parser.add_argument("--overlaps", type=float, nargs="+", default=[0.0, 0.1, 0.2],
+                        help="Sobreposição como fração do chunk_size")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument("--child-sizes", type=int, nargs="+", default=[0],
+                        help="Tamanhos dos trechos filhos do parent-child (0 = chunks simples)")
+    parser.add_argument("--k", type=int, default=3, help="Chunks recuperados por pergunta")
+    parser.add_argument("--fetch-k", type=int, default=4, help="Candidatos do MMR")
+    parser.add_argument("--recall-tolerance", type=float, default=0.0,
+                        help="Perda de recall aceita em troca de menos tokens/bytes")
+    parser.add_argument("--apply", action="store_true",
+                        help="Reconstrói o índice com a combinação escolhida e grava o index_meta.json")
+    parser.add_argument("--output", help="JSON com todas as combinações medidas")
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    from index_embedding import build_vectorstore
+    from logging_setup import setup_logging
+    from rag_core import CONTENT_PATH, EMBEDDING_MODEL, FAISS_INDEX_DIR, extract_text_pdf
+
+    setup_logging()
+    content_path = Path(args.content_path or CONTENT_PATH)
+    index_dir = args.index_dir or FAISS_INDEX_DIR
+    model = args.model or EMBEDDING_MODEL
+    pdf_files = sorted(content_path.glob("*.pdf"))
+    if not pdf_files:
+        parser.error(f"Nenhum arquivo PDF encontrado em: {content_path}")
+    # Texto corrido extraído uma vez; a estratégia layout relê os blocos de cada PDF
+    texts = {pdf: extract_text_pdf(pdf) for pdf in pdf_files}
+    extract_text = texts.__getitem__
+
+    print(f"Carregando modelo de embeddings: {model}")
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model,
+        cache_folder="./cache",
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'show_progress_bar': False}
+    )
+    items = EVAL_SETS[args.eval_set]
+
+    rows = []
+    for strategy, size, overlap, child in product(args.strategies, args.chunk_sizes, args.overlaps, args.child_sizes):
+        if child >= size:
+            continue
+        chunking = {
+            "strategy": strategy, "chunk_size": size, "chunk_overlap": int(size * overlap),
+            "child_chunk_size": child, "child_chunk_overlap": int(child * overlap),
+        }
+        rows.append(evaluate(chunking, pdf_files, extract_text, embeddings, items, args.k, args.fetch_k))
+        print(f"  ✅ {strategy} {size}/{chunking['chunk_overlap']}" + (f" filhos {child}" if child else ""))
+
+    recall_key = f"recall@{args.k}"
+    chosen = choose(rows, recall_key, args.recall_tolerance)
+    header = (
+        f"{'':2}{'estratégia':<10} {'chunk':>5} {'overlap':>7} {'filho':>5} {'chunks':>6} {'build s':>8} "
+        f"{'índice KB':>10} {'méd':>5} {'dup':>5} {recall_key:>9} {'tokens':>7}"
+    )
+    print(f"\n📊 {len(items)} perguntas de '{args.eval_set}' — * = escolhida")
+    print(header)
+    print("-" * len(header))
+    for row in sorted(rows, key=lambda r: (-r[recall_key], r["avg_prompt_tokens"])):
+        print(
+            f"{'*' if row is chosen else ' ':2}{row['strategy']:<10} {row['chunk_size']:>5} "
+            f"{row['chunk_overlap']:>7} {row['child_chunk_size']:>5} {row['chunks']:>6} {row['build_seconds']:>8.2f} "
+            f"{row['index_bytes'] / 1024:>10.1f} {row['avg_chunk_chars']:>5.0f} {row['duplication']:>5.2f} "
+            f"{row[recall_key]:>9.3f} {row['avg_prompt_tokens']:>7.0f}"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"chosen": chosen, "results": rows}, indent=2), encoding="utf-8")
+        print(f"💾 Resultados salvos em {args.output}")
+
+    chunking = {
+        key: chosen[key] for key in ("strategy", "chunk_size", "chunk_overlap", "child_chunk_size", "child_chunk_overlap")
+    }
+    if not args.apply:
+        print(f"\nEscolhida: {chunking} (use --apply para reconstruir o índice em {index_dir})")
+        return
+
+    print(f"\nReconstruindo o índice em {index_dir} com {chunking}...")
+    chunks, metadatas, parents = index_chunks(pdf_files, chunking, extract_text)
+    vectorstore, report = build_vectorstore(chunks, embeddings, metadatas=metadatas)
+    os.makedirs(index_dir, exist_ok=True)
+    vectorstore.save_local(index_dir)
+    save_parents(index_dir, parents)
+    write_index_meta(
+        index_dir, chunking, model, vectorstore.index.ntotal,
+        dedup=report.get("dedup"),
+        parents=len(parents),
+        partitions=report["partitions"],
+        retrieval={"k": args.k, "fetch_k": args.fetch_k},
+        tuning={
+            "eval_set": args.eval_set,
+            recall_key: chosen[recall_key],
+            "avg_prompt_tokens": chosen["avg_prompt_tokens"],
+            "index_bytes": chosen["index_bytes"],
+        },
+    )
+    print(f"✅ Índice e index_meta.json salvos em {index_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Parâmetros de chunking e metadados do índice (index_meta.json)
+Builders (create_index, rag_core, reprocess_index, agent_app) leem daqui como dividir o
+texto e gravam no diretório do índice os parâmetros usados; o runtime lê o mesmo arquivo
+para usar o k da recuperação escolhido pelo chunk_tuner.py e para avisar se o índice foi
+gerado com outro modelo de embeddings.
+
+Com child_chunk_size > 0, cada chunk vira um "pai" guardado em parents.json e só trechos
+filhos menores são indexados; na busca, os filhos encontrados são trocados pelos pais
+(sem repetir) até o limite do contexto.
+"""
+import re
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_META_FILE = "index_meta.json"
+PARENTS_FILE = "parents.json"
+
+DEFAULT_CHUNKING = {
+    "strategy": "recursive", "chunk_size": 1000, "chunk_overlap": 200,
+    "child_chunk_size": 0, "child_chunk_overlap": 0,
+}
+DEFAULT_RETRIEVAL = {"k": 3, "fetch_k": 4}
+
+# recursive: parágrafo -> linha -> palavra (padrão do LangChain)
+# sentence: prefere cortar em fim de frase antes de cair para palavras
+# fixed: janelas de tamanho fixo, sem respeitar a estrutura do texto
+# layout: seções do PDF pelos títulos (pdf_layout.py), com página e seção nos metadados
+STRATEGIES = ("recursive", "sentence", "fixed", "layout")
+
+# Palavras funcionais mais frequentes de cada idioma, para marcar o idioma dos documentos
+LANGUAGE_WORDS = {
+    "pt": frozenset("de do da dos das em no na nos nas para com que não uma os as ao pelo pela é são".split()),
+    "en": frozenset("the of and to in is for with on that by an are from this at as be".split()),
+}
+
+
+def make_splitter(chunking: Dict):
+    from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
+
+    strategy = chunking.get("strategy", "recursive")
+    size, overlap = int(chunking["chunk_size"]), int(chunking["chunk_overlap"])
+    if strategy == "recursive":
+        return RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap)
+    if strategy == "sentence":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=size, chunk_overlap=overlap, separators=["\n\n", ". ", "? ", "! ", "\n", " ", ""]
+        )
+    if strategy == "fixed":
+        return CharacterTextSplitter(chunk_size=size, chunk_overlap=overlap, separator="")
+    if strategy == "layout":
+        raise ValueError("A estratégia 'layout' divide o PDF, não texto extraído: use chunk_pdfs")
+    raise ValueError(f"Estratégia de chunking desconhecida: {strategy}")
+
+
+def split_texts(texts: Sequence[str], chunking: Dict) -> List[str]:
+    splitter = make_splitter(chunking)
+    chunks = []
+    for text in texts:
+        chunks.extend(splitter.split_text(text))
+    return chunks
+
+
+def detect_language(text: str) -> str:
+    """Idioma ("pt" ou "en") com mais palavras funcionais no texto"""
+    words = re.findall(r"\w+", text.casefold())
+    counts = {language: sum(word in vocabulary for word in words) for language, vocabulary in LANGUAGE_WORDS.items()}
+    return max(counts, key=counts.get)
+
+
+def chunk_pdfs(pdf_files: Sequence, chunking: Dict, extract_text: Callable) -> Tuple[List[str], List[Dict]]:
+    """
+    Chunks e metadados dos PDFs. Na estratégia layout vêm de pdf_layout (página e seção);
+    nas demais, do texto extraído por `extract_text`, com o arquivo de origem. Todos levam o
+    idioma do documento, usado nas partições da busca filtrada (index_partitions.py).
+    """
+    chunks, metadatas = [], []
+    for pdf in pdf_files:
+        if chunking.get("strategy") == "layout":
+            from pdf_layout import layout_chunks
+
+            pdf_chunks, pdf_metadatas = layout_chunks(pdf, int(chunking["chunk_size"]), int(chunking["chunk_overlap"]))
+            language = detect_language("\n".join(pdf_chunks))
+        else:
+            text = extract_text(pdf)
+            pdf_chunks = split_texts([text], chunking)
+            pdf_metadatas = [{"source": Path(pdf).name} for _ in pdf_chunks]
+            language = detect_language(text)
+        for metadata in pdf_metadatas:
+            metadata["language"] = language
+        chunks.extend(pdf_chunks)
+        metadatas.extend(pdf_metadatas)
+    return chunks, metadatas
+
+
+def split_children(parents: Sequence[str], parent_metadatas: Sequence[Dict], chunking: Dict
+                   ) -> Tuple[List[str], List[Dict], Dict[str, Dict]]:
+    """
+    Filhos a indexar (com parent_id nos metadados) e o store de pais. Sem child_chunk_size,
+    os próprios chunks são indexados e o store fica vazio.
+    """
+    size = int(chunking.get("child_chunk_size") or 0)
+    if size <= 0:
+        return list(parents), list(parent_metadatas), {}
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=int(chunking.get("child_chunk_overlap", 0)))
+    children, child_metadatas, store = [], [], {}
+    for position, (text, metadata) in enumerate(zip(parents, parent_metadatas)):
+        parent_id = f"parent-{position}"
+        store[parent_id] = {"text": text, "metadata": dict(metadata)}
+        for child in splitter.split_text(text):
+            children.append(child)
+            child_metadatas.append({**metadata, "parent_id": parent_id})
+    return children, child_metadatas, store
+
+
+def index_chunks(pdf_files: Sequence, chunking: Dict, extract_text: Callable
+                 ) -> Tuple[List[str], List[Dict], Dict[str, Dict]]:
+    """Textos e metadados a indexar e o store de pais (vazio sem parent-child)"""
+    chunks, metadatas = chunk_pdfs(pdf_files, chunking, extract_text)
+    return split_children(chunks, metadatas, chunking)
+
+
+def save_parents(index_dir, parents: Dict[str, Dict]):
+    """Grava parents.json junto ao índice (ou remove o de um build anterior com parent-child)"""
+    path = Path(index_dir) / PARENTS_FILE
+    if not parents:
+        path.unlink(missing_ok=True)
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(parents, ensure_ascii=False), encoding="utf-8")
+
+
+def load_parents(index_dir) -> Dict[str, Dict]:
+    path = Path(index_dir) / PARENTS_FILE
+    try:
+        with open(path, encoding="utf-8") as f:
+            parents = json.load(f)
+    except FileNotFoundError:
+        return {}
+    logger.info(f"{len(parents)} seções pai carregadas de {path}")
+    return parents
+
+
+def expand_to_parents(hits: Sequence[Tuple[str, Dict]], parents: Dict[str, Dict], max_chars: int
+                      ) -> List[Tuple[str, Dict]]:
+    """
+    Troca os filhos encontrados (em ordem de relevância) pelos seus pais, sem repetir um pai,
+    enquanto couberem em max_chars. Um pai que não cabe dá lugar ao próprio filho. O pai
+    herda o score do melhor filho e lista em "children" os filhos que o trouxeram. Um filho
+    que absorveu quase duplicados (chunk_dedup.py) traz também os pais dos descartados.
+    """
+    selected: List[Tuple[str, Dict]] = []
+    expanded: Dict[str, Dict] = {}
+    used = 0
+    for text, metadata in hits:
+        references = [metadata, *metadata.get("duplicates", ())]
+        parent_ids = list(dict.fromkeys(ref["parent_id"] for ref in references if ref.get("parent_id")))
+        placed = False
+        for parent_id in parent_ids:
+            if parent_id in expanded:
+                expanded[parent_id]["children"].append(metadata.get("chunk_id"))
+                placed = True
+                continue
+            parent = parents.get(parent_id)
+            if parent is not None and used + len(parent["text"]) <= max_chars:
+                parent_metadata = {
+                    **parent["metadata"],
+                    "chunk_id": parent_id,
+                    "score": metadata.get("score"),
+                    "children": [metadata.get("chunk_id")],
+                }
+                expanded[parent_id] = parent_metadata
+                selected.append((parent["text"], parent_metadata))
+                used += len(parent["text"])
+                placed = True
+        if not placed and used + len(text) <= max_chars:
+            selected.append((text, metadata))
+            used += len(text)
+    return selected
+
+
+def read_index_meta(index_dir) -> Dict:
+    """Metadados gravados junto ao índice ({} para índices antigos, sem o arquivo)"""
+    path = Path(index_dir) / INDEX_META_FILE
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Metadados do índice ignorados: falha ao ler {path}: {e}")
+        return {}
+
+
+def chunking_params(index_dir) -> Dict:
+    """Chunking do índice existente (ou escolhido pelo tuner); padrão 1000/200 se não houver"""
+    return {**DEFAULT_CHUNKING, **read_index_meta(index_dir).get("chunking", {})}
+
+
+def retrieval_params(index_dir) -> Dict:
+    return {**DEFAULT_RETRIEVAL, **read_index_meta(index_dir).get("retrieval", {})}
+
+
+def write_index_meta(index_dir, chunking: Dict, embedding_model: str, chunks: int, **extra) -> Dict:
+    """Grava index_meta.json preservando o que já existe (ex.: retrieval escolhido pelo tuner)"""
+    meta = read_index_meta(index_dir)
+    meta.update({
+        "chunking": dict(chunking),
+        "retrieval": {**DEFAULT_RETRIEVAL, **meta.get("retrieval", {})},
+        "embedding_model": embedding_model,
+        "chunks": chunks,
+        "created_at": time.time(),
+    })
+    meta.update(extra)
+    path = Path(index_dir) / INDEX_META_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+    return meta
+
+
+def files_digest(files: Sequence) -> str:
+    """Hash do conteúdo dos arquivos (versão do índice para a FAQ e o single-flight)"""
+    digest = hashlib.sha1()
+    for p in files:
+        with open(p, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def index_files(index_dir) -> List[Path]:
+    return sorted(p for p in Path(index_dir).iterdir() if p.is_file())
+
+
+def check_embedding_model(index_dir, embedding_model: str):
+    """Avisa quando o índice foi gerado com outro modelo (as buscas voltariam lixo)"""
+    built_with = read_index_meta(index_dir).get("embedding_model")
+    if built_with and built_with != embedding_model:
+        logger.warning(
+            f"Índice em {index_dir} foi gerado com {built_with}, mas o modelo configurado é {embedding_model}. "
+            f"Reconstrua o índice ou ajuste EMBEDDING_MODEL."
+        )
@@ -3,11 +3,23 @@ Script para criar o índice FAISS do currículo
 Execute antes de fazer deploy para evitar cold start
 """
 import os
+import argparse
+import logging
 from pathlib import Path
+
+# Limitar threads de OMP/MKL pela cota de CPU antes de qualquer import do torch
+from runtime_tuning import apply_thread_env, configure_cpu_runtime
+apply_thread_env()
+
 from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+
+from chunking import STRATEGIES, chunking_params, index_chunks, save_parents, write_index_meta
+from index_embedding import (
+    build_vectorstore, LazyEmbeddings, EMBED_MEMORY_BUDGET_MB, EMBED_WORKERS, EMBED_THREADS_PER_WORKER
+)
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 CONTENT_PATH = "./content_linkedin"
 FAISS_INDEX_DIR = "index_faiss_linkedin"
@@ -21,7 +33,8 @@ def extract_text_pdf(file_path):
     print(f"PDF processado com sucesso: {len(pages)} páginas")
     return content
 
-def create_index():
+def create_index(memory_budget_mb=EMBED_MEMORY_BUDGET_MB, compare_batch_size=0,
+                 workers=EMBED_WORKERS, threads_per_worker=EMBED_THREADS_PER_WORKER, chunking=None):
     docs_path = Path(CONTENT_PATH)
     
     if not docs_path.exists():
@@ -35,30 +48,54 @@ def create_index():
         print("ERRO: Nenhum arquivo PDF encontrado")
         return
 
-    print("Processando documentos PDF...")
-    loaded_documents = [extract_text_pdf(pdf) for pdf in pdf_files]
-
-    print("Criando chunks de texto...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = []
-    for doc_text in loaded_documents:
-        chunks.extend(text_splitter.split_text(doc_text))
+    # Sem parâmetros explícitos, mantém os do índice atual (ou os escolhidos pelo chunk_tuner.py)
+    chunking = {**chunking_params(FAISS_INDEX_DIR), **(chunking or {})}
+    print(f"Processando documentos PDF e criando chunks "
+          f"({chunking['strategy']}, {chunking['chunk_size']}/{chunking['chunk_overlap']})...")
+    chunks, metadatas, parents = index_chunks(pdf_files, chunking, extract_text_pdf)
     print(f"Total de {len(chunks)} chunks criados")
 
     print(f"Gerando embeddings com modelo: {EMBEDDING_MODEL}")
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL,
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'batch_size': 8, 'show_progress_bar': True}
-    )
+    if workers > 1:
+        # Cada worker carrega o seu modelo e fixa suas threads; o deste processo só é
+        # carregado depois do pool, para o teste do índice
+        embeddings = LazyEmbeddings(EMBEDDING_MODEL)
+    else:
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'show_progress_bar': False}
+        )
+        configure_cpu_runtime(embeddings)
 
-    print("Criando índice FAISS...")
-    vectorstore = FAISS.from_texts(chunks, embedding=embeddings)
+    print(f"Criando índice FAISS (lotes por comprimento, orçamento de {memory_budget_mb:g} MB)...")
+    vectorstore, report = build_vectorstore(
+        chunks, embeddings, memory_budget_mb, compare_batch_size,
+        processes=workers, threads_per_process=threads_per_worker, metadatas=metadatas, calibrate=True
+    )
+    if "baseline" in report:
+        print(f"Antes:  {report['baseline']['chunks_per_sec']:.1f} chunks/s (lote fixo {compare_batch_size})")
+    if "dedup" in report:
+        dedup = report["dedup"]
+        print(f"Dedup:  {dedup['chunks_in']} -> {dedup['chunks_out']} chunks "
+              f"({dedup['duplicates']} quase duplicados, ~{dedup['embed_seconds_saved']:.1f}s de embedding economizados)")
+    print(f"Depois: {report['bucketed']['chunks_per_sec']:.1f} chunks/s "
+          f"({report['bucketed']['batches']} lotes, padding {report['bucketed']['padding_ratio']:.2f}x)")
+    if "startup_seconds" in report["bucketed"]:
+        print(f"Pool:   {report['bucketed']['startup_seconds']:.1f}s de startup (spawn + modelo), "
+              f"{report['bucketed']['seconds']:.1f}s de encoding")
 
     # Criar diretório se não existir
     os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
     
     vectorstore.save_local(FAISS_INDEX_DIR)
+    save_parents(FAISS_INDEX_DIR, parents)
+    write_index_meta(FAISS_INDEX_DIR, chunking, EMBEDDING_MODEL, vectorstore.index.ntotal,
+                     dedup=report.get("dedup"), parents=len(parents), partitions=report["partitions"])
+    if parents:
+        print(f"Parent-child: {len(chunks)} trechos filhos indexados para {len(parents)} seções pai")
+    for field, counts in report["partitions"].items():
+        print(f"Partições por {field}: " + ", ".join(f"{value} ({n})" for value, n in sorted(counts.items())))
     print(f"✅ Índice salvo em: {FAISS_INDEX_DIR}")
     
     # Testar o índice
@@ -70,4 +107,25 @@ def create_index():
     print(f"Primeiro resultado: {results[0].page_content[:200]}...")
 
 if __name__ == "__main__":
-    create_index()
+    parser = argparse.ArgumentParser(description="Cria o índice FAISS do currículo")
+    parser.add_argument("--memory-budget-mb", type=float, default=EMBED_MEMORY_BUDGET_MB,
+                        help="Memória disponível para ativações de um lote de embeddings")
+    parser.add_argument("--compare-baseline", type=int, default=0, metavar="BATCH_SIZE",
+                        help="Mede também a estratégia antiga (ordem do documento, lote fixo) para comparação")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS,
+                        help="Processos de encoding (1 = processo atual)")
+    parser.add_argument("--threads-per-worker", type=int, default=EMBED_THREADS_PER_WORKER,
+                        help="Threads do torch por worker (0 = núcleos / workers)")
+    parser.add_argument("--strategy", choices=STRATEGIES, help="Estratégia de chunking (padrão: a do índice atual)")
+    parser.add_argument("--chunk-size", type=int, help="Tamanho do chunk em caracteres (padrão: o do índice atual)")
+    parser.add_argument("--chunk-overlap", type=int, help="Sobreposição em caracteres (padrão: a do índice atual)")
+    parser.add_argument("--child-chunk-size", type=int,
+                        help="Indexa trechos filhos deste tamanho e guarda os chunks como pais (0 = desliga)")
+    parser.add_argument("--child-chunk-overlap", type=int, help="Sobreposição entre trechos filhos")
+    args = parser.parse_args()
+    overrides = {
+        "strategy": args.strategy, "chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap,
+        "child_chunk_size": args.child_chunk_size, "child_chunk_overlap": args.child_chunk_overlap,
+    }
+    create_index(args.memory_budget_mb, args.compare_baseline, args.workers, args.threads_per_worker,
+                 {key: value for key, value in overrides.items() if value is not None})
@@ -0,0 +1,140 @@
+"""
+Micro-batching dinâmico de embeddings de queries
+Sessões concorrentes enfileiram suas perguntas; uma thread agrupa até N itens ou M ms
+e executa um único forward pass no modelo, devolvendo um Future para cada chamador.
+O lote usa embed_documents, então só é ligado quando o modelo codifica queries e documentos
+do mesmo jeito (sem instrução ou prefixo de query); nos demais, embed_query vai direto ao modelo.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5))
+QUERY_PROBE = "Qual a experiência profissional?"
+
+
+def same_query_encoding(base: Embeddings, probe: str = QUERY_PROBE, tolerance: float = 1e-4) -> bool:
+    """True se embed_query e embed_documents dão o mesmo vetor (sem transformação própria da query)"""
+    try:
+        query = base.embed_query(probe)
+        document = base.embed_documents([probe])[0]
+    except Exception as e:
+        logger.warning(f"Não foi possível comparar embed_query e embed_documents: {e}")
+        return False
+    return len(query) == len(document) and all(abs(a - b) <= tolerance for a, b in zip(query, document))
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Envolve um objeto Embeddings e agrupa chamadas concorrentes de embed_query.
+    embed_documents (indexação) é repassado direto ao modelo base. Sem batch_queries, decide
+    comparando os dois caminhos do modelo base uma vez (same_query_encoding).
+    """
+
+    def __init__(self, base: Embeddings, max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS,
+                 batch_queries: Optional[bool] = None):
+        self.base = base
+        self.batch_queries = same_query_encoding(base) if batch_queries is None else batch_queries
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_seen = 0
+        self._encode_seconds = 0.0
+        self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+        self._thread.start()
+        if self.batch_queries:
+            logger.info(f"Micro-batching de queries ativo (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms})")
+        else:
+            logger.warning("Micro-batching de queries desligado: o modelo codifica queries diferente de documentos")
+
+    # -------------------------
+    # API Embeddings
+    # -------------------------
+    def submit(self, text: str) -> Future:
+        """Enfileira uma query e retorna o Future com seu vetor"""
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("query_embedding"):
+            if not self.batch_queries:
+                return self.base.embed_query(text)
+            return self.submit(text).result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "max_batch_size_seen": self._max_seen,
+                "encode_seconds": self._encode_seconds,
+                "queue_depth": self._queue.qsize(),
+            }
+
+    # -------------------------
+    # Loop de agrupamento
+    # -------------------------
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Janela esgotada: ainda aproveita o que já está na fila sem esperar
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            # Descarta chamadores que desistiram (Future cancelado) antes de codificar
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            start = time.perf_counter()
+            try:
+                vectors = self.base.embed_documents(texts)
+            except Exception as e:
+                logger.error(f"Erro ao gerar embeddings do lote ({len(texts)} queries): {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._max_seen = max(self._max_seen, len(batch))
+                self._encode_seconds += elapsed
+
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
@@ -0,0 +1,263 @@
+"""
+Servidor local compatível com a API de chat da Groq/OpenAI para testes de carga offline
+Simula latência até o primeiro token, taxa de geração de tokens, streaming SSE e erros 429
+
+Uso:
+    python fake_groq_server.py --port 8900 --latency-dist lognormal --latency-ms 400 \
+        --tokens-per-sec 250 --error-rate-429 0.05
+
+    export GROQ_API_BASE="http://127.0.0.1:8900"
+    export GROQ_API_KEY="fake"
+"""
+import json
+import math
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("fake_groq_server")
+
+ANSWER_WORDS = (
+    "Tenho experiência com projetos de IA generativa, RAG com LangChain e FAISS, "
+    "análise de dados e automação de processos, sempre com foco em resultados de negócio."
+).split()
+
+
+@dataclass
+class FakeGroqConfig:
+    latency_dist: str = "lognormal"   # fixed | uniform | exponential | lognormal
+    latency_ms: float = 400.0         # média (ou valor fixo) até o primeiro token
+    latency_sigma: float = 0.5        # dispersão da lognormal / metade da faixa da uniforme (fração da média)
+    tokens_per_sec: float = 250.0
+    completion_tokens: int = 80
+    error_rate_429: float = 0.0
+    retry_after: float = 1.0
+    seed: int = 0
+
+
+class FakeGroqState:
+    """Configuração + contadores compartilhados entre as threads do servidor"""
+
+    def __init__(self, config: FakeGroqConfig):
+        self.config = config
+        self.rng = random.Random(config.seed or None)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "streamed": 0, "rate_limited": 0, "completion_tokens": 0, "prompt_tokens": 0}
+
+    def sample_latency(self) -> float:
+        cfg = self.config
+        mean = cfg.latency_ms / 1000.0
+        with self.lock:
+            if cfg.latency_dist == "fixed":
+                return mean
+            if cfg.latency_dist == "uniform":
+                spread = mean * cfg.latency_sigma
+                return max(0.0, self.rng.uniform(mean - spread, mean + spread))
+            if cfg.latency_dist == "exponential":
+                return self.rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+            # lognormal com média `mean`
+            if mean <= 0:
+                return 0.0
+            mu = math.log(mean) - cfg.latency_sigma ** 2 / 2
+            return self.rng.lognormvariate(mu, cfg.latency_sigma)
+
+    def should_rate_limit(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.config.error_rate_429
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.counters[key] += value
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def build_answer(messages, completion_tokens: int) -> str:
+    """Reformulação devolve a própria pergunta; demais chamadas recebem uma resposta genérica"""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if "standalone question" in system:
+        return last_user.replace("Question:", "").strip() or "?"
+    words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(completion_tokens)]
+    return " ".join(words)
+
+
+def make_handler(state: FakeGroqState):
+    class FakeGroqHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+            elif self.path == "/stats":
+                with state.lock:
+                    self._send_json(200, {"config": asdict(state.config), "counters": dict(state.counters)})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            state.count(requests=1)
+
+            if state.should_rate_limit():
+                state.count(rate_limited=1)
+                retry_after = state.config.retry_after
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached (fake)", "type": "tokens", "code": "rate_limit_exceeded"}},
+                    headers={"retry-after": f"{retry_after:g}"},
+                )
+                return
+
+            messages = request.get("messages", [])
+            model = request.get("model", "fake-model")
+            prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+            answer = build_answer(messages, state.config.completion_tokens)
+            tokens = answer.split(" ")
+            state.count(prompt_tokens=prompt_tokens, completion_tokens=len(tokens))
+
+            time.sleep(state.sample_latency())
+            token_delay = 1.0 / state.config.tokens_per_sec if state.config.tokens_per_sec > 0 else 0.0
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+            }
+
+            if request.get("stream"):
+                state.count(streamed=1)
+                self._stream(completion_id, model, tokens, token_delay, usage)
+                return
+
+            time.sleep(token_delay * len(tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        def _stream(self, completion_id, model, tokens, token_delay, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+
+            def send_chunk(delta, finish_reason=None, extra=None):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                chunk.update(extra or {})
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            try:
+                send_chunk({"role": "assistant", "content": ""})
+                for i, token in enumerate(tokens):
+                    time.sleep(token_delay)
+                    send_chunk({"content": token if i == 0 else " " + token})
+                send_chunk({}, finish_reason="stop", extra={"x_groq": {"usage": usage}})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # Cliente cancelou o streaming
+                pass
+            self.close_connection = True
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return FakeGroqHandler
+
+
+def start_server(config: FakeGroqConfig, host: str = "127.0.0.1", port: int = 0):
+    """Sobe o servidor em uma thread daemon e retorna (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(FakeGroqState(config)))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="fake-groq", daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}"
+    logger.info(f"Fake Groq ouvindo em {base_url}")
+    return server, base_url
+
+
+def add_config_args(parser: argparse.ArgumentParser):
+    defaults = FakeGroqConfig()
+    parser.add_argument("--latency-dist", default=defaults.latency_dist,
+                        choices=["fixed", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--tokens-per-sec", type=float, default=defaults.tokens_per_sec)
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--error-rate-429", type=float, default=defaults.error_rate_429)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args) -> FakeGroqConfig:
+    return FakeGroqConfig(
+        latency_dist=args.latency_dist,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+        error_rate_429=args.error_rate_429,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Servidor fake compatível com a API da Groq")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    server, _ = start_server(config_from_args(args), args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        logger.info("Encerrando fake Groq")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Respostas pré-calculadas para as perguntas sugeridas (FAQ)
+As perguntas da barra lateral e os exemplos para RH concentram o tráfego: as respostas são
+geradas uma vez contra o índice atual e servidas sem nenhuma chamada ao LLM. O arquivo guarda
+a versão do índice e é regenerado em background quando ela muda.
+
+Uso:
+    python faq_store.py                                   # gera faq_store_linkedin.json
+    python faq_store.py --groq-api-base http://127.0.0.1:8900
+"""
+import os
+import re
+import json
+import time
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from memory_governor import register_trimmer
+from single_flight import normalize_question
+from tracing import REGISTRY, record_cache
+
+logger = logging.getLogger(__name__)
+
+FAQ_ENABLED = os.getenv("FAQ_ENABLED", "1") == "1"
+FAQ_STORE_PATH = os.getenv("FAQ_STORE_PATH", "faq_store_linkedin.json")
+# Um lock mais antigo que isso é de uma geração que morreu no meio
+FAQ_BUILD_TIMEOUT_S = float(os.getenv("FAQ_BUILD_TIMEOUT_S", 900))
+# Espera após uma geração que falhou, dobrando a cada falha seguida (até FAQ_RETRY_MAX_S)
+FAQ_RETRY_BACKOFF_S = float(os.getenv("FAQ_RETRY_BACKOFF_S", 300))
+FAQ_RETRY_MAX_S = float(os.getenv("FAQ_RETRY_MAX_S", 3600))
+
+# Perguntas da barra lateral do app (clicáveis)
+SUGGESTED_QUESTIONS = {
+    "pt": [
+        "Qual sua experiência profissional?",
+        "Quais tecnologias você domina?",
+        "Pode falar sobre seus projetos?",
+        "Quais suas certificações?",
+        "Qual sua formação acadêmica?",
+        "Experiência com LLMs e IA?",
+    ],
+    "en": [
+        "What is your professional experience?",
+        "What technologies do you master?",
+        "Can you talk about your projects?",
+        "What are your certifications?",
+        "What is your academic background?",
+        "Experience with LLMs and AI?",
+    ],
+}
+
+FAQ_QUESTIONS = {
+    "pt": SUGGESTED_QUESTIONS["pt"] + [
+        "Qual sua experiência com IA?",
+        "Projetos de destaque?",
+        "Tecnologias que domina?",
+        "Formação acadêmica?",
+        "Certificações obtidas?",
+        "Diferenciais profissionais?",
+    ],
+    "en": SUGGESTED_QUESTIONS["en"] + [
+        "What is your AI experience?",
+        "Notable projects?",
+        "Technologies you master?",
+        "Academic background?",
+        "Certifications obtained?",
+        "Professional differentials?",
+    ],
+}
+
+# Palavras ignoradas na comparação aproximada ("Quais são suas certificações?" ~ "Quais suas certificações?")
+STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "em", "no", "na", "com", "sobre", "que",
+    "qual", "quais", "sua", "suas", "seu", "seus", "voce", "sao", "tem", "pode", "me", "fale", "falar",
+    "the", "and", "of", "in", "on", "with", "about", "what", "which", "your", "you", "are", "is", "do",
+    "does", "can", "tell", "talk", "have",
+}
+
+# Campos do resultado do make_rag_response guardados por pergunta
+STORED_FIELDS = ("answer", "reformulated_question", "used_chunks_preview", "sources")
+
+FAQ_ENTRIES = REGISTRY.gauge("rag_faq_entries", "Respostas pré-calculadas válidas para o índice atual")
+
+AnswerFn = Callable[[str, str], Dict]
+
+
+def content_words(normalized: str) -> frozenset:
+    """Palavras significativas da pergunta normalizada, sem plural simples"""
+    words = re.findall(r"\w+", normalized)
+    return frozenset(w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in STOPWORDS)
+
+
+class FaqStore:
+    """Arquivo JSON com as respostas da FAQ por idioma e a versão do índice usada para gerá-las"""
+
+    def __init__(self, path: str = FAQ_STORE_PATH):
+        self.path = Path(path)
+        self.data: Dict = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._building = False
+        # Falhas seguidas da geração e quando a próxima tentativa é permitida (time.monotonic)
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def _reload(self):
+        """Relê o arquivo se ele mudou (outro worker ou o build em linha de comando o regenerou)"""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"FAQ ignorada: falha ao ler {self.path}: {e}")
+            return
+        with self._lock:
+            self.data, self._mtime = data, mtime
+        FAQ_ENTRIES.set(sum(len(entries) for entries in data.get("entries", {}).values()))
+
+    def trim(self):
+        """Descarta as respostas em memória; a próxima consulta relê o arquivo"""
+        with self._lock:
+            self.data, self._mtime = {}, None
+
+    def is_fresh(self, version: str) -> bool:
+        self._reload()
+        return self.data.get("index_version") == version
+
+    def lookup(self, question: str, language: str, version: str, fuzzy: bool = True) -> Optional[Dict]:
+        """
+        Resposta pronta para a pergunta, se a FAQ foi gerada para esta versão do índice.
+        Igualdade após normalização sempre vale; com fuzzy, também perguntas com as mesmas
+        palavras significativas (ordem, artigos e plural ignorados).
+        """
+        if not FAQ_ENABLED or not self.is_fresh(version):
+            return None
+        normalized = normalize_question(question)
+        words = content_words(normalized)
+        entries = self.data.get("entries", {}).get(language, [])
+        best = next((e for e in entries if e["normalized"] == normalized), None)
+        if best is None and fuzzy and words:
+            best = next((e for e in entries if content_words(e["normalized"]) == words), None)
+        record_cache("faq", best is not None)
+        if best is None:
+            return None
+        logger.debug(f"FAQ: '{question[:80]}' -> '{best['question']}'")
+        result = {field: best.get(field) for field in STORED_FIELDS}
+        result.update({"similarity_used": None, "faq": True, "faq_question": best["question"]})
+        return result
+
+    def build(self, answer_fn: AnswerFn, version: str, model: str = "",
+              questions: Dict[str, List[str]] = FAQ_QUESTIONS) -> Dict:
+        """Gera as respostas de todas as perguntas e grava o arquivo de forma atômica"""
+        entries = {}
+        for language, items in questions.items():
+            entries[language] = []
+            for question in items:
+                result = answer_fn(question, language)
+                entry = {"question": question, "normalized": normalize_question(question)}
+                entry.update({field: result.get(field) for field in STORED_FIELDS})
+                entries[language].append(entry)
+        data = {"index_version": version, "model": model, "created_at": time.time(), "entries": entries}
+
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        self._reload()
+        logger.info(f"FAQ gerada para o índice {version}: {sum(len(e) for e in entries.values())} respostas")
+        return data
+
+    def _acquire_build_lock(self) -> bool:
+        """Lock entre processos (workers do api_server): só um regenera a FAQ"""
+        lock_path = self.path.with_suffix(self.path.suffix + ".lock")
+        try:
+            if time.time() - lock_path.stat().st_mtime > FAQ_BUILD_TIMEOUT_S:
+                lock_path.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+
+    def refresh_async(self, answer_fn: AnswerFn, version: str, model: str = "") -> bool:
+        """
+        Regenera em background se a FAQ não corresponde ao índice atual (True se iniciou).
+        Depois de uma falha, espera FAQ_RETRY_BACKOFF_S (dobrando a cada falha) antes de tentar de novo.
+        """
+        if not FAQ_ENABLED or self.is_fresh(version):
+            return False
+        with self._lock:
+            if self._building or time.monotonic() < self._retry_at:
+                return False
+            self._building = True
+        if not self._acquire_build_lock():
+            with self._lock:
+                self._building = False
+            return False
+
+        def run():
+            try:
+                logger.info(f"Índice mudou para {version}: regenerando a FAQ em background")
+                self.build(answer_fn, version, model)
+                with self._lock:
+                    self._failures, self._retry_at = 0, 0.0
+            except Exception as e:
+                with self._lock:
+                    self._failures += 1
+                    delay = min(FAQ_RETRY_MAX_S, FAQ_RETRY_BACKOFF_S * 2 ** (self._failures - 1))
+                    self._retry_at = time.monotonic() + delay
+                logger.warning(f"Falha ao regenerar a FAQ: {e} (nova tentativa em {delay:.0f}s)")
+            finally:
+                self.path.with_suffix(self.path.suffix + ".lock").unlink(missing_ok=True)
+                with self._lock:
+                    self._building = False
+
+        threading.Thread(target=run, name="faq-build", daemon=True).start()
+        return True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_faq_store() -> FaqStore:
+    """FaqStore compartilhado do processo"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FaqStore()
+            register_trimmer("faq", _store.trim)
+        return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera as respostas pré-calculadas da FAQ para o índice atual")
+    parser.add_argument("--output", default=FAQ_STORE_PATH)
+    parser.add_argument("--groq-api-base", default="", help="Endpoint compatível com a Groq (ex.: fake_groq_server.py)")
+    args = parser.parse_args()
+    if args.groq_api_base:
+        os.environ.setdefault("GROQ_API_KEY", "fake-key")
+
+    from logging_setup import setup_logging
+    from rag_core import ID_MODEL, index_version, load_llm, load_retriever, make_rag_response
+    from rate_limiter import PRIORITY_BATCH
+
+    setup_logging()
+    llm = load_llm(base_url=args.groq_api_base) if args.groq_api_base else load_llm()
+    retriever = load_retriever()
+    version = index_version()
+
+    def answer(question, language):
+        return make_rag_response(question, [], retriever, llm, language, priority=PRIORITY_BATCH)
+
+    data = FaqStore(args.output).build(answer, version, ID_MODEL)
+    print(f"💾 FAQ salva em {args.output} (índice {data['index_version']})")
+
+
+if __name__ == "__main__":
+    main()
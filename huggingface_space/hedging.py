@@ -0,0 +1,279 @@
+"""
+Hedging e failover por latência entre modelos do LLM
+- p95 móvel da latência por modelo, medida a partir da vaga concedida pelo limitador
+  (rate_limiter.on_acquire): espera na fila e backoff de 429 não entram na conta
+- se a chamada passa do p95, dispara uma duplicata (modelo de fallback ou o mesmo) e fica
+  com a primeira resposta; a perdedora é cancelada (fecha o streaming)
+- circuit breaker por modelo: falhas consecutivas abrem o circuito e o tráfego vai para o fallback;
+  429 (cota esgotada, não modelo degradado) não conta como falha
+- com streaming (stream_chunks), a primeira tentativa a emitir um chunk fica com o stream:
+  as demais são canceladas e não há nova duplicata, para o cliente não receber textos misturados
+
+Variáveis de ambiente:
+    GROQ_FALLBACK_MODEL_ID=llama-3.1-8b-instant
+    HEDGE_ENABLED=1  HEDGE_MIN_DELAY_S=1.0  HEDGE_MAX_RATIO=0.2
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+from cancellation import (
+    CancelToken,
+    RequestCancelled,
+    cancel_scope,
+    check_cancelled,
+    current_chunk_sink,
+    current_token,
+    stream_chunks,
+)
+from memory_governor import register_trimmer
+from profiling import profiled_thread
+from rate_limiter import is_rate_limit_error, on_acquire
+from tracing import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+# Atraso usado enquanto o modelo não tem amostras suficientes para um p95
+HEDGE_DEFAULT_DELAY_S = float(os.getenv("HEDGE_DEFAULT_DELAY_S", 8.0))
+HEDGE_MIN_DELAY_S = float(os.getenv("HEDGE_MIN_DELAY_S", 1.0))
+# Fração máxima de chamadas que podem ganhar uma duplicata (limita o custo extra sob degradação geral)
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", 0.2))
+LATENCY_WINDOW = int(os.getenv("HEDGE_LATENCY_WINDOW", 200))
+MIN_SAMPLES = 20
+BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", 5))
+BREAKER_OPEN_S = float(os.getenv("CIRCUIT_BREAKER_OPEN_S", 30))
+POLL_S = 0.25
+
+CALL_SECONDS = REGISTRY.histogram("rag_llm_call_seconds", "Latência das chamadas ao LLM por modelo")
+CALLS = REGISTRY.counter("rag_llm_calls_total", "Chamadas ao LLM por modelo e resultado")
+HEDGES = REGISTRY.counter("rag_llm_hedges_total", "Duplicatas disparadas e qual tentativa venceu")
+HEDGE_WASTED = REGISTRY.counter("rag_llm_hedge_wasted_seconds_total", "Tempo de chamadas perdedoras canceladas")
+FAILOVERS = REGISTRY.counter("rag_llm_failovers_total", "Chamadas desviadas para o fallback com o circuito aberto")
+CIRCUIT_OPEN = REGISTRY.gauge("rag_llm_circuit_open", "1 se o circuit breaker do modelo está aberto")
+P95_SECONDS = REGISTRY.gauge("rag_llm_p95_seconds", "p95 móvel da latência por modelo")
+
+
+def model_name(llm) -> str:
+    return getattr(llm, "model_name", None) or type(llm).__name__
+
+
+class ModelHealth:
+    """Latências recentes e circuit breaker de um modelo"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._failures = 0
+            if self._opened_at is not None:
+                logger.info(f"Circuit breaker de {self.name} fechado")
+            self._opened_at = None
+        CIRCUIT_OPEN.set(0, model=self.name)
+        p95 = self.p95()
+        if p95 is not None:
+            P95_SECONDS.set(p95, model=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= BREAKER_FAILURES and self._opened_at is None:
+                self._opened_at = time.monotonic()
+                logger.warning(f"Circuit breaker de {self.name} aberto após {self._failures} falhas consecutivas")
+                CIRCUIT_OPEN.set(1, model=self.name)
+
+    def available(self) -> bool:
+        """Circuito fechado, ou aberto há mais de BREAKER_OPEN_S (meia-abertura: uma chamada de teste)"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= BREAKER_OPEN_S:
+                # Reinicia a janela: só uma chamada de teste passa até o próximo resultado
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def trim(self):
+        """Mantém só as MIN_SAMPLES latências mais recentes (o p95 continua disponível)"""
+        with self._lock:
+            recent = list(self._latencies)[-MIN_SAMPLES:]
+            self._latencies.clear()
+            self._latencies.extend(recent)
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        return max(HEDGE_MIN_DELAY_S, p95 if p95 is not None else HEDGE_DEFAULT_DELAY_S)
+
+
+_health: Dict[str, ModelHealth] = {}
+_health_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_WORKERS", 32)), thread_name_prefix="llm-attempt")
+_counts = {"calls": 0, "hedges": 0}
+_counts_lock = threading.Lock()
+
+
+def get_health(name: str) -> ModelHealth:
+    with _health_lock:
+        if name not in _health:
+            _health[name] = ModelHealth(name)
+        return _health[name]
+
+
+def trim_latencies():
+    with _health_lock:
+        models = list(_health.values())
+    for health in models:
+        health.trim()
+
+
+register_trimmer("hedging_latencies", trim_latencies)
+
+
+def _hedge_budget_available() -> bool:
+    with _counts_lock:
+        if _counts["hedges"] + 1 > HEDGE_MAX_RATIO * _counts["calls"] + 1:
+            return False
+        _counts["hedges"] += 1
+        return True
+
+
+class _StreamClaim:
+    """Repassa ao sink original só os chunks da primeira tentativa que começar a gerar"""
+
+    def __init__(self, sink: Callable[[str], None]):
+        self.sink = sink
+        self.owner = None
+        self._lock = threading.Lock()
+
+    def sink_for(self, attempt) -> Callable[[str], None]:
+        def emit(chunk):
+            with self._lock:
+                if self.owner is None:
+                    self.owner = attempt
+            if self.owner is attempt:
+                self.sink(chunk)
+        return emit
+
+
+class _Attempt:
+    def __init__(self, llm, call: Callable, parent: Optional[CancelToken], claim: Optional[_StreamClaim] = None):
+        self.model = model_name(llm)
+        self.token = CancelToken(parent)
+        self.started = time.perf_counter()
+        # Só passa a valer o relógio do modelo quando o limitador concede a vaga
+        self.acquired = False
+        sink = claim.sink_for(self) if claim is not None else None
+        context = contextvars.copy_context()
+        self.future = _executor.submit(context.run, self._run, call, llm, sink)
+
+    def _mark_acquired(self):
+        # A cada nova vaga (inclusive após um 429) o relógio recomeça
+        self.started = time.perf_counter()
+        self.acquired = True
+
+    def hedge_at(self, delay: float) -> Optional[float]:
+        """Instante (perf_counter) da duplicata; None enquanto a tentativa espera o limitador"""
+        return self.started + delay if self.acquired else None
+
+    def _run(self, call, llm, sink):
+        health = get_health(self.model)
+        with cancel_scope(self.token), stream_chunks(sink), on_acquire(self._mark_acquired), profiled_thread():
+            try:
+                result = call(llm)
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    CALLS.inc(model=self.model, result="rate_limited")
+                else:
+                    health.record_failure()
+                    CALLS.inc(model=self.model, result="error")
+                raise
+        elapsed = time.perf_counter() - self.started
+        health.record_success(elapsed)
+        CALL_SECONDS.observe(elapsed, model=self.model)
+        CALLS.inc(model=self.model, result="ok")
+        return result
+
+
+def hedged_call(call: Callable, llm, fallback_llm=None, hedge: bool = HEDGE_ENABLED):
+    """
+    Executa call(llm) com hedging: passado o p95 do modelo, dispara call(fallback_llm) (ou call(llm))
+    e retorna o primeiro resultado bem-sucedido. Com o circuito do modelo principal aberto,
+    vai direto para o fallback. call deve passar por limited_call: o p95 conta a partir da vaga
+    concedida, então a duplicata não dispara enquanto a principal espera na fila.
+    """
+    primary, secondary = llm, fallback_llm
+    if secondary is not None and not get_health(model_name(primary)).available():
+        if get_health(model_name(secondary)).available():
+            FAILOVERS.inc(model=model_name(primary))
+            primary, secondary = secondary, None
+    hedge_llm = secondary if secondary is not None else primary
+
+    with _counts_lock:
+        _counts["calls"] += 1
+    parent = current_token()
+    sink = current_chunk_sink()
+    claim = _StreamClaim(sink) if sink is not None else None
+    attempts = [_Attempt(primary, call, parent, claim)]
+    hedge_delay = get_health(model_name(primary)).hedge_delay() if hedge else None
+
+    try:
+        while True:
+            check_cancelled()
+            owner = claim.owner if claim is not None else None
+            if owner is not None:
+                # O stream já começou: a tentativa dona é a única que pode responder
+                hedge_delay = None
+                for attempt in attempts:
+                    if attempt is not owner:
+                        attempt.token.cancel()
+            for attempt in attempts:
+                if attempt.future.done() and attempt.future.exception() is None:
+                    if len(attempts) > 1:
+                        HEDGES.inc(model=attempts[1].model, outcome="won" if attempt is attempts[1] else "lost")
+                    return attempt.future.result()
+            pending = [a for a in attempts if not a.future.done()]
+            if owner is not None and owner.future.done():
+                raise owner.future.exception()
+            if not pending and (len(attempts) > 1 or hedge_delay is None):
+                raise attempts[0].future.exception()
+
+            hedge_at = attempts[0].hedge_at(hedge_delay) if hedge_delay is not None and len(attempts) == 1 else None
+            if hedge_delay is not None and len(attempts) == 1 and (
+                not pending or (hedge_at is not None and time.perf_counter() >= hedge_at)
+            ):
+                hedge_delay = None
+                # Falha rápida da principal também aciona a segunda tentativa
+                if get_health(model_name(hedge_llm)).available() and (not pending or _hedge_budget_available()):
+                    logger.info(f"Hedging: chamada a {attempts[0].model} passou do p95; duplicando em {model_name(hedge_llm)}")
+                    attempts.append(_Attempt(hedge_llm, call, parent, claim))
+                    continue
+                if not pending:
+                    raise attempts[0].future.exception()
+
+            timeout = POLL_S if hedge_at is None else max(0.0, min(POLL_S, hedge_at - time.perf_counter()))
+            wait([a.future for a in pending], timeout=timeout, return_when=FIRST_COMPLETED)
+    finally:
+        for attempt in attempts:
+            if not attempt.future.done():
+                attempt.token.cancel()
+                HEDGE_WASTED.inc(time.perf_counter() - attempt.started, model=attempt.model)
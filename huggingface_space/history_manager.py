@@ -0,0 +1,178 @@
+"""
+Histórico de conversa com tamanho de prompt aproximadamente constante
+Os últimos turnos vão literais para o prompt; os mais antigos são incorporados a um
+resumo incremental, atualizado em background depois que a resposta já foi exibida
+"""
+import os
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from rate_limiter import PRIORITY_BACKGROUND, estimate_tokens, limited_call
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Turnos (pergunta + resposta) mantidos literais no prompt
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", 3))
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", 1200))
+HISTORY_SUMMARY_WORKERS = int(os.getenv("HISTORY_SUMMARY_WORKERS", 2))
+# Limites do histórico recebido dos clientes da API (mensagens mais recentes e caracteres por mensagem)
+HISTORY_PAYLOAD_MAX_MESSAGES = int(os.getenv("HISTORY_PAYLOAD_MAX_MESSAGES", 20))
+HISTORY_PAYLOAD_MAX_CHARS = int(os.getenv("HISTORY_PAYLOAD_MAX_CHARS", 8000))
+
+SUMMARY_PROMPTS = {
+    "pt": {
+        "system": (
+            "Você mantém o resumo de uma conversa entre um recrutador e o assistente de currículo. "
+            "Atualize o resumo atual incorporando as novas mensagens. Preserve nomes, tecnologias, "
+            "empresas, datas e o que o recrutador já perguntou. Responda apenas com o resumo, "
+            "em no máximo 120 palavras."
+        ),
+        "human": "RESUMO ATUAL:\n{summary}\n\nNOVAS MENSAGENS:\n{messages}\n\nRESUMO ATUALIZADO:",
+        "label": "Resumo da conversa anterior:",
+        "empty": "(vazio)",
+        "roles": {"human": "Recrutador", "ai": "Assistente"},
+    },
+    "en": {
+        "system": (
+            "You maintain the summary of a conversation between a recruiter and the resume assistant. "
+            "Update the current summary with the new messages. Keep names, technologies, companies, "
+            "dates and what the recruiter has already asked. Reply only with the summary, "
+            "in at most 120 words."
+        ),
+        "human": "CURRENT SUMMARY:\n{summary}\n\nNEW MESSAGES:\n{messages}\n\nUPDATED SUMMARY:",
+        "label": "Summary of the earlier conversation:",
+        "empty": "(empty)",
+        "roles": {"human": "Recruiter", "ai": "Assistant"},
+    },
+}
+
+_executor = ThreadPoolExecutor(max_workers=HISTORY_SUMMARY_WORKERS, thread_name_prefix="history-summary")
+
+
+class HistoryManager:
+    """
+    Histórico usado no prompt de uma sessão: resumo + últimos HISTORY_KEEP_TURNS turnos.
+    Mensagens ainda não resumidas continuam literais até o resumo em background terminar.
+    """
+
+    def __init__(self, keep_turns: int = HISTORY_KEEP_TURNS, max_summary_chars: int = HISTORY_SUMMARY_MAX_CHARS):
+        self.keep_messages = max(0, keep_turns) * 2
+        self.max_summary_chars = max_summary_chars
+        self.summary = ""
+        self.messages: List[BaseMessage] = []
+        self._lock = threading.Lock()
+        self._pending: Optional[Future] = None
+
+    def add(self, message: BaseMessage):
+        with self._lock:
+            self.messages.append(message)
+
+    def prompt_history(self, language: str = "pt") -> List[BaseMessage]:
+        """Mensagens para o MessagesPlaceholder do prompt de contextualização"""
+        with self._lock:
+            history = list(self.messages)
+            summary = self.summary
+        if summary:
+            history.insert(0, SystemMessage(content=f"{SUMMARY_PROMPTS[language]['label']} {summary}"))
+        return history
+
+    def schedule_summary(self, llm, language: str = "pt") -> Optional[Future]:
+        """
+        Incorpora ao resumo as mensagens além dos últimos turnos, em background.
+        No máximo uma atualização por sessão em andamento; a seguinte continua de onde esta parar.
+        """
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return self._pending
+            overflow = len(self.messages) - self.keep_messages
+            if overflow <= 0:
+                return None
+            folded = self.messages[:overflow]
+            summary = self.summary
+            self._pending = _executor.submit(self._fold, llm, language, summary, folded)
+            return self._pending
+
+    def wait_summary(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda a atualização do resumo em andamento (True se não há nenhuma pendente ao final)"""
+        with self._lock:
+            pending = self._pending
+        if pending is None:
+            return True
+        done, _ = wait([pending], timeout=timeout)
+        return bool(done)
+
+    def to_payload(self) -> Dict:
+        """Estado serializável (resumo + mensagens literais) devolvido aos clientes da API"""
+        with self._lock:
+            return {
+                "summary": self.summary,
+                "messages": [
+                    {"role": "user" if isinstance(m, HumanMessage) else "assistant", "content": m.content}
+                    for m in self.messages
+                ],
+            }
+
+    @classmethod
+    def from_payload(cls, payload: Optional[Dict]) -> "HistoryManager":
+        """
+        Reconstrói o histórico enviado pelo cliente (a API não guarda estado entre requisições).
+        Só as últimas HISTORY_PAYLOAD_MAX_MESSAGES mensagens, cortadas em HISTORY_PAYLOAD_MAX_CHARS:
+        o cliente não controla o tamanho da chamada de resumo.
+        """
+        manager = cls()
+        payload = payload or {}
+        manager.summary = str(payload.get("summary") or "")[:manager.max_summary_chars]
+        messages = payload.get("messages") or []
+        if not isinstance(messages, list):
+            messages = []
+        for m in messages[-HISTORY_PAYLOAD_MAX_MESSAGES:]:
+            if not isinstance(m, dict):
+                continue
+            message_cls = HumanMessage if m.get("role") == "user" else AIMessage
+            manager.messages.append(message_cls(content=str(m.get("content", ""))[:HISTORY_PAYLOAD_MAX_CHARS]))
+        return manager
+
+    def _fold(self, llm, language, summary, folded):
+        prompts = SUMMARY_PROMPTS[language]
+        roles = prompts["roles"]
+        transcript = "\n".join(
+            f"{roles['human'] if isinstance(m, HumanMessage) else roles['ai']}: {m.content}" for m in folded
+        )
+        chain = ChatPromptTemplate.from_messages([
+            ("system", prompts["system"]),
+            ("human", prompts["human"]),
+        ]) | llm | StrOutputParser()
+        try:
+            inputs = {"summary": summary or prompts["empty"], "messages": transcript}
+            with span("history_summary"):
+                # Prioridade baixa: respostas ao usuário passam na frente na fila do limitador
+                new_summary = limited_call(
+                    lambda: chain.invoke(inputs),
+                    estimate_tokens(prompts["system"], summary, transcript), PRIORITY_BACKGROUND,
+                )
+        except Exception as e:
+            # Sem resumo novo as mensagens continuam literais; a próxima resposta tenta de novo
+            logger.warning(f"Falha ao resumir histórico: {e}")
+            return summary
+
+        new_summary = new_summary.strip()[:self.max_summary_chars]
+        with self._lock:
+            # Só o início da lista foi resumido; mensagens novas chegaram apenas no final
+            del self.messages[:len(folded)]
+            self.summary = new_summary
+        logger.debug(f"Histórico resumido: {len(folded)} mensagens -> {len(new_summary)} caracteres")
+        return new_summary
+
+
+def get_history_manager(session_state) -> HistoryManager:
+    """HistoryManager da sessão (criado na primeira pergunta)"""
+    if "history_manager" not in session_state:
+        session_state.history_manager = HistoryManager()
+    return session_state.history_manager
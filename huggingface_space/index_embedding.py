@@ -0,0 +1,417 @@
+"""
+Embeddings de documentos na indexação com lotes por comprimento
+Os chunks são ordenados pelo número de tokens e agrupados em buckets de tamanho parecido,
+o tamanho de cada lote sai de um orçamento de memória e do throughput medido,
+e os vetores voltam para a ordem original antes de montar o índice FAISS
+"""
+import os
+import time
+import logging
+import threading
+from threading import BrokenBarrierError
+import multiprocessing
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from chunk_dedup import DEDUP_ENABLED, dedup_chunks
+from index_partitions import build_partitions, partition_summary
+
+logger = logging.getLogger(__name__)
+
+EMBED_MEMORY_BUDGET_MB = float(os.getenv("EMBED_MEMORY_BUDGET_MB", 512))
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", 128))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 1))
+EMBED_THREADS_PER_WORKER = int(os.getenv("EMBED_THREADS_PER_WORKER", 0))  # 0 = núcleos / workers
+# Medir o throughput de alguns tamanhos de lote antes do encoding. Só o create_index.py liga por
+# padrão: no load_retriever e no chunk_tuner.py o custo entraria no cold start e no build_seconds
+EMBED_BATCH_CALIBRATE = os.getenv("EMBED_BATCH_CALIBRATE", "0").lower() in ("1", "true", "yes")
+# Espera máxima pelo startup do pool (spawn + download/carga do modelo em todos os workers)
+EMBED_WORKER_START_TIMEOUT_S = float(os.getenv("EMBED_WORKER_START_TIMEOUT_S", 600))
+# Shards menores que isso não compensam a calibração de lote dentro do worker
+MIN_SHARD_FOR_CALIBRATION = 64
+# Fator aproximado de ativações por token em um encoder transformer (QKV, FFN, saídas intermediárias)
+ACTIVATION_FACTOR = 12
+BYTES_PER_FLOAT = 4
+
+
+# -------------------------
+# Acesso ao modelo
+# -------------------------
+def _sentence_transformer(embeddings):
+    """
+    SentenceTransformer do HuggingFaceEmbeddings pelo atributo público `client`; `_client` só
+    nas versões que não expõem o público. None se nenhum deles for um modelo com encode.
+    """
+    for attr in ("client", "_client"):
+        model = getattr(embeddings, attr, None)
+        if model is not None and callable(getattr(model, "encode", None)):
+            return model
+    return None
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    HuggingFaceEmbeddings carregado só no primeiro embed. Com o pool multi-processo, o processo
+    principal só precisa do nome do modelo durante o encoding; o modelo dele (para as consultas)
+    é carregado depois que os workers terminam, então a memória não passa de N cópias.
+    """
+
+    def __init__(self, model_name: str, cache_folder: Optional[str] = None):
+        self.model_name = model_name
+        self.cache_folder = cache_folder
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._embeddings is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+
+                kwargs = {"cache_folder": self.cache_folder} if self.cache_folder else {}
+                self._embeddings = HuggingFaceEmbeddings(
+                    model_name=self.model_name,
+                    model_kwargs={'device': 'cpu'},
+                    encode_kwargs={'show_progress_bar': False},
+                    **kwargs
+                )
+            return self._embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+
+def token_lengths(embeddings, texts: Sequence[str]) -> List[int]:
+    """Número de tokens de cada texto, limitado ao max_seq_length do modelo"""
+    model = _sentence_transformer(embeddings)
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is not None:
+        max_len = getattr(model, "max_seq_length", None) or 512
+        try:
+            encoded = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_len)
+            return [len(ids) for ids in encoded["input_ids"]]
+        except Exception as e:
+            logger.warning(f"Tokenizer indisponível ({e}); estimando tokens pelo tamanho do texto")
+    # Sem tokenizer acessível: aproximação de ~4 caracteres por token
+    return [max(1, len(t) // 4) for t in texts]
+
+
+def _model_shape(embeddings) -> Tuple[int, int]:
+    """(hidden_size, num_attention_heads) do encoder, com padrões de um BERT-base"""
+    model = _sentence_transformer(embeddings)
+    try:
+        config = model[0].auto_model.config
+        return config.hidden_size, config.num_attention_heads
+    except Exception:
+        return 768, 12
+
+
+def _encode(embeddings, texts: List[str]) -> List[List[float]]:
+    """Codifica exatamente um lote (sem o re-particionamento interno do encode_kwargs)"""
+    model = _sentence_transformer(embeddings)
+    if model is None:
+        return embeddings.embed_documents(texts)
+
+    texts = [t.replace("\n", " ") for t in texts]
+    encode_kwargs = dict(getattr(embeddings, "encode_kwargs", {}) or {})
+    encode_kwargs.update({"batch_size": len(texts), "show_progress_bar": False})
+    vectors = model.encode(texts, **encode_kwargs)
+    return vectors.tolist()
+
+
+# -------------------------
+# Planejamento dos lotes
+# -------------------------
+def memory_cap(seq_len: int, hidden_size: int, num_heads: int, memory_budget_mb: float) -> int:
+    """Maior lote de sequências com `seq_len` tokens que cabe no orçamento de memória"""
+    per_sequence = (
+        seq_len * hidden_size * ACTIVATION_FACTOR * BYTES_PER_FLOAT
+        + num_heads * seq_len * seq_len * BYTES_PER_FLOAT
+    )
+    budget = memory_budget_mb * 1024 * 1024
+    return max(1, min(EMBED_MAX_BATCH_SIZE, int(budget // per_sequence)))
+
+
+def plan_batches(lengths: Sequence[int], tokens_per_batch: int, hidden_size: int, num_heads: int,
+                 memory_budget_mb: float) -> List[List[int]]:
+    """
+    Agrupa índices ordenados por comprimento em lotes com ~tokens_per_batch tokens com padding,
+    respeitando o limite de memória do comprimento máximo de cada lote.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    position = 0
+    while position < len(order):
+        # Ordem decrescente: o primeiro item define o comprimento com padding do lote
+        padded_len = lengths[order[position]]
+        size = min(
+            max(1, tokens_per_batch // padded_len),
+            memory_cap(padded_len, hidden_size, num_heads, memory_budget_mb),
+        )
+        batches.append(order[position:position + size])
+        position += size
+    return batches
+
+
+def calibrate_tokens_per_batch(embeddings, texts: Sequence[str], lengths: Sequence[int],
+                               hidden_size: int, num_heads: int, memory_budget_mb: float) -> int:
+    """Mede o throughput de alguns tamanhos de lote no bucket mediano e retorna o melhor volume de tokens"""
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+    median_len = lengths[order[len(order) // 2]]
+    cap = memory_cap(median_len, hidden_size, num_heads, memory_budget_mb)
+
+    sample_start = max(0, len(order) // 2 - cap // 2)
+    sample = [texts[i] for i in order[sample_start:sample_start + cap]]
+
+    best_size, best_rate = 1, 0.0
+    size = 1
+    while size <= min(cap, len(sample)):
+        batch = sample[:size]
+        _encode(embeddings, batch)  # aquecimento para este formato
+        start = time.perf_counter()
+        _encode(embeddings, batch)
+        rate = size / (time.perf_counter() - start)
+        logger.info(f"Calibração: lote {size:>3} -> {rate:.1f} chunks/s")
+        if rate > best_rate:
+            best_size, best_rate = size, rate
+        elif rate < best_rate * 0.9:
+            break
+        size *= 2
+
+    return max(1, best_size * median_len)
+
+
+# -------------------------
+# Encoding
+# -------------------------
+def embed_texts_bucketed(embeddings, texts: Sequence[str], memory_budget_mb: float = EMBED_MEMORY_BUDGET_MB,
+                         calibrate: bool = EMBED_BATCH_CALIBRATE) -> Tuple[List[List[float]], Dict]:
+    """
+    Gera embeddings em lotes por comprimento e devolve os vetores na ordem original + relatório.
+    Sem calibrate, o lote é o maior que cabe no orçamento de memória.
+    """
+    texts = list(texts)
+    if not texts:
+        return [], {"chunks": 0, "seconds": 0.0, "chunks_per_sec": 0.0, "batches": 0, "padding_ratio": 1.0}
+
+    lengths = token_lengths(embeddings, texts)
+    hidden_size, num_heads = _model_shape(embeddings)
+
+    if calibrate and len(texts) > 1:
+        tokens_per_batch = calibrate_tokens_per_batch(
+            embeddings, texts, lengths, hidden_size, num_heads, memory_budget_mb
+        )
+    else:
+        tokens_per_batch = max(lengths) * memory_cap(max(lengths), hidden_size, num_heads, memory_budget_mb)
+
+    batches = plan_batches(lengths, tokens_per_batch, hidden_size, num_heads, memory_budget_mb)
+    logger.info(f"{len(texts)} chunks em {len(batches)} lotes (~{tokens_per_batch} tokens/lote)")
+
+    vectors: List = [None] * len(texts)
+    padded_tokens = 0
+    start = time.perf_counter()
+    for batch in batches:
+        batch_vectors = _encode(embeddings, [texts[i] for i in batch])
+        for i, vector in zip(batch, batch_vectors):
+            vectors[i] = vector
+        padded_tokens += lengths[batch[0]] * len(batch)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "chunks": len(texts),
+        "seconds": elapsed,
+        "chunks_per_sec": len(texts) / elapsed if elapsed > 0 else 0.0,
+        "batches": len(batches),
+        "tokens_per_batch": tokens_per_batch,
+        "padding_ratio": padded_tokens / max(1, sum(lengths)),
+    }
+    return vectors, report
+
+
+def embed_texts_baseline(embeddings, texts: Sequence[str], batch_size: int) -> Tuple[List[List[float]], Dict]:
+    """Estratégia antiga: ordem do documento e lote fixo (usada só para comparação)"""
+    texts = list(texts)
+    lengths = token_lengths(embeddings, texts)
+    vectors = []
+    padded_tokens = 0
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(_encode(embeddings, texts[i:i + batch_size]))
+        padded_tokens += max(lengths[i:i + batch_size]) * len(lengths[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+    report = {
+        "chunks": len(texts),
+        "seconds": elapsed,
+        "chunks_per_sec": len(texts) / elapsed if elapsed > 0 else 0.0,
+        "batches": -(-len(texts) // batch_size),
+        "padding_ratio": padded_tokens / max(1, sum(lengths)),
+    }
+    return vectors, report
+
+
+# -------------------------
+# Pool multi-processo
+# -------------------------
+_WORKER_EMBEDDINGS = None
+
+
+def _worker_init(model_name: str, threads: int, cache_folder: str, ready=None, started=None):
+    """
+    Carrega o modelo uma vez por processo, com o número de threads do torch fixado, e espera
+    na barreira `ready` até todos os workers (e o processo principal) estarem prontos.
+    Um worker que substitui outro depois do startup (`started` marcado) não espera.
+    """
+    global _WORKER_EMBEDDINGS
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from runtime_tuning import set_torch_threads
+
+    set_torch_threads(threads)
+    _WORKER_EMBEDDINGS = HuggingFaceEmbeddings(
+        model_name=model_name,
+        cache_folder=cache_folder,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'show_progress_bar': False}
+    )
+    if ready is not None and not (started is not None and started.is_set()):
+        try:
+            ready.wait(timeout=EMBED_WORKER_START_TIMEOUT_S)
+        except BrokenBarrierError:
+            # O processo principal desistiu do pool (ou outro worker não subiu); ele encerra o pool
+            pass
+
+
+def _worker_encode(task):
+    shard_id, texts, memory_budget_mb, calibrate = task
+    vectors, report = embed_texts_bucketed(
+        _WORKER_EMBEDDINGS, texts, memory_budget_mb, calibrate=calibrate and len(texts) >= MIN_SHARD_FOR_CALIBRATION
+    )
+    return shard_id, vectors, report
+
+
+def embed_texts_multiprocess(model_name: str, texts: Sequence[str], processes: int,
+                             threads_per_process: int = 0, memory_budget_mb: float = EMBED_MEMORY_BUDGET_MB,
+                             shard_size: int = 0, cache_folder: str = "./cache",
+                             calibrate: bool = EMBED_BATCH_CALIBRATE) -> Tuple[List[List[float]], Dict]:
+    """
+    Distribui shards contíguos dos chunks entre `processes` workers e junta os vetores
+    na ordem dos shards, de modo que o resultado não depende de qual worker termina primeiro.
+    O relatório separa o startup (spawn + carga do modelo em cada worker, startup_seconds) do
+    encoding (seconds e chunks_per_sec, comparáveis com o processo único); total_seconds soma os dois.
+    """
+    texts = list(texts)
+    if not texts:
+        return [], {"chunks": 0, "seconds": 0.0, "chunks_per_sec": 0.0, "batches": 0, "padding_ratio": 1.0}
+    processes = max(1, processes)
+    threads_per_process = threads_per_process or max(1, (os.cpu_count() or 1) // processes)
+    # Alguns shards por worker equilibram a carga sem perder o ganho de lotes grandes
+    shard_size = shard_size or max(1, -(-len(texts) // (processes * 4)))
+    shards = [
+        (shard_id, texts[start:start + shard_size], memory_budget_mb / processes, calibrate)
+        for shard_id, start in enumerate(range(0, len(texts), shard_size))
+    ]
+    logger.info(
+        f"Encoding multi-processo: {processes} workers x {threads_per_process} threads, "
+        f"{len(shards)} shards de até {shard_size} chunks"
+    )
+
+    results: Dict[int, List[List[float]]] = {}
+    shard_reports = []
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(processes + 1)
+    started = context.Event()
+    with context.Pool(processes, initializer=_worker_init,
+                      initargs=(model_name, threads_per_process, cache_folder, ready, started)) as pool:
+        try:
+            ready.wait(timeout=EMBED_WORKER_START_TIMEOUT_S)
+        except BrokenBarrierError:
+            ready.abort()
+            raise RuntimeError(
+                f"Workers de encoding não ficaram prontos em {EMBED_WORKER_START_TIMEOUT_S:g}s "
+                f"(falha ao carregar {model_name}? veja o log dos workers)"
+            ) from None
+        started.set()
+        encode_start = time.perf_counter()
+        for shard_id, vectors, shard_report in pool.imap_unordered(_worker_encode, shards):
+            results[shard_id] = vectors
+            shard_reports.append(shard_report)
+        elapsed = time.perf_counter() - encode_start
+    startup = encode_start - start
+    logger.info(f"Startup do pool (spawn + modelo): {startup:.1f}s; encoding: {elapsed:.1f}s")
+
+    vectors = [vector for shard_id in sorted(results) for vector in results[shard_id]]
+    report = {
+        "chunks": len(texts),
+        "seconds": elapsed,
+        "chunks_per_sec": len(texts) / elapsed if elapsed > 0 else 0.0,
+        "startup_seconds": startup,
+        "total_seconds": startup + elapsed,
+        "workers": processes,
+        "threads_per_worker": threads_per_process,
+        "shards": len(shards),
+        "batches": sum(r["batches"] for r in shard_reports),
+        "padding_ratio": sum(r.get("padding_ratio", 1.0) * r["chunks"] for r in shard_reports) / max(1, len(texts)),
+    }
+    return vectors, report
+
+
+def build_vectorstore(chunks: Sequence[str], embeddings, memory_budget_mb: float = EMBED_MEMORY_BUDGET_MB,
+                      compare_batch_size: int = 0, processes: int = 1,
+                      threads_per_process: int = EMBED_THREADS_PER_WORKER,
+                      metadatas: Optional[Sequence[Dict]] = None, dedup: bool = DEDUP_ENABLED,
+                      calibrate: bool = EMBED_BATCH_CALIBRATE) -> Tuple[FAISS, Dict]:
+    """
+    Cria o índice FAISS a partir dos chunks usando lotes por comprimento.
+    Com compare_batch_size > 0, mede também a estratégia antiga e inclui no relatório.
+    Com processes > 1, o encoding é feito por um pool de processos (um modelo por worker); passe
+    um LazyEmbeddings para o processo principal não carregar mais uma cópia durante o encoding.
+    metadatas (origem, idioma, página, seção...) vão para o docstore junto de cada chunk, e o
+    relatório traz quantos chunks cada partição da busca filtrada recebeu.
+    Com dedup, quase duplicados são removidos antes do embedding (chunk_dedup.py).
+    Com calibrate, o tamanho dos lotes sai de uma medição de throughput antes do encoding.
+    """
+    chunks = list(chunks)
+    report = {}
+    positions = range(len(chunks))
+    if dedup:
+        chunks, metadatas, positions, report["dedup"] = dedup_chunks(chunks, metadatas)
+    if compare_batch_size:
+        _, report["baseline"] = embed_texts_baseline(embeddings, chunks, compare_batch_size)
+        logger.info(f"Antes (lote fixo {compare_batch_size}): {report['baseline']['chunks_per_sec']:.1f} chunks/s")
+
+    if processes > 1:
+        vectors, report["bucketed"] = embed_texts_multiprocess(
+            embeddings.model_name, chunks, processes, threads_per_process, memory_budget_mb,
+            cache_folder=getattr(embeddings, "cache_folder", None) or "./cache", calibrate=calibrate,
+        )
+    else:
+        vectors, report["bucketed"] = embed_texts_bucketed(embeddings, chunks, memory_budget_mb, calibrate)
+    logger.info(f"Depois (lotes por comprimento): {report['bucketed']['chunks_per_sec']:.1f} chunks/s")
+    if dedup:
+        # Estimativa pelo throughput medido em caracteres: o custo cresce com o tamanho do chunk
+        embedded_chars = sum(len(c) for c in chunks)
+        seconds = report["bucketed"]["seconds"]
+        report["dedup"]["embed_seconds_saved"] = (
+            report["dedup"]["chars_saved"] * seconds / embedded_chars if embedded_chars else 0.0
+        )
+        logger.info(
+            f"Dedup economizou {report['dedup']['duplicates']} chunks e "
+            f"~{report['dedup']['embed_seconds_saved']:.1f}s de embedding"
+        )
+
+    # IDs estáveis: o mesmo corpus gera sempre o mesmo docstore (posição no split, antes do dedup,
+    # para que as referências dos duplicados apontem para o mesmo esquema de IDs)
+    ids = [f"chunk-{i}" for i in positions]
+    vectorstore = FAISS.from_embeddings(
+        list(zip(chunks, vectors)), embedding=embeddings, ids=ids,
+        metadatas=list(metadatas) if metadatas is not None else None,
+    )
+    report["partitions"] = partition_summary(build_partitions(vectorstore))
+    return vectorstore, report
@@ -0,0 +1,134 @@
+"""
+Busca filtrada por metadados com partições lógicas do índice FAISS
+Cada valor dos campos de PARTITION_FIELDS (arquivo de origem, idioma) vira uma partição: a
+lista ordenada das posições dos seus chunks no índice, montada a partir dos metadados do
+docstore ao carregar. A busca com filtro passa ao FAISS um IDSelector da interseção das
+partições, então a distância só é calculada para o subconjunto (o índice continua um só,
+sem cópia dos vetores). Chunks que absorveram quase duplicados de outros documentos
+(chunk_dedup.py) entram também nas partições dos descartados.
+
+Filtro: {"campo": valor} ou {"campo": [valor, ...]}; valores do mesmo campo se somam e
+campos diferentes se cruzam. Ex.: {"source": "cv.pdf", "language": ["pt", "en"]}.
+Um campo sem nenhum valor no índice (ex.: language num índice anterior a esse metadado) é
+ignorado com um aviso, em vez de esvaziar a busca.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PARTITION_FIELDS = ("source", "language")
+# Campos vazios já avisados (um aviso por campo, não um por pergunta)
+_warned_empty = set()
+
+Partitions = Dict[str, Dict[str, np.ndarray]]
+Filter = Dict[str, Union[str, List[str]]]
+
+
+def build_partitions(vectorstore, fields=PARTITION_FIELDS) -> Partitions:
+    """{campo: {valor: posições no índice (int64, ordenadas)}} a partir dos metadados do docstore"""
+    positions: Dict[str, Dict[str, set]] = {field: {} for field in fields}
+    for position, doc_id in vectorstore.index_to_docstore_id.items():
+        metadata = vectorstore.docstore.search(doc_id).metadata or {}
+        references = [metadata, *metadata.get("duplicates", ())]
+        for field in fields:
+            for value in {ref.get(field) for ref in references} - {None}:
+                positions[field].setdefault(str(value), set()).add(position)
+    return {
+        field: {value: np.array(sorted(ids), dtype="int64") for value, ids in values.items()}
+        for field, values in positions.items()
+    }
+
+
+def partition_summary(partitions: Partitions) -> Dict[str, Dict[str, int]]:
+    """Quantidade de chunks por partição (vai para o index_meta.json)"""
+    return {field: {value: len(ids) for value, ids in values.items()} for field, values in partitions.items()}
+
+
+def select_ids(partitions: Partitions, filter: Optional[Filter]) -> Optional[np.ndarray]:
+    """Posições que atendem ao filtro; None sem filtro (busca no índice inteiro)"""
+    if not filter:
+        return None
+    if not isinstance(filter, dict):
+        raise ValueError(f"Filtro inválido: {filter!r} (use {{campo: valor ou [valores]}})")
+    selected = None
+    for field, values in filter.items():
+        if field not in partitions:
+            raise ValueError(f"Campo de filtro desconhecido: {field} (disponíveis: {', '.join(partitions)})")
+        if not partitions[field]:
+            if field not in _warned_empty:
+                _warned_empty.add(field)
+                logger.warning(f"Filtro por '{field}' ignorado: o índice não tem esse metadado (reindexe para usá-lo)")
+            continue
+        values = [values] if isinstance(values, str) else values
+        empty = np.empty(0, dtype="int64")
+        ids = np.unique(np.concatenate([partitions[field].get(str(v), empty) for v in values] or [empty]))
+        selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+    return selected
+
+
+def id_selector(ids: np.ndarray):
+    """IDSelectorRange para posições contíguas (um documento inteiro), IDSelectorBatch no resto"""
+    import faiss
+
+    if len(ids) and ids[-1] - ids[0] + 1 == len(ids):
+        return faiss.IDSelectorRange(int(ids[0]), int(ids[-1]) + 1)
+    # O IDSelectorBatch copia os IDs para o próprio hash set
+    return faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+
+
+def search_parameters(index, selector):
+    """Parâmetros de busca com o seletor, preservando efSearch (HNSW) e nprobe (IVF) do índice"""
+    import faiss
+
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    if hasattr(index, "nprobe"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search_positions(index, query: np.ndarray, k: int, ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """index.search restrito às posições `ids` (todas, se None); devolve (distâncias, posições) da query"""
+    if ids is None:
+        distances, positions = index.search(query, k)
+    else:
+        distances, positions = index.search(query, k, params=search_parameters(index, id_selector(ids)))
+    found = positions[0] >= 0
+    return distances[0][found], positions[0][found]
+
+
+def filtered_search(vectorstore, vector, ids: Optional[np.ndarray], k: int = 3, fetch_k: int = 4,
+                    search_type: str = "mmr", lambda_mult: float = 0.5):
+    """
+    Mesmo resultado de max_marginal_relevance_search_with_score_by_vector (ou da busca por
+    similaridade) do FAISS do LangChain, mas só entre as posições `ids`: [(Document, distância)]
+    """
+    if search_type not in ("mmr", "similarity"):
+        raise ValueError(f"search_type inválido: {search_type}")
+    if ids is not None and not len(ids):
+        return []
+    query = np.array([vector], dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        import faiss
+
+        faiss.normalize_L2(query)
+
+    n = max(fetch_k, k) if search_type == "mmr" else k
+    if ids is not None:
+        n = min(n, len(ids))
+    distances, positions = search_positions(vectorstore.index, query, n, ids)
+    if search_type == "mmr" and len(positions):
+        from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+        candidates = np.array([vectorstore.index.reconstruct(int(p)) for p in positions])
+        order = maximal_marginal_relevance(query, candidates, k=k, lambda_mult=lambda_mult)
+    else:
+        order = range(len(positions))
+
+    return [
+        (vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(positions[i])]), float(distances[i]))
+        for i in order
+    ]
@@ -0,0 +1,164 @@
+"""
+Teste de carga offline: N sessões de chat concorrentes passando pelo chat_llm_flow
+Por padrão sobe o fake_groq_server em processo, sem consumir cota da Groq
+
+Uso:
+    python load_test.py --sessions 20 --turns 5
+    python load_test.py --sessions 50 --latency-ms 800 --error-rate-429 0.05 --retriever index
+    python load_test.py --groq-api-base http://127.0.0.1:8900   # servidor fake externo
+"""
+import os
+import json
+import time
+import argparse
+import threading
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_groq_server import add_config_args, config_from_args, start_server
+
+QUESTIONS = {
+    "pt": [
+        "Qual sua experiência profissional?",
+        "Quais tecnologias você domina?",
+        "Pode falar sobre seus projetos?",
+        "Quais suas certificações?",
+        "Qual sua formação acadêmica?",
+        "Experiência com LLMs e IA?",
+    ],
+    "en": [
+        "What is your professional experience?",
+        "What technologies do you master?",
+        "Can you talk about your projects?",
+        "What are your certifications?",
+        "What is your academic background?",
+        "Experience with LLMs and AI?",
+    ],
+}
+
+STATIC_CHUNKS = [
+    "Engenheiro de IA com experiência em LLMs, RAG, LangChain e FAISS.",
+    "Projetos de análise de dados, dashboards e automação de processos de negócio.",
+    "Certificações: PUC Minas, Oracle, ITIL.",
+]
+
+
+def make_static_retriever():
+    """Retriever fixo: isola o custo do LLM e do fluxo, sem carregar o modelo de embeddings"""
+    from langchain_core.documents import Document
+    from langchain_core.retrievers import BaseRetriever
+
+    class StaticRetriever(BaseRetriever):
+        def _get_relevant_documents(self, query, *, run_manager):
+            return [Document(page_content=text) for text in STATIC_CHUNKS]
+
+    return StaticRetriever()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_session(session_id, turns, language, retriever, llm, results, lock, think_time):
+    from rag_core import SessionState, chat_llm_flow
+
+    state = SessionState()
+    questions = QUESTIONS[language]
+    for turn in range(turns):
+        question = questions[(session_id + turn) % len(questions)]
+        start = time.perf_counter()
+        _, rag_result = chat_llm_flow(retriever, question, language, llm=llm, session_state=state)
+        elapsed = time.perf_counter() - start
+        error = rag_result.get("error") if isinstance(rag_result, dict) else None
+        with lock:
+            results.append({"session": session_id, "turn": turn, "seconds": elapsed, "error": error})
+        if think_time:
+            time.sleep(think_time)
+
+
+def summarize(results, wall_seconds):
+    latencies = [r["seconds"] for r in results if not r["error"]]
+    errors = [r["error"] for r in results if r["error"]]
+    error_kinds = Counter(e.split(":")[0][:80] for e in errors)
+    return {
+        "requests": len(results),
+        "ok": len(latencies),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(results) if results else 0.0,
+        "error_kinds": dict(error_kinds),
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(results) / wall_seconds if wall_seconds > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do fluxo de chat com Groq fake")
+    parser.add_argument("--sessions", type=int, default=10, help="Sessões de chat concorrentes")
+    parser.add_argument("--turns", type=int, default=3, help="Perguntas por sessão")
+    parser.add_argument("--language", choices=["pt", "en"], default="pt")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pausa entre perguntas da mesma sessão (s)")
+    parser.add_argument("--retriever", choices=["static", "index"], default="static",
+                        help="static = chunks fixos; index = FAISS/serviço configurado no ambiente")
+    parser.add_argument("--groq-api-base", default="", help="Usar um endpoint já em execução em vez do fake em processo")
+    parser.add_argument("--output", help="Salvar o resumo em JSON")
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.groq_api_base
+    if not base_url:
+        server, base_url = start_server(config_from_args(args))
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    # Sem FAQ: as perguntas do teste são as da barra lateral e virariam hits sem LLM
+    os.environ["FAQ_ENABLED"] = "0"
+
+    from rag_core import load_llm, load_retriever
+
+    llm = load_llm(base_url=base_url)
+    retriever = make_static_retriever() if args.retriever == "static" else load_retriever()
+
+    results = []
+    lock = threading.Lock()
+    print(f"🚀 {args.sessions} sessões x {args.turns} perguntas contra {base_url}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [
+            pool.submit(run_session, i, args.turns, args.language, retriever, llm, results, lock, args.think_time)
+            for i in range(args.sessions)
+        ]
+        for future in futures:
+            future.result()
+    summary = summarize(results, time.perf_counter() - start)
+
+    print(f"\nRequisições: {summary['requests']} ({summary['errors']} erros, {summary['error_rate']:.1%})")
+    print(f"Throughput:  {summary['throughput_rps']:.2f} req/s")
+    print(f"Latência:    p50 {summary['p50_ms']:.0f} ms | p95 {summary['p95_ms']:.0f} ms | p99 {summary['p99_ms']:.0f} ms")
+    for kind, count in summary["error_kinds"].items():
+        print(f"  {count:>4}x {kind}")
+
+    from rate_limiter import QUEUE_WAIT, RATE_LIMITED, PRIORITY_INTERACTIVE
+    wait = QUEUE_WAIT.snapshot(priority=PRIORITY_INTERACTIVE)
+    summary["limiter_mean_wait_ms"] = wait["sum"] / wait["count"] * 1000 if wait["count"] else 0.0
+    summary["limiter_429"] = RATE_LIMITED.value(priority=PRIORITY_INTERACTIVE)
+    print(f"Limitador:   espera média {summary['limiter_mean_wait_ms']:.0f} ms | {summary['limiter_429']:.0f} respostas 429")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "summary": summary}, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resumo salvo em {args.output}")
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Pipeline de logs assíncrono: QueueHandler no caminho da requisição, QueueListener em
+thread própria escrevendo em arquivo rotativo (JSON) e no console
+Níveis por módulo e amostragem dos previews de chunks/perguntas reformuladas
+
+Variáveis de ambiente:
+    LOG_FILE=app_linkedin.log          # arquivo principal ('' = só console)
+    LOG_FORMAT=json|text               # formato do arquivo
+    LOG_MAX_MB=10 LOG_BACKUP_COUNT=5   # rotação por tamanho
+    LOG_ROTATE_WHEN=midnight           # rotação por tempo (substitui a rotação por tamanho)
+    LOG_LEVELS=rag_core=DEBUG,httpx=WARNING
+    LOG_PREVIEW_SAMPLE_RATE=0.05       # fração dos previews de chunks/perguntas gravada
+"""
+import os
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+from tracing import REGISTRY
+
+LOG_FILE = os.getenv("LOG_FILE", "app_linkedin.log")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_MB = float(os.getenv("LOG_MAX_MB", 10))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_PREVIEW_SAMPLE_RATE = float(os.getenv("LOG_PREVIEW_SAMPLE_RATE", 0.05))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+# Logger dos textos longos do caminho quente (previews de chunks, pergunta reformulada)
+PREVIEW_LOGGER = "rag.previews"
+
+DEFAULT_LEVELS = {
+    "httpx": "WARNING",
+    "httpcore": "WARNING",
+    "urllib3": "WARNING",
+    "sentence_transformers": "WARNING",
+    "groq": "WARNING",
+}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha; campos passados em extra={} entram no registro"""
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Deixa passar apenas uma fração dos registros (previews do caminho quente)"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Nunca bloqueia a requisição: com a fila cheia o registro é descartado e contado"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Mensagem e traceback resolvidos aqui (args podem não ser serializáveis/seguros entre threads),
+        # mas mantidos em campos separados para o formatter JSON
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec: str) -> dict:
+    """'rag_core=DEBUG,httpx=WARNING' -> {'rag_core': 'DEBUG', 'httpx': 'WARNING'}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _file_handler(path: str):
+    if LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=int(LOG_MAX_MB * 1024 * 1024), backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def setup_logging(log_file: str = LOG_FILE, level: str = LOG_LEVEL, levels: str = LOG_LEVELS):
+    """
+    Configura o logging do processo uma única vez (o Streamlit reexecuta o script a cada interação).
+    Retorna o QueueListener ativo.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handlers = [logging.StreamHandler()]
+    handlers[0].setFormatter(logging.Formatter(TEXT_FORMAT))
+    if log_file:
+        handlers.append(_file_handler(log_file))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    for name, module_level in {**DEFAULT_LEVELS, **parse_levels(levels)}.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    preview_logger = logging.getLogger(PREVIEW_LOGGER)
+    preview_logger.addFilter(SamplingFilter(LOG_PREVIEW_SAMPLE_RATE))
+
+    REGISTRY.gauge("rag_log_queue_depth", "Registros de log aguardando escrita").set_function(log_queue.qsize)
+    REGISTRY.gauge("rag_log_records_dropped", "Registros de log descartados com a fila cheia").set_function(
+        lambda: queue_handler.dropped
+    )
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Esvazia a fila e encerra a thread de escrita"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,208 @@
+"""
+Governador de memória: amostra o RSS do processo contra um orçamento e só coleta
+lixo / esvazia caches quando há pressão, em vez de um gc.collect() a cada resposta
+
+Níveis (fração do orçamento):
+    >= MEMORY_SOFT_RATIO  -> gc.collect() + malloc_trim (devolve memória livre ao sistema)
+    >= MEMORY_HARD_RATIO  -> também chama os trimmers registrados (caches da aplicação)
+
+Os módulos registram seus caches com register_trimmer ao criá-los: respostas da FAQ
+(faq_store), hashes da versão do índice (rag_core) e janelas de latência do hedging.
+
+Variáveis de ambiente:
+    MEMORY_BUDGET_MB=1800        # 0 = usa o limite do cgroup (se houver)
+    MEMORY_CHECK_INTERVAL_S=5    # período da amostragem em background
+"""
+import os
+import gc
+import time
+import ctypes
+import ctypes.util
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from tracing import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", 0))
+MEMORY_SOFT_RATIO = float(os.getenv("MEMORY_SOFT_RATIO", 0.85))
+MEMORY_HARD_RATIO = float(os.getenv("MEMORY_HARD_RATIO", 0.95))
+MEMORY_CHECK_INTERVAL_S = float(os.getenv("MEMORY_CHECK_INTERVAL_S", 5))
+# Intervalo mínimo entre coletas: evita coletar em laço quando o próprio modelo já ocupa o orçamento
+MEMORY_RECLAIM_COOLDOWN_S = float(os.getenv("MEMORY_RECLAIM_COOLDOWN_S", 30))
+# Fração do limite do cgroup usada como orçamento quando MEMORY_BUDGET_MB não é definido
+CGROUP_BUDGET_RATIO = 0.9
+
+RSS_BYTES = REGISTRY.gauge("rag_process_rss_bytes", "RSS atual do processo")
+BUDGET_BYTES = REGISTRY.gauge("rag_memory_budget_bytes", "Orçamento de memória do processo")
+HEADROOM_BYTES = REGISTRY.gauge("rag_memory_headroom_bytes", "Orçamento menos RSS atual")
+RECLAIMS = REGISTRY.counter("rag_memory_reclaims_total", "Coletas/limpezas disparadas pelo governador")
+RECLAIM_SECONDS = REGISTRY.histogram("rag_memory_reclaim_seconds", "Duração das coletas do governador")
+
+
+def read_rss_bytes() -> int:
+    """RSS atual via /proc (Linux); fora do Linux usa o pico do getrusage"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reporta bytes, Linux KiB
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def cgroup_memory_limit() -> Optional[int]:
+    """Limite de memória do cgroup em bytes (None se não houver limite)"""
+    for path in (Path("/sys/fs/cgroup/memory.max"), Path("/sys/fs/cgroup/memory/memory.limit_in_bytes")):
+        try:
+            if path.exists():
+                value = path.read_text().strip()
+                # cgroup v1 sem limite reporta um valor próximo de 2^63
+                if value != "max" and int(value) < 1 << 60:
+                    return int(value)
+        except (OSError, ValueError):
+            pass
+    return None
+
+
+def default_budget_bytes() -> Optional[int]:
+    if MEMORY_BUDGET_MB > 0:
+        return int(MEMORY_BUDGET_MB * 1024 * 1024)
+    limit = cgroup_memory_limit()
+    return int(limit * CGROUP_BUDGET_RATIO) if limit else None
+
+
+def _load_malloc_trim():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+        return libc.malloc_trim
+    except (OSError, AttributeError):
+        return None
+
+
+_malloc_trim = _load_malloc_trim()
+
+# Trimmers registrados pelos módulos dos caches; valem para qualquer governador do processo
+_trimmers: Dict[str, Callable[[], None]] = {}
+_trimmers_lock = threading.Lock()
+
+
+def register_trimmer(name: str, fn: Callable[[], None]):
+    """Callback chamado sob pressão alta para esvaziar um cache da aplicação"""
+    with _trimmers_lock:
+        _trimmers[name] = fn
+
+
+class MemoryGovernor:
+    """Thread de amostragem do RSS; a coleta acontece fora do caminho das requisições"""
+
+    def __init__(self, budget_bytes: Optional[int] = None, soft_ratio: float = MEMORY_SOFT_RATIO,
+                 hard_ratio: float = MEMORY_HARD_RATIO, interval_s: float = MEMORY_CHECK_INTERVAL_S,
+                 cooldown_s: float = MEMORY_RECLAIM_COOLDOWN_S):
+        self.budget_bytes = budget_bytes if budget_bytes is not None else default_budget_bytes()
+        self.soft_ratio = soft_ratio
+        self.hard_ratio = hard_ratio
+        self.interval_s = interval_s
+        self.cooldown_s = cooldown_s
+        self._last_reclaim = float("-inf")
+        self._trimmers: Dict[str, Callable[[], None]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        RSS_BYTES.set_function(read_rss_bytes)
+        if self.budget_bytes:
+            BUDGET_BYTES.set(self.budget_bytes)
+            HEADROOM_BYTES.set_function(lambda: self.budget_bytes - read_rss_bytes())
+
+    def register_trimmer(self, name: str, fn: Callable[[], None]):
+        """Callback chamado sob pressão alta para esvaziar um cache da aplicação"""
+        with self._lock:
+            self._trimmers[name] = fn
+
+    def reclaim(self, reason: str, trim_caches: bool = False) -> int:
+        """Coleta completa (+ caches, se pedido) e devolve os bytes liberados do RSS"""
+        with self._lock:
+            before = read_rss_bytes()
+            start = time.perf_counter()
+            if trim_caches:
+                with _trimmers_lock:
+                    trimmers = {**_trimmers, **self._trimmers}
+                for name, fn in trimmers.items():
+                    try:
+                        fn()
+                    except Exception as e:
+                        logger.warning(f"Falha ao limpar cache '{name}': {e}")
+            gc.collect()
+            if _malloc_trim is not None:
+                _malloc_trim(0)
+            elapsed = time.perf_counter() - start
+            freed = before - read_rss_bytes()
+            self._last_reclaim = time.monotonic()
+        RECLAIMS.inc(reason=reason)
+        RECLAIM_SECONDS.observe(elapsed)
+        logger.info(f"Memória recuperada ({reason}): {freed / 1024 / 1024:.1f} MB em {elapsed * 1000:.0f} ms")
+        return freed
+
+    def check(self) -> str:
+        """Compara o RSS com o orçamento e age conforme o nível: ok, soft, hard ou cooldown"""
+        if not self.budget_bytes:
+            return "ok"
+        if time.monotonic() - self._last_reclaim < self.cooldown_s:
+            return "cooldown"
+        usage = read_rss_bytes() / self.budget_bytes
+        if usage >= self.hard_ratio:
+            self.reclaim("hard", trim_caches=True)
+            return "hard"
+        if usage >= self.soft_ratio:
+            self.reclaim("soft")
+            return "soft"
+        return "ok"
+
+    def start(self):
+        """Inicia a amostragem periódica (idempotente)"""
+        if self._thread is not None or not self.budget_bytes:
+            return
+        self._thread = threading.Thread(target=self._loop, name="memory-governor", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Governador de memória ativo: orçamento {self.budget_bytes / 1024 / 1024:.0f} MB "
+            f"(soft {self.soft_ratio:.0%}, hard {self.hard_ratio:.0%}, a cada {self.interval_s:g}s)"
+        )
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"Governador de memória falhou: {e}")
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> MemoryGovernor:
+    """Governador compartilhado do processo, já em execução"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = MemoryGovernor()
+            _governor.start()
+        return _governor
+
+
+def freeze_startup_heap():
+    """
+    Move os objetos já alocados (modelo, índice, módulos) para a geração permanente do gc,
+    para que coletas futuras não precisem percorrê-los
+    """
+    gc.collect()
+    gc.freeze()
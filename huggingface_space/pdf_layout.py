@@ -0,0 +1,220 @@
+"""
+Extração de PDF guiada pelo layout (blocos e fontes do PyMuPDF)
+Em vez de juntar todas as páginas num texto só e cortar por caracteres, identifica os
+títulos pelo tamanho/negrito da fonte, agrupa os blocos em seções e monta chunks que não
+atravessam seções. Cada chunk leva a página e a seção nos metadados e começa com o título
+da seção, e linhas de tabela (células lado a lado) são mantidas juntas separadas por " | ".
+"""
+import re
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Título: fonte pelo menos 15% maior que a do corpo, ou linha curta toda em negrito
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 120
+# Fração máxima do chunk ocupada pelo título repetido no início de cada parte de uma seção longa
+HEADER_MAX_RATIO = 0.25
+BOLD_FLAG = 16
+# Números de página e rodapés do tipo "Página 3 de 10"; só são descartados na margem superior
+# ou inferior da página, ou sozinhos no bloco e iguais ao número da página (anos, "0800" e
+# valores de tabela no corpo do texto ficam)
+PAGE_NUMBER_RE = re.compile(r"^\s*(p[aá]gina|page)?\s*(\d+)(\s*(/|de|of)\s*\d+)?\s*$", re.IGNORECASE)
+# Fração da altura da página considerada cabeçalho/rodapé
+PAGE_MARGIN_RATIO = 0.08
+
+
+@dataclass
+class Line:
+    text: str
+    size: float
+    bold: bool
+    bbox: Tuple[float, float, float, float]
+
+
+@dataclass
+class Section:
+    title: str
+    page: int
+    paragraphs: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def chars(self) -> int:
+        return len(self.title) + sum(len(text) + 1 for _, text in self.paragraphs)
+
+
+def is_page_number(text: str, bbox, page_number: int, page_height: float, alone: bool) -> bool:
+    match = PAGE_NUMBER_RE.match(text)
+    if not match:
+        return False
+    margin = page_height * PAGE_MARGIN_RATIO
+    if bbox[3] <= margin or bbox[1] >= page_height - margin:
+        return True
+    return alone and int(match.group(2)) == page_number
+
+
+def read_lines(page, page_number: int = 0) -> List[List[Line]]:
+    """Blocos de texto da página, cada um como lista de linhas com tamanho e negrito da fonte"""
+    blocks = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type", 0) != 0:
+            continue
+        raws = [raw for raw in block["lines"] if any(s["text"].strip() for s in raw["spans"])]
+        lines = []
+        for raw in raws:
+            spans = [s for s in raw["spans"] if s["text"].strip()]
+            text = "".join(s["text"] for s in raw["spans"]).strip()
+            if is_page_number(text, raw["bbox"], page_number, page.rect.height, len(raws) == 1):
+                continue
+            lines.append(Line(
+                text=text,
+                size=max(s["size"] for s in spans),
+                bold=all(s["flags"] & BOLD_FLAG for s in spans),
+                bbox=tuple(raw["bbox"]),
+            ))
+        if lines:
+            blocks.append(lines)
+    return blocks
+
+
+def body_font_size(pages_blocks) -> float:
+    """Tamanho de fonte com mais caracteres no documento"""
+    sizes = Counter()
+    for blocks in pages_blocks:
+        for lines in blocks:
+            for line in lines:
+                sizes[round(line.size, 1)] += len(line.text)
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+
+def is_heading(line: Line, body_size: float) -> bool:
+    if len(line.text) > HEADING_MAX_CHARS or line.text.endswith((".", ",", ";")):
+        return False
+    return line.size >= body_size * HEADING_SIZE_RATIO or (line.bold and len(line.text) <= 60)
+
+
+def join_rows(lines: List[Line]) -> List[str]:
+    """
+    Junta linhas consecutivas na mesma altura e à direita da anterior (células de uma linha
+    de tabela ou pares rótulo/valor) com " | "
+    """
+    rows = []
+    previous = None
+    for line in lines:
+        if previous is not None:
+            center = (line.bbox[1] + line.bbox[3]) / 2
+            if previous.bbox[1] <= center <= previous.bbox[3] and line.bbox[0] >= previous.bbox[2]:
+                rows[-1] += " | " + line.text
+                previous = line
+                continue
+        rows.append(line.text)
+        previous = line
+    return rows
+
+
+def extract_sections(file_path) -> List[Section]:
+    """Seções do PDF na ordem de leitura; o texto antes do primeiro título fica numa seção sem título"""
+    import fitz  # PyMuPDF
+
+    with fitz.open(str(file_path)) as pdf:
+        pages_blocks = [read_lines(page, number) for number, page in enumerate(pdf, 1)]
+    body_size = body_font_size(pages_blocks)
+
+    sections = [Section(title="", page=1)]
+    # Pilha de títulos (tamanho, texto): subtítulos herdam o título da seção de cima
+    stack: List[Tuple[float, str]] = []
+    for page_number, blocks in enumerate(pages_blocks, 1):
+        for lines in blocks:
+            body = []
+            for line in lines:
+                if not is_heading(line, body_size):
+                    body.append(line)
+                    continue
+                if body:
+                    sections[-1].paragraphs.append((page_number, "\n".join(join_rows(body))))
+                    body = []
+                while stack and stack[-1][0] <= line.size:
+                    stack.pop()
+                stack.append((line.size, line.text))
+                sections.append(Section(title=" > ".join(title for _, title in stack), page=page_number))
+            if body:
+                sections[-1].paragraphs.append((page_number, "\n".join(join_rows(body))))
+    return [s for s in sections if s.paragraphs]
+
+
+def split_long(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_text(text)
+
+
+def chunk_header(title: str, chunk_size: int) -> str:
+    """
+    Título repetido nas partes de uma seção longa: a pilha inteira ("A > B > C") se couber em
+    HEADER_MAX_RATIO do chunk, senão só o último título (cortado, se ainda for longo)
+    """
+    if not title:
+        return ""
+    limit = max(1, int(chunk_size * HEADER_MAX_RATIO))
+    if len(title) > limit:
+        title = title.rsplit(" > ", 1)[-1][:limit]
+    return f"{title}\n"
+
+
+def layout_chunks(file_path, chunk_size: int = 1000, chunk_overlap: int = 0) -> Tuple[List[str], List[Dict]]:
+    """
+    Chunks por seção: seções curtas consecutivas dividem um chunk quando cabem inteiras,
+    seções longas são cortadas entre parágrafos e só um parágrafo maior que o chunk é
+    cortado por caracteres (com chunk_overlap). Retorna textos e metadados (source, page,
+    page_end, section).
+    """
+    source = Path(file_path).name
+    chunks: List[str] = []
+    metadatas: List[Dict] = []
+    pending: List[Section] = []
+
+    def emit(parts: List[str], first_page: int, last_page: int, titles: List[str]):
+        chunks.append("\n\n".join(parts))
+        metadatas.append({
+            "source": source,
+            "page": first_page,
+            "page_end": last_page,
+            "section": " / ".join(t for t in titles if t),
+        })
+
+    def flush_pending():
+        if pending:
+            parts = [(f"{s.title}\n" if s.title else "") + "\n".join(t for _, t in s.paragraphs) for s in pending]
+            emit(parts, pending[0].page, pending[-1].paragraphs[-1][0], [s.title for s in pending])
+            pending.clear()
+
+    for section in extract_sections(file_path):
+        if section.chars <= chunk_size:
+            if sum(s.chars for s in pending) + section.chars > chunk_size:
+                flush_pending()
+            pending.append(section)
+            continue
+        flush_pending()
+        header = chunk_header(section.title, chunk_size)
+        budget = max(1, chunk_size - len(header))
+        # O splitter recusa sobreposição >= tamanho do chunk
+        overlap = min(chunk_overlap, budget // 2)
+        current, first_page, last_page = [], section.page, section.page
+        for page, text in section.paragraphs:
+            pieces = split_long(text, budget, overlap) if len(text) > budget else [text]
+            for piece in pieces:
+                if current and sum(len(p) + 1 for p in current) + len(piece) > budget:
+                    emit([header + "\n".join(current)], first_page, last_page, [section.title])
+                    current, first_page = [], page
+                current.append(piece)
+                last_page = page
+        if current:
+            emit([header + "\n".join(current)], first_page, last_page, [section.title])
+    flush_pending()
+
+    logger.info(f"{source}: {len(chunks)} chunks por seção (chunk_size {chunk_size})")
+    return chunks, metadatas
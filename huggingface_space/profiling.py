@@ -0,0 +1,236 @@
+"""
+Profiler sob demanda de uma execução do chat_llm_flow
+Modo "sampling": uma thread amostra a pilha da requisição a cada N ms e grava folded stacks
+(compatível com flamegraph.pl, speedscope e inferno); modo "cprofile": perfil determinístico (.prof)
+Em ambos é gravado um resumo das funções mais caras; o diretório de perfis tem limite de arquivos e bytes.
+No sampling, threads de executor que rodam trabalho da requisição (tentativas do LLM em hedging.py)
+entram com profiled_thread() e também são amostradas, com o nome da thread na base da pilha;
+o cProfile cobre só a thread da requisição.
+
+Variáveis de ambiente:
+    PROFILE_MODE=sampling|cprofile     # tipo do profiler (padrão sampling)
+    PROFILE_EVERY_N=100                # perfila 1 a cada N requisições (0 = desligado)
+    PROFILE_QUERY_PARAM=1              # permite forçar com ?profile=1 no app
+    PROFILES_DIR=./profiles            # destino dos arquivos
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import itertools
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampling")
+PROFILE_EVERY_N = int(os.getenv("PROFILE_EVERY_N", 0))
+PROFILE_QUERY_PARAM = os.getenv("PROFILE_QUERY_PARAM", "0") == "1"
+PROFILES_DIR = os.getenv("PROFILES_DIR", "./profiles")
+PROFILES_MAX_FILES = int(os.getenv("PROFILES_MAX_FILES", 60))
+PROFILES_MAX_MB = float(os.getenv("PROFILES_MAX_MB", 50))
+SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))
+# Limite de amostras por requisição: mantém memória e custo limitados em perguntas muito lentas
+MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", 20000))
+TOP_FUNCTIONS = 25
+
+_request_counter = itertools.count(1)
+_write_lock = threading.Lock()
+# Só um cProfile pode estar ativo por processo; requisições concorrentes caem para o sampling
+_cprofile_lock = threading.Lock()
+# Sampler da requisição em andamento; chega às threads de executor pelo contexto copiado
+_active_sampler = contextvars.ContextVar("active_sampler", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    Amostra periodicamente a pilha da thread da requisição (e das threads adicionadas com
+    add_thread) e acumula as pilhas em formato folded
+    """
+
+    def __init__(self, thread_id: int, interval_ms: float = SAMPLE_INTERVAL_MS, max_samples: int = MAX_SAMPLES):
+        self.thread_id = thread_id
+        self._threads = {thread_id: threading.current_thread().name}
+        self._threads_lock = threading.Lock()
+        self.interval = max(0.001, interval_ms / 1000.0)
+        self.max_samples = max_samples
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def add_thread(self, thread_id: int, name: str):
+        with self._threads_lock:
+            self._threads[thread_id] = name
+
+    def remove_thread(self, thread_id: int):
+        with self._threads_lock:
+            self._threads.pop(thread_id, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and self.samples < self.max_samples:
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = list(self._threads.items())
+            for thread_id, name in threads:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(f"[{name}]")
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top: int = TOP_FUNCTIONS) -> str:
+        """Top funções por tempo próprio (topo da pilha) e inclusivo (qualquer posição)"""
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            # Sem o nome da thread na base: só as funções entram no resumo
+            frames = stack.split(";")[1:] or stack.split(";")
+            self_counts[frames[-1]] += count
+            for name in set(frames):
+                total_counts[name] += count
+        total = max(1, self.samples)
+        lines = [f"amostras: {self.samples} (intervalo {self.interval * 1000:.1f} ms)", "", "tempo próprio:"]
+        lines += [f"  {count / total:6.1%}  {name}" for name, count in self_counts.most_common(top)]
+        lines += ["", "tempo inclusivo:"]
+        lines += [f"  {count / total:6.1%}  {name}" for name, count in total_counts.most_common(top)]
+        return "\n".join(lines) + "\n"
+
+
+class ProfileResult:
+    def __init__(self, mode: str, label: str):
+        self.mode = mode
+        self.label = label
+        self.paths = []
+        self.seconds = 0.0
+
+
+@contextmanager
+def profiled_thread():
+    """
+    Inclui a thread atual no sampling da requisição ativa (se houver), enquanto o bloco roda.
+    Para threads de executor que recebem o contexto da requisição (contextvars.copy_context).
+    """
+    sampler = _active_sampler.get()
+    if sampler is None:
+        yield
+        return
+    thread = threading.current_thread()
+    sampler.add_thread(thread.ident, thread.name)
+    try:
+        yield
+    finally:
+        sampler.remove_thread(thread.ident)
+
+
+def should_profile(force: bool = False) -> bool:
+    """Decide se a requisição atual será perfilada (forçada ou 1 a cada PROFILE_EVERY_N)"""
+    if force:
+        return True
+    if PROFILE_EVERY_N <= 0:
+        return False
+    return next(_request_counter) % PROFILE_EVERY_N == 0
+
+
+def prune_profiles(directory: Path, max_files: int = PROFILES_MAX_FILES, max_mb: float = PROFILES_MAX_MB):
+    """Remove os perfis mais antigos até caber no limite de arquivos e de bytes"""
+    files = sorted((p for p in directory.iterdir() if p.is_file()), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    max_bytes = max_mb * 1024 * 1024
+    while files and (len(files) > max_files or total > max_bytes):
+        oldest = files.pop(0)
+        total -= oldest.stat().st_size
+        oldest.unlink(missing_ok=True)
+
+
+def _write(directory: Path, name: str, content: str, result: ProfileResult):
+    path = directory / name
+    path.write_text(content, encoding="utf-8")
+    result.paths.append(str(path))
+
+
+@contextmanager
+def maybe_profile(force: bool = False, mode: str = PROFILE_MODE, label: str = "chat", directory: str = PROFILES_DIR):
+    """
+    Perfila o bloco se should_profile(force) e produz um ProfileResult (ou None).
+    Os arquivos são gravados na saída do bloco, com o prefixo <timestamp>_<label>.
+    """
+    if not should_profile(force):
+        yield None
+        return
+
+    sampler = profiler = None
+    if mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+        mode = "sampling"
+    result = ProfileResult(mode, label)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        sampler = SamplingProfiler(threading.get_ident())
+        sampler.start()
+    sampler_token = _active_sampler.set(sampler)
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result.seconds = time.perf_counter() - start
+        _active_sampler.reset(sampler_token)
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_lock.release()
+        if sampler is not None:
+            sampler.stop()
+
+        try:
+            out_dir = Path(directory)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            prefix = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{label}"
+            header = f"{label}: {result.seconds * 1000:.0f} ms ({mode})\n"
+            with _write_lock:
+                if profiler is not None:
+                    prof_path = out_dir / f"{prefix}.prof"
+                    profiler.dump_stats(str(prof_path))
+                    result.paths.append(str(prof_path))
+                    stream = io.StringIO()
+                    stats = pstats.Stats(profiler, stream=stream).strip_dirs().sort_stats("cumulative")
+                    stats.print_stats(TOP_FUNCTIONS)
+                    _write(out_dir, f"{prefix}_top.txt", header + stream.getvalue(), result)
+                else:
+                    _write(out_dir, f"{prefix}.folded", sampler.folded(), result)
+                    _write(out_dir, f"{prefix}_top.txt", header + sampler.summary(), result)
+                prune_profiles(out_dir)
+            logger.info(f"Perfil da requisição gravado em {result.paths[0]} ({result.seconds * 1000:.0f} ms)")
+        except Exception as e:
+            logger.warning(f"Falha ao gravar perfil: {e}")
+
+
+def query_param_requested(query_params) -> bool:
+    """?profile=1 no app, apenas quando PROFILE_QUERY_PARAM=1"""
+    return PROFILE_QUERY_PARAM and str(query_params.get("profile", "")) in ("1", "true")
@@ -0,0 +1,711 @@
+"""
+Pipeline RAG do assistente de currículo, independente da interface Streamlit
+Reformulação da pergunta -> recuperação no FAISS -> resposta do LLM
+Usado pelo app.py e pelas ferramentas de carga/benchmark que rodam fora do Streamlit
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# LangChain core pieces
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# LLM provider (Groq)
+from langchain_groq import ChatGroq
+
+# Document handling / splits / embeddings / vectorstore
+from langchain_community.document_loaders import PyMuPDFLoader
+from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.vectorstores import FAISS
+
+from cancellation import RequestCancelled, check_cancelled, invoke_cancellable, stream_chunks
+from chunking import (
+    check_embedding_model, chunking_params, expand_to_parents, files_digest, index_chunks, index_files, load_parents,
+    retrieval_params, save_parents, write_index_meta,
+)
+from embedding_batcher import BatchingEmbeddings, BATCH_MAX_SIZE
+from index_embedding import build_vectorstore
+from index_partitions import build_partitions, filtered_search, select_ids
+from faq_store import get_faq_store
+from hedging import hedged_call, model_name
+from history_manager import get_history_manager
+from logging_setup import PREVIEW_LOGGER
+from memory_governor import freeze_startup_heap, register_trimmer
+from profiling import maybe_profile
+from rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, estimate_tokens, limited_call
+from runtime_tuning import configure_cpu_runtime
+from single_flight import SINGLE_FLIGHT, coalesce_key
+from tracing import REGISTRY, span, start_trace, token_usage_callback
+
+logger = logging.getLogger(__name__)
+# Textos longos do caminho quente: amostrados pelo logging_setup (LOG_PREVIEW_SAMPLE_RATE)
+preview_logger = logging.getLogger(PREVIEW_LOGGER)
+
+# -------------------------
+# Multilingual Support
+# -------------------------
+TRANSLATIONS = {
+    "pt": {
+        "page_title": "Thiago Milanez - Assistente Virtual 💼",
+        "main_title": "💼 Assistente Virtual de Currículo",
+        "subtitle": "Converse comigo para saber mais sobre a experiência profissional de Thiago Milanez",
+        "language": "🌐 Idioma",
+        "about_title": "ℹ️ Sobre este Assistente",
+        "about_text": "Sou um assistente de IA que responde perguntas sobre o currículo e experiência profissional de **Thiago Milanez C Pinheiro**.",
+        "features_title": "✨ Recursos",
+        "feature1": "💬 Conversação natural",
+        "feature2": "📄 Baseado no CV real",
+        "feature3": "⚡ Respostas em < 1 segundo",
+        "feature4": "🎯 Informações precisas",
+        "tech_title": "🛠️ Tecnologias",
+        "portfolio_button": "🏠 Voltar ao Portfólio",
+        "chat_placeholder": "Pergunte sobre a experiência profissional de Thiago...",
+        "loading_index": "🔄 Carregando índice FAISS...",
+        "processing": "🤖 Processando sua pergunta...",
+        "error_config": "⚠️ Configuração incompleta: GROQ_API_KEY não configurada. Configure em Settings → Repository secrets",
+        "error_llm": "⚠️ Erro ao conectar com o serviço de IA:",
+        "error_docs": "⚠️ Erro ao processar documentos:",
+        "no_info": "Essa informação específica não está disponível no meu currículo atual. Posso ajudar com outras questões sobre minha experiência profissional.",
+        "welcome_msg": "👋 Olá! Sou o assistente virtual de Thiago Milanez. Posso responder perguntas sobre experiência profissional, projetos, habilidades técnicas e formação acadêmica. Como posso ajudar?",
+        "system_prompt_qa": """Você é um assistente virtual profissional representando Thiago Milanez C Pinheiro.
+
+INSTRUÇÕES CRÍTICAS:
+1. Use EXCLUSIVAMENTE as informações encontradas no CONTEXTO abaixo
+2. NÃO invente, suponha ou adicione informações que não estejam no contexto
+3. Se a informação não estiver no contexto, responda: "Essa informação específica não está disponível no meu currículo atual. Posso ajudar com outras questões sobre minha experiência profissional."
+4. Seja objetivo, profissional e cite apenas fatos concretos do contexto
+5. Para perguntas técnicas, mencione SOMENTE tecnologias e projetos listados no contexto
+6. Responda em primeira pessoa como se fosse o próprio Thiago
+7. Mantenha respostas concisas (máximo 5-7 linhas), focando no essencial
+
+CONTEXTO DO CURRÍCULO:
+{context}
+
+PERGUNTA DO RECRUTADOR: {input}
+
+RESPOSTA (baseada APENAS no contexto acima):""",
+        "context_system_prompt": "Given the following chat history and the follow-up question which might reference context in the chat history, formulate a standalone question which can be understood without the chat history. Do NOT answer the question, only reformulate it if needed; otherwise return it as-is."
+    },
+    "en": {
+        "page_title": "Thiago Milanez - Virtual Assistant 💼",
+        "main_title": "💼 CV Virtual Assistant",
+        "subtitle": "Chat with me to learn more about Thiago Milanez's professional experience",
+        "language": "🌐 Language",
+        "about_title": "ℹ️ About this Assistant",
+        "about_text": "I am an AI assistant that answers questions about **Thiago Milanez C Pinheiro**'s resume and professional experience.",
+        "features_title": "✨ Features",
+        "feature1": "💬 Natural conversation",
+        "feature2": "📄 Based on real CV",
+        "feature3": "⚡ Answers in < 1 second",
+        "feature4": "🎯 Accurate information",
+        "tech_title": "🛠️ Technologies",
+        "portfolio_button": "🏠 Back to Portfolio",
+        "chat_placeholder": "Ask about Thiago's professional experience...",
+        "loading_index": "🔄 Loading FAISS index...",
+        "processing": "🤖 Processing your question...",
+        "error_config": "⚠️ Incomplete configuration: GROQ_API_KEY not set. Configure in Settings → Repository secrets",
+        "error_llm": "⚠️ Error connecting to AI service:",
+        "error_docs": "⚠️ Error processing documents:",
+        "no_info": "This specific information is not available in my current resume. I can help with other questions about my professional experience.",
+        "welcome_msg": "👋 Hello! I'm Thiago Milanez's virtual assistant. I can answer questions about professional experience, projects, technical skills, and academic background. How can I help?",
+        "system_prompt_qa": """You are a professional virtual assistant representing Thiago Milanez C Pinheiro.
+
+CRITICAL INSTRUCTIONS:
+1. Use EXCLUSIVELY the information found in the CONTEXT below
+2. DO NOT invent, assume or add information that is not in the context
+3. If the information is not in the context, respond: "This specific information is not available in my current resume. I can help with other questions about my professional experience."
+4. Be objective, professional and cite only concrete facts from the context
+5. For technical questions, mention ONLY technologies and projects listed in the context
+6. Respond in first person as if you were Thiago himself
+7. Keep answers concise (maximum 5-7 lines), focusing on essentials
+
+RESUME CONTEXT:
+{context}
+
+RECRUITER QUESTION: {input}
+
+ANSWER (based ONLY on the context above):""",
+        "context_system_prompt": "Given the following chat history and the follow-up question which might reference context in the chat history, formulate a standalone question which can be understood without the chat history. Do NOT answer the question, only reformulate it if needed; otherwise return it as-is."
+    }
+}
+
+# -------------------------
+# Configs / hyperparams
+# -------------------------
+ID_MODEL = os.getenv("GROQ_MODEL_ID", "llama-3.3-70b-versatile")
+TEMPERATURE = float(os.getenv("GROQ_TEMPERATURE", 0.7))
+# Modelo usado no hedging e no failover (hedging.py); vazio = duplicatas no próprio modelo
+ID_FALLBACK_MODEL = os.getenv("GROQ_FALLBACK_MODEL_ID", "")
+# Endpoint compatível com a API da Groq (ex.: fake_groq_server.py); vazio = api.groq.com
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "")
+CONTENT_PATH = os.getenv("CONTENT_PATH_LINKEDIN", "./content_linkedin")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR_LINKEDIN", "index_faiss_linkedin")
+# Serviço de recuperação compartilhado (retrieval_service.py); vazio = FAISS em processo
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL", "")
+RETRIEVAL_INDEX_NAME = os.getenv("RETRIEVAL_INDEX_NAME", "linkedin")
+# Intervalo entre consultas da versão do índice remoto (GET /indexes do serviço)
+RETRIEVAL_VERSION_TTL_S = float(os.getenv("RETRIEVAL_VERSION_TTL_S", 30))
+# Busca filtrada (index_partitions.py): só nos documentos do idioma da interface e/ou só nos
+# PDFs listados ("cv.pdf,portfolio.pdf"); desligado = busca em todos os chunks do índice
+RETRIEVAL_FILTER_LANGUAGE = os.getenv("RETRIEVAL_FILTER_LANGUAGE", "0") == "1"
+RETRIEVAL_SOURCES = [s.strip() for s in os.getenv("RETRIEVAL_SOURCES", "").split(",") if s.strip()]
+MAX_CONTEXT_LEN = 4000
+
+# -------------------------
+# LLM loader
+# -------------------------
+def load_llm(model_id: str = ID_MODEL, temperature: float = TEMPERATURE, base_url: str = GROQ_API_BASE):
+    try:
+        logger.info(f"Inicializando LLM com modelo: {model_id}" + (f" em {base_url}" if base_url else ""))
+        llm = ChatGroq(
+            model=model_id,
+            temperature=temperature,
+            max_tokens=None,
+            timeout=60,
+            # Repetições (429) ficam com o rate_limiter compartilhado, com backoff e jitter
+            max_retries=0,
+            base_url=base_url or None,
+            callbacks=[token_usage_callback()],
+        )
+        return llm
+    except Exception as e:
+        logger.error(f"Erro ao inicializar LLM: {str(e)}")
+        raise
+
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """LLM compartilhado do processo, criado na primeira chamada"""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            _llm = load_llm()
+        return _llm
+
+
+_fallback_llms = {}
+
+
+def get_fallback_llm(llm):
+    """LLM de fallback no mesmo endpoint do principal (None sem GROQ_FALLBACK_MODEL_ID)"""
+    if not ID_FALLBACK_MODEL or ID_FALLBACK_MODEL == model_name(llm):
+        return None
+    base_url = getattr(llm, "groq_api_base", None) or ""
+    key = (ID_FALLBACK_MODEL, base_url)
+    with _llm_lock:
+        if key not in _fallback_llms:
+            _fallback_llms[key] = load_llm(ID_FALLBACK_MODEL, TEMPERATURE, base_url)
+        return _fallback_llms[key]
+
+
+def llm_text(prompt, inputs, llm, tokens, priority=PRIORITY_INTERACTIVE):
+    """prompt | llm | StrOutputParser sob o limitador, com hedging/failover para o modelo de fallback"""
+    def call(model):
+        chain = prompt | model | StrOutputParser()
+        return limited_call(lambda: invoke_cancellable(chain, inputs), tokens, priority)
+
+    return hedged_call(call, llm, get_fallback_llm(llm))
+
+# -------------------------
+# Utilidades
+# -------------------------
+def extract_text_pdf(file_path):
+    try:
+        logger.info(f"Extraindo texto do PDF: {file_path}")
+        loader = PyMuPDFLoader(str(file_path))
+        pages = loader.load()
+        content = "\n".join([p.page_content for p in pages])
+        logger.info(f"PDF processado com sucesso: {len(pages)} páginas")
+        return content
+    except Exception as e:
+        logger.error(f"Erro ao processar PDF {file_path}: {str(e)}")
+        raise
+
+# -------------------------
+# Retriever / Index config
+# -------------------------
+def chunk_id(text: str) -> str:
+    """ID estável de um chunk (hash do conteúdo), usado quando o docstore não traz um"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class ScoredFAISSRetriever(BaseRetriever):
+    """
+    Busca MMR no FAISS com score e chunk_id nos metadados (mesmo formato do RemoteRetriever).
+    Com parents (índice parent-child), os filhos encontrados viram suas seções pai, sem
+    repetir, até max_chars. Com filter (ex.: {"language": "en"}), a busca fica restrita às
+    partições correspondentes (index_partitions.py).
+    """
+
+    vectorstore: Any
+    k: int = 3
+    fetch_k: int = 4
+    parents: Dict[str, Any] = {}
+    max_chars: int = MAX_CONTEXT_LEN
+    # Posições de cada partição (campo -> valor -> ids), de build_partitions
+    partitions: Dict[str, Any] = {}
+
+    def _get_relevant_documents(self, query: str, *, run_manager, filter: Optional[Dict] = None) -> List[Document]:
+        vector = self.vectorstore.embeddings.embed_query(query)
+        if filter:
+            docs_and_scores = filtered_search(
+                self.vectorstore, vector, select_ids(self.partitions, filter), k=self.k, fetch_k=self.fetch_k
+            )
+        else:
+            docs_and_scores = self.vectorstore.max_marginal_relevance_search_with_score_by_vector(
+                vector, k=self.k, fetch_k=max(self.fetch_k, self.k)
+            )
+        hits = [
+            (doc.page_content, {
+                **doc.metadata,
+                "score": float(score),
+                "chunk_id": getattr(doc, "id", None) or chunk_id(doc.page_content),
+            })
+            for doc, score in docs_and_scores
+        ]
+        if self.parents:
+            hits = expand_to_parents(hits, self.parents, self.max_chars)
+        return [Document(page_content=text, metadata=metadata) for text, metadata in hits]
+
+
+def load_retriever(folder_path: str = CONTENT_PATH):
+    """
+    Retorna o retriever do currículo: serviço compartilhado, índice FAISS salvo
+    ou, na ausência dos dois, um índice novo criado a partir dos PDFs.
+    """
+    # Serviço compartilhado: um único processo com o modelo de embeddings atende todos os apps
+    if RETRIEVAL_SERVICE_URL:
+        from retrieval_client import RemoteRetriever
+        logger.info(f"Usando serviço de recuperação em {RETRIEVAL_SERVICE_URL} (índice '{RETRIEVAL_INDEX_NAME}')")
+        return RemoteRetriever(
+            service_url=RETRIEVAL_SERVICE_URL, index_name=RETRIEVAL_INDEX_NAME, k=3, fetch_k=4,
+            max_chars=MAX_CONTEXT_LEN,
+        )
+
+    # Verificar se índice FAISS já existe (otimização para cold start)
+    faiss_path = Path(FAISS_INDEX_DIR)
+    if faiss_path.exists() and (faiss_path / "index.faiss").exists():
+        logger.info(f"Carregando índice FAISS existente de {FAISS_INDEX_DIR}")
+        # Configurar embeddings com cache reduzido para economizar memória
+        # Queries concorrentes de várias sessões são agrupadas em micro-lotes
+        base_embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            cache_folder="./cache",
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'batch_size': BATCH_MAX_SIZE, 'show_progress_bar': False}
+        )
+        configure_cpu_runtime(base_embeddings)
+        embeddings = BatchingEmbeddings(base_embeddings)
+        REGISTRY.gauge("rag_embedding_queue_depth", "Queries aguardando o micro-batching de embeddings").set_function(
+            lambda: embeddings.stats()["queue_depth"]
+        )
+        vectorstore = FAISS.load_local(FAISS_INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
+        check_embedding_model(FAISS_INDEX_DIR, EMBEDDING_MODEL)
+        retriever = ScoredFAISSRetriever(
+            vectorstore=vectorstore, parents=load_parents(FAISS_INDEX_DIR),
+            partitions=build_partitions(vectorstore), **retrieval_params(FAISS_INDEX_DIR)
+        )
+        logger.info("Índice FAISS carregado com sucesso")
+        # Modelo e índice carregados: coletas futuras não precisam percorrer esse heap
+        freeze_startup_heap()
+        return retriever
+
+    docs_path = Path(folder_path)
+
+    if not docs_path.exists():
+        logger.error(f"Diretório não encontrado: {docs_path}")
+        raise FileNotFoundError(f"Diretório de conteúdo não encontrado: {folder_path}")
+
+    pdf_files = list(docs_path.glob("*.pdf"))
+    logger.info(f"Encontrados {len(pdf_files)} arquivos PDF em {docs_path}")
+
+    if len(pdf_files) < 1:
+        raise FileNotFoundError(f"Nenhum arquivo PDF encontrado em: {docs_path}")
+
+    # Parâmetros escolhidos pelo chunk_tuner.py, se ele já gravou o index_meta.json
+    chunking = chunking_params(FAISS_INDEX_DIR)
+    logger.info(f"Processando documentos PDF e criando chunks ({chunking})...")
+    chunks, metadatas, parents = index_chunks(pdf_files, chunking, extract_text_pdf)
+    logger.info(f"Total de {len(chunks)} chunks criados")
+
+    logger.info(f"Gerando embeddings com modelo: {EMBEDDING_MODEL}")
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    configure_cpu_runtime(embeddings)
+
+    logger.info("Criando índice FAISS...")
+    vectorstore, report = build_vectorstore(chunks, embeddings, metadatas=metadatas)
+
+    vectorstore.save_local(FAISS_INDEX_DIR)
+    save_parents(FAISS_INDEX_DIR, parents)
+    write_index_meta(FAISS_INDEX_DIR, chunking, EMBEDDING_MODEL, vectorstore.index.ntotal,
+                     dedup=report.get("dedup"), parents=len(parents), partitions=report["partitions"])
+    logger.info(f"Índice salvo em: {FAISS_INDEX_DIR}")
+
+    retriever = ScoredFAISSRetriever(
+        vectorstore=vectorstore, parents=parents, partitions=build_partitions(vectorstore),
+        **retrieval_params(FAISS_INDEX_DIR)
+    )
+    logger.info("Retriever configurado com sucesso")
+    freeze_startup_heap()
+
+    return retriever
+
+_index_version_cache = {}
+register_trimmer("index_version", _index_version_cache.clear)
+_remote_version = {"version": None, "checked_at": 0.0}
+
+
+def remote_index_version() -> str:
+    """
+    Hash do índice carregado no serviço de recuperação, consultado no máximo a cada
+    RETRIEVAL_VERSION_TTL_S. Com o serviço fora do ar, mantém a última versão conhecida.
+    """
+    from retrieval_client import fetch_index_version
+
+    now = time.monotonic()
+    if _remote_version["version"] is None or now - _remote_version["checked_at"] >= RETRIEVAL_VERSION_TTL_S:
+        _remote_version["checked_at"] = now
+        try:
+            _remote_version["version"] = fetch_index_version(RETRIEVAL_SERVICE_URL, RETRIEVAL_INDEX_NAME)
+        except Exception as e:
+            logger.warning(f"Versão do índice remoto indisponível: {e}")
+    return f"remote:{_remote_version['version'] or 'unknown'}"
+
+
+def index_version(index_dir: str = FAISS_INDEX_DIR, folder_path: str = CONTENT_PATH) -> str:
+    """
+    Identificador do conteúdo indexado: hash dos arquivos do índice FAISS (ou dos PDFs, se ainda
+    não há índice). Só é recalculado quando tamanho/mtime dos arquivos mudam. No modo serviço,
+    o hash é o do índice carregado no retrieval_service.
+    """
+    if RETRIEVAL_SERVICE_URL:
+        return remote_index_version()
+    index_path = Path(index_dir)
+    if (index_path / "index.faiss").exists():
+        files = index_files(index_path)
+    else:
+        files = sorted(Path(folder_path).glob("*.pdf"))
+    if not files:
+        return "none"
+
+    stamp = tuple((str(p), p.stat().st_size, p.stat().st_mtime_ns) for p in files)
+    version = _index_version_cache.get(stamp)
+    if version is None:
+        version = files_digest(files)
+        _index_version_cache.clear()
+        _index_version_cache[stamp] = version
+    return version
+
+# -------------------------
+# RAG: contextualize question -> retrieve -> answer
+# -------------------------
+def get_context_prompt(language="pt"):
+    """Retorna o prompt de contexto no idioma especificado"""
+    return TRANSLATIONS[language]["context_system_prompt"]
+
+def get_qa_prompt(language="pt"):
+    """Retorna o prompt QA no idioma especificado"""
+    return TRANSLATIONS[language]["system_prompt_qa"]
+
+def contextualize_question(question, chat_history, llm, language="pt", priority=PRIORITY_INTERACTIVE):
+    """Reformula a pergunta de acompanhamento em uma pergunta independente do histórico"""
+    context_q_system_prompt = get_context_prompt(language)
+    context_q_prompt = ChatPromptTemplate.from_messages([
+        ("system", context_q_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "Question: {input}"),
+    ])
+
+    tokens = estimate_tokens(context_q_system_prompt, question, *(m.content for m in chat_history))
+    with span("reformulation"):
+        reformulated = llm_text(
+            context_q_prompt, {"input": question, "chat_history": chat_history}, llm, tokens, priority
+        )
+    preview_logger.info(f"Pergunta reformulada: '{reformulated}'")
+    return reformulated
+
+def retrieval_filter(language="pt") -> Dict:
+    """Filtro de metadados da busca conforme a configuração e o idioma da interface ({} = sem filtro)"""
+    filter = {}
+    if RETRIEVAL_FILTER_LANGUAGE:
+        filter["language"] = language
+    if RETRIEVAL_SOURCES:
+        filter["source"] = RETRIEVAL_SOURCES
+    return filter
+
+def retrieve_documents(query, retriever, filter=None):
+    """
+    Busca os documentos relevantes para a pergunta (já reformulada), normalizados para Document.
+    filter ({"source": ..., "language": ...}) vai para os retrievers que suportam busca filtrada.
+    """
+    check_cancelled()
+    kwargs = {"filter": filter} if filter else {}
+    with span("retrieval"):
+        try:
+            if hasattr(retriever, "get_relevant_documents"):
+                retrieved = retriever.get_relevant_documents(query, **kwargs)
+            elif hasattr(retriever, "get_relevant_texts"):
+                retrieved = retriever.get_relevant_texts(query)
+            else:
+                retrieved = retriever.invoke(query, **kwargs)
+            
+            logger.debug(f"Retriever retornou {len(retrieved)} documentos")
+            
+        except Exception as e:
+            logger.error(f"Erro ao recuperar documentos: {e}")
+            retrieved = []
+
+    documents = []
+    for d in retrieved:
+        if isinstance(d, Document):
+            documents.append(d)
+        elif isinstance(d, str):
+            documents.append(Document(page_content=d))
+        else:
+            content = getattr(d, "page_content", None)
+            documents.append(Document(page_content=str(d) if content is None else content))
+
+    logger.debug(f"Extraídos {len(documents)} textos dos documentos")
+    if documents:
+        preview_logger.info(f"Preview do primeiro texto: {documents[0].page_content[:200]}")
+    else:
+        logger.warning("Nenhum texto extraído dos documentos!")
+
+    return documents
+
+def retrieve_texts(query, retriever, filter=None):
+    """Busca os documentos relevantes para a pergunta (já reformulada) e extrai seus textos"""
+    return [d.page_content for d in retrieve_documents(query, retriever, filter)]
+
+def source_info(document) -> dict:
+    """
+    ID e score de um chunk recuperado (score ausente no retriever sem pontuação), mais
+    página e seção quando o índice foi gerado com chunking por layout
+    """
+    metadata = document.metadata or {}
+    info = {
+        "chunk_id": metadata.get("chunk_id") or chunk_id(document.page_content),
+        "score": metadata.get("score"),
+    }
+    info.update({key: metadata[key] for key in ("page", "section") if metadata.get(key) is not None})
+    return info
+
+def history_aware_retriever_fn(input_dict, retriever, llm, language="pt"):
+    """Reformula a pergunta considerando histórico e retorna documentos relevantes"""
+    question = input_dict.get("input")
+    chat_history = input_dict.get("chat_history", [])
+    reformulated = contextualize_question(question, chat_history, llm, language)
+    return retrieve_texts(reformulated, retriever, retrieval_filter(language))
+
+def pack_context(texts, max_context_len=MAX_CONTEXT_LEN):
+    """Concatena os chunks recuperados, em ordem, até o limite de caracteres do contexto"""
+    context_builder = []
+    current_len = 0
+    for t in texts:
+        t_len = len(t)
+        if current_len + t_len > max_context_len:
+            break
+        context_builder.append(t)
+        current_len += t_len
+    return "\n\n---\n\n".join(context_builder) if context_builder else ""
+
+def make_rag_response(question, chat_history, retriever, llm, language="pt", on_token=None,
+                      priority=PRIORITY_INTERACTIVE):
+    logger.debug(f"make_rag_response chamado para pergunta: '{question[:100]}'")
+    
+    qa_system_prompt = get_qa_prompt(language)
+    qa_prompt = ChatPromptTemplate.from_messages([
+        ("system", qa_system_prompt),
+    ])
+    
+    # Uma única reformulação por pergunta, reaproveitada na busca e no resultado
+    reformulated = contextualize_question(question, chat_history, llm, language, priority)
+    documents = retrieve_documents(reformulated, retriever, retrieval_filter(language))
+    texts = [d.page_content for d in documents]
+    sources = [source_info(d) for d in documents]
+    logger.debug(f"Recuperação retornou {len(texts)} textos")
+
+    with span("context_packing"):
+        context = pack_context(texts)
+    
+    logger.debug(f"Contexto final tem {len(context)} caracteres")
+
+    if not context:
+        logger.warning("Contexto vazio - retriever não encontrou documentos relevantes!")
+        no_info_msg = TRANSLATIONS[language]["no_info"]
+        return {
+            "answer": no_info_msg,
+            "reformulated_question": reformulated,
+            "similarity_used": 0.0,
+            "used_chunks_preview": [],
+            "sources": sources,
+        }
+
+    final_input = {"input": question, "context": context}
+    tokens = estimate_tokens(qa_system_prompt, question, context)
+    with span("answer_generation"):
+        # on_token recebe os chunks da resposta conforme chegam (SSE do api_server.py)
+        with stream_chunks(on_token):
+            answer = llm_text(qa_prompt, final_input, llm, tokens, priority)
+
+    previews = [t[:300].replace("\n", " ") + "..." for t in texts[:5]]
+
+    return {
+        "answer": answer,
+        "reformulated_question": reformulated,
+        "similarity_used": None,
+        "used_chunks_preview": previews,
+        "sources": sources,
+    }
+
+# -------------------------
+# Chat handlers
+# -------------------------
+class SessionState(dict):
+    """Estado de sessão fora do Streamlit (load test, CLI) com acesso por atributo como st.session_state"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        del self[name]
+
+
+def refresh_faq(retriever, llm=None) -> bool:
+    """
+    Regenera a FAQ em background, sem atrasar a resposta, se ela foi gerada para outro índice
+    (True se iniciou). Chamado só pelo app e pelo api_server: o load test e os benchmarks passam
+    pelo chat_llm_flow com LLM fake e não podem gravar respostas na FAQ de produção.
+    """
+    if llm is None:
+        llm = get_llm()
+    return get_faq_store().refresh_async(
+        lambda question, lang: make_rag_response(question, [], retriever, llm, lang, priority=PRIORITY_BACKGROUND),
+        index_version(), ID_MODEL,
+    )
+
+
+def chat_llm_flow(retriever, user_input, language="pt", llm=None, session_state=None, profile=False, on_token=None):
+    """
+    Processa uma pergunta da sessão: valida, atualiza o histórico e gera a resposta RAG.
+    session_state padrão é st.session_state; llm padrão é o LLM compartilhado do processo.
+    profile=True força o profiler nesta execução (ver profiling.py).
+    on_token(chunk) recebe a resposta em streaming (não é chamado quando a resposta é compartilhada).
+    """
+    with maybe_profile(force=profile) as profile_result:
+        res_text, rag_result = _chat_llm_flow(retriever, user_input, language, llm, session_state, on_token)
+    if profile_result is not None and profile_result.paths:
+        rag_result["profile_paths"] = profile_result.paths
+    return res_text, rag_result
+
+
+def _chat_llm_flow(retriever, user_input, language, llm, session_state, on_token=None):
+    if session_state is None:
+        import streamlit as st
+        session_state = st.session_state
+    if llm is None:
+        llm = get_llm()
+
+    try:
+        # Inicializar histórico com mensagem de boas-vindas no idioma correto
+        if "chat_history" not in session_state:
+            welcome_msg = TRANSLATIONS[language]["welcome_msg"]
+            session_state.chat_history = [AIMessage(content=welcome_msg)]
+
+        if not user_input or len(user_input.strip()) == 0:
+            logger.warning("Input vazio recebido")
+            if language == "pt":
+                return "Por favor, digite uma pergunta.", {}
+            else:
+                return "Please type a question.", {}
+        
+        if len(user_input) > 5000:
+            logger.warning(f"Input muito longo: {len(user_input)} caracteres")
+            if language == "pt":
+                return "Pergunta muito longa. Por favor, seja mais conciso (máximo 5000 caracteres).", {}
+            else:
+                return "Question too long. Please be more concise (maximum 5000 characters).", {}
+
+        logger.info(f"Processando pergunta: {user_input[:100]}...")
+        
+        # Prompt: resumo + últimos turnos (a pergunta atual já vai em {input})
+        history = get_history_manager(session_state)
+        prompt_history = history.prompt_history(language)
+
+        version = index_version()
+        faq_store = get_faq_store()
+
+        with start_trace() as trace:
+            with span("rag_total"):
+                # Perguntas sugeridas (ou quase iguais, sem histórico): resposta pronta, sem chamar o LLM
+                with span("faq_lookup"):
+                    rag_result = faq_store.lookup(user_input, language, version, fuzzy=not prompt_history)
+                coalesced = False
+                if rag_result is not None:
+                    pass
+                elif prompt_history:
+                    rag_result = make_rag_response(user_input, prompt_history, retriever, llm, language, on_token)
+                else:
+                    # Sem histórico a resposta só depende da pergunta: sessões com a mesma pergunta
+                    # em andamento compartilham uma única execução do pipeline
+                    key = coalesce_key(language, user_input, True, version)
+                    while True:
+                        try:
+                            rag_result, coalesced = SINGLE_FLIGHT.do(
+                                key, lambda: make_rag_response(user_input, prompt_history, retriever, llm, language, on_token)
+                            )
+                            break
+                        except RequestCancelled:
+                            # Cancelada foi a sessão que executava o pipeline compartilhado: tenta de novo
+                            check_cancelled()
+                    rag_result = dict(rag_result)
+        rag_result["timings_ms"] = {stage: round(seconds * 1000, 2) for stage, seconds in trace.timings.items()}
+        rag_result["tokens"] = trace.tokens
+        rag_result["coalesced"] = coalesced
+
+        res_text = rag_result.get("answer", "").strip()
+        # Pergunta e resposta entram juntas no histórico exibido: uma pergunta cancelada não fica órfã
+        session_state.chat_history.append(HumanMessage(content=user_input))
+        session_state.chat_history.append(AIMessage(content=res_text))
+        # Histórico exibido limitado a 20 mensagens para economizar memória
+        if len(session_state.chat_history) > 20:
+            session_state.chat_history = session_state.chat_history[-20:]
+        history.add(HumanMessage(content=user_input))
+        history.add(AIMessage(content=res_text))
+        # Turnos antigos viram resumo em background, depois que a resposta já foi devolvida
+        history.schedule_summary(llm, language)
+        
+        logger.info("Resposta gerada com sucesso")
+
+        return res_text, rag_result
+
+    except RequestCancelled:
+        # Substituída por uma pergunta mais nova da mesma sessão: nada entra no histórico (exibido ou do prompt)
+        logger.info("Requisição cancelada por uma pergunta mais nova da sessão")
+        return None, {"cancelled": True}
+    
+    except Exception as e:
+        logger.error(f"Erro no fluxo de chat: {str(e)}")
+        if language == "pt":
+            error_msg = "Desculpe, ocorreu um erro ao processar sua pergunta. Tente novamente."
+        else:
+            error_msg = "Sorry, an error occurred while processing your question. Please try again."
+        return error_msg, {"error": str(e)}
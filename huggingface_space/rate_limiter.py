@@ -0,0 +1,255 @@
+"""
+Limitador compartilhado das chamadas à Groq (um por processo)
+- token buckets de requisições/min e tokens/min
+- fila por prioridade: respostas ao usuário antes de tarefas de background (resumo do histórico)
+- concorrência adaptativa (AIMD): cai pela metade a cada 429 e volta a subir com sucessos
+- backoff exponencial com jitter, respeitando o retry-after devolvido pela API
+- on_acquire avisa quando a vaga é concedida: quem mede a latência do modelo (hedging.py)
+  começa a contar dali, sem a espera na fila nem o backoff dos 429
+
+Uso:
+    answer = limited_call(lambda: chain.invoke(inputs), estimate_tokens(prompt, context), PRIORITY_INTERACTIVE)
+"""
+import os
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from cancellation import check_cancelled, current_token
+from tracing import REGISTRY, capture_usage
+
+logger = logging.getLogger(__name__)
+
+GROQ_RPM_LIMIT = float(os.getenv("GROQ_RPM_LIMIT", 30))
+GROQ_TPM_LIMIT = float(os.getenv("GROQ_TPM_LIMIT", 12000))
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", 8))
+GROQ_MAX_ATTEMPTS = int(os.getenv("GROQ_MAX_ATTEMPTS", 4))
+# Tokens de saída esperados por chamada, somados à estimativa do prompt ao reservar o TPM
+GROQ_EXPECTED_COMPLETION_TOKENS = int(os.getenv("GROQ_EXPECTED_COMPLETION_TOKENS", 300))
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 20.0
+# Intervalo de checagem de cancelamento enquanto a requisição espera na fila
+CANCEL_POLL_S = 0.25
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 5
+PRIORITY_BACKGROUND = 10
+
+QUEUE_DEPTH = REGISTRY.gauge("rag_llm_queue_depth", "Chamadas ao LLM aguardando o limitador")
+QUEUE_WAIT = REGISTRY.histogram("rag_llm_queue_wait_seconds", "Espera no limitador antes da chamada ao LLM")
+INFLIGHT = REGISTRY.gauge("rag_llm_inflight", "Chamadas ao LLM em andamento")
+CONCURRENCY_LIMIT = REGISTRY.gauge("rag_llm_concurrency_limit", "Limite adaptativo de chamadas simultâneas")
+RATE_LIMITED = REGISTRY.counter("rag_llm_rate_limited_total", "Respostas 429 recebidas do LLM")
+
+
+def estimate_tokens(*texts) -> int:
+    """Estimativa barata (~4 caracteres por token) do prompt + saída esperada"""
+    return sum(len(str(t)) for t in texts) // 4 + GROQ_EXPECTED_COMPLETION_TOKENS
+
+
+class TokenBucket:
+    """Balde com capacidade de um minuto de cota, reabastecido continuamente"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Devolve (positivo) ou cobra (negativo) a diferença entre o reservado e o usado"""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    def __init__(self, tokens: int, priority: int, waited: float):
+        self.tokens = tokens
+        self.priority = priority
+        self.waited = waited
+
+
+class RateLimiter:
+    def __init__(self, rpm: float = GROQ_RPM_LIMIT, tpm: float = GROQ_TPM_LIMIT,
+                 max_concurrency: int = GROQ_MAX_CONCURRENCY):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency_limit = float(self.max_concurrency)
+        self.inflight = 0
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        CONCURRENCY_LIMIT.set(self.concurrency_limit)
+
+    def _wait_needed(self, tokens: int) -> Optional[float]:
+        """Segundos até a cabeça da fila poder seguir (None = esperar uma liberação)"""
+        if self.inflight >= int(self.concurrency_limit):
+            return None
+        return max(
+            self._blocked_until - time.monotonic(),
+            self.requests.time_until(1),
+            self.tokens.time_until(tokens),
+        )
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_INTERACTIVE) -> Ticket:
+        """
+        Bloqueia até haver cota e vaga de concorrência; a fila respeita prioridade e ordem de chegada.
+        Uma requisição cancelada enquanto espera sai da fila com RequestCancelled.
+        """
+        token = current_token()
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            QUEUE_DEPTH.set(len(self._waiters))
+            try:
+                while True:
+                    check_cancelled()
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = self._wait_needed(tokens)
+                        if wait is not None and wait <= 0:
+                            break
+                    if token is not None:
+                        wait = CANCEL_POLL_S if wait is None else min(wait, CANCEL_POLL_S)
+                    self._cond.wait(timeout=wait)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self.inflight += 1
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                QUEUE_DEPTH.set(len(self._waiters))
+                INFLIGHT.set(self.inflight)
+                self._cond.notify_all()
+        waited = time.monotonic() - start
+        QUEUE_WAIT.observe(waited, priority=priority)
+        return Ticket(tokens, priority, waited)
+
+    def release(self, ticket: Ticket, used_tokens: Optional[int] = None,
+                rate_limited: bool = False, retry_after: Optional[float] = None):
+        with self._cond:
+            self.inflight -= 1
+            if used_tokens:
+                self.tokens.adjust(ticket.tokens - used_tokens)
+            if rate_limited:
+                # Diminuição multiplicativa + pausa global: as sessões não voltam todas juntas
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            else:
+                # Aumento aditivo: ~+1 de limite a cada "janela" de chamadas bem-sucedidas
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit)
+            CONCURRENCY_LIMIT.set(self.concurrency_limit)
+            INFLIGHT.set(self.inflight)
+            self._cond.notify_all()
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Backoff exponencial com jitter completo; com retry-after, espera ao menos o indicado"""
+    jitter = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt))
+    return retry_after + random.uniform(0, BACKOFF_BASE_S) if retry_after else jitter
+
+
+_acquire_listener = contextvars.ContextVar("rate_limiter_acquire_listener", default=None)
+
+
+@contextmanager
+def on_acquire(callback: Callable[[], None]):
+    """Chama callback() sempre que uma chamada de limited_call dentro do bloco ganha a vaga"""
+    token = _acquire_listener.set(callback)
+    try:
+        yield
+    finally:
+        _acquire_listener.reset(token)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Limitador compartilhado do processo"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+            logger.info(
+                f"Limitador da Groq: {GROQ_RPM_LIMIT:g} req/min, {GROQ_TPM_LIMIT:g} tokens/min, "
+                f"até {GROQ_MAX_CONCURRENCY} chamadas simultâneas"
+            )
+        return _limiter
+
+
+def limited_call(fn: Callable, tokens: int, priority: int = PRIORITY_INTERACTIVE,
+                 max_attempts: int = GROQ_MAX_ATTEMPTS, limiter: Optional[RateLimiter] = None):
+    """Executa fn (uma chamada ao LLM) sob o limitador, repetindo respostas 429 com backoff"""
+    limiter = limiter or get_rate_limiter()
+    for attempt in range(max_attempts):
+        ticket = limiter.acquire(tokens, priority)
+        # O finally devolve a vaga também em BaseException (KeyboardInterrupt, GeneratorExit...)
+        released = False
+        try:
+            listener = _acquire_listener.get()
+            if listener is not None:
+                listener()
+            with capture_usage() as usage:
+                result = fn()
+            released = True
+            limiter.release(ticket, used_tokens=usage["prompt"] + usage["completion"])
+            return result
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            retry_after = retry_after_seconds(e)
+            released = True
+            limiter.release(ticket, rate_limited=True, retry_after=retry_after)
+            RATE_LIMITED.inc(priority=priority)
+            if attempt + 1 >= max_attempts:
+                raise
+        finally:
+            if not released:
+                limiter.release(ticket)
+        delay = backoff_seconds(attempt, retry_after)
+        logger.warning(f"Limite da Groq atingido (tentativa {attempt + 1}/{max_attempts}); nova tentativa em {delay:.1f}s")
+        token = current_token()
+        if token is not None:
+            token.wait(delay)
+        else:
+            time.sleep(delay)
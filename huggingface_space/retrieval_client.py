@@ -0,0 +1,71 @@
+"""
+Cliente do serviço local de recuperação (retrieval_service.py)
+Expõe um retriever LangChain que os apps Streamlit usam no lugar do FAISS em processo
+"""
+import json
+import logging
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_index_version(service_url: str, index_name: str, timeout: float = 5.0) -> str:
+    """Hash do conteúdo do índice nomeado, como carregado no serviço (GET /indexes)"""
+    with urllib.request.urlopen(service_url.rstrip("/") + "/indexes", timeout=timeout) as response:
+        indexes = json.loads(response.read().decode("utf-8"))
+    if index_name not in indexes:
+        raise KeyError(f"Índice '{index_name}' não carregado no serviço de recuperação")
+    return indexes[index_name]["version"]
+
+
+class RemoteRetriever(BaseRetriever):
+    """Retriever que consulta um índice nomeado no serviço de recuperação via HTTP"""
+
+    service_url: str
+    index_name: str
+    k: int = 3
+    fetch_k: int = 4
+    search_type: str = "mmr"
+    # Limite do contexto para expandir filhos em seções pai (índices parent-child)
+    max_chars: int = 4000
+    timeout: float = 30.0
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, filter: Optional[Dict] = None
+    ) -> List[Document]:
+        payload = {
+            "index": self.index_name,
+            "query": query,
+            "k": self.k,
+            "fetch_k": self.fetch_k,
+            "search_type": self.search_type,
+            "max_chars": self.max_chars,
+        }
+        if filter:
+            # Busca só nas partições do filtro (ex.: {"language": "en"}), ver index_partitions.py
+            payload["filter"] = filter
+        request = urllib.request.Request(
+            self.service_url.rstrip("/") + "/search",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")
+            logger.error(f"Serviço de recuperação retornou {e.code}: {detail}")
+            raise RuntimeError(f"Erro no serviço de recuperação ({e.code}): {detail}") from e
+
+        logger.info(f"Serviço de recuperação respondeu em {data.get('took_ms')} ms")
+        return [
+            Document(page_content=r["content"], metadata={**r.get("metadata", {}), "score": r["score"]})
+            for r in data.get("results", [])
+        ]
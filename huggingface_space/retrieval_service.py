@@ -0,0 +1,241 @@
+"""
+Serviço local de recuperação (embeddings + FAISS) compartilhado pelos apps Streamlit
+Um único processo carrega o modelo de embeddings e atende vários índices nomeados
+
+Uso:
+    python retrieval_service.py --index linkedin=./index_faiss_linkedin \
+        --index safebank=../docs/projetos/llms-negocios/index_faiss --port 8765
+
+Endpoints:
+    GET  /health   -> status, modelo e índices carregados
+    GET  /indexes  -> nomes dos índices, versão (hash dos arquivos), quantidade de vetores e chunks
+                      por partição (origem, idioma)
+    POST /search   -> {"index", "query", "k", "fetch_k", "search_type", "max_chars", "filter"?} => top-k chunks com score
+                      (em índices parent-child, as seções pai dos trechos encontrados, até max_chars;
+                      com filter, ex. {"source": "cv.pdf"}, só entre os chunks das partições do filtro)
+"""
+import os
+import json
+import time
+import logging
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.vectorstores import FAISS
+
+from chunking import check_embedding_model, expand_to_parents, files_digest, index_files, load_parents
+from embedding_batcher import BatchingEmbeddings, BATCH_MAX_SIZE
+from index_partitions import build_partitions, filtered_search, partition_summary, select_ids
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+)
+logger = logging.getLogger("retrieval_service")
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+SERVICE_HOST = os.getenv("RETRIEVAL_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("RETRIEVAL_SERVICE_PORT", 8765))
+# Formato: "nome=caminho,nome2=caminho2"
+INDEXES_ENV = os.getenv("RETRIEVAL_INDEXES", "")
+
+
+# -------------------------
+# Registro de índices
+# -------------------------
+class RetrievalService:
+    """Mantém um modelo de embeddings e os índices FAISS nomeados carregados em memória"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        logger.info(f"Carregando modelo de embeddings: {model_name}")
+        self.model_name = model_name
+        # Queries concorrentes de todos os apps são agrupadas em um único forward pass
+        self.embeddings = BatchingEmbeddings(HuggingFaceEmbeddings(
+            model_name=model_name,
+            cache_folder="./cache",
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'batch_size': BATCH_MAX_SIZE, 'show_progress_bar': False}
+        ))
+        self.indexes: Dict[str, FAISS] = {}
+        # Seções pai dos índices parent-child (parents.json), por nome do índice
+        self.parents: Dict[str, Dict] = {}
+        # Posições de cada partição (origem, idioma) para a busca filtrada, por nome do índice
+        self.partitions: Dict[str, Dict] = {}
+        # Hash dos arquivos de cada índice: os apps regeneram a FAQ quando ele muda
+        self.versions: Dict[str, str] = {}
+
+    def load_index(self, name: str, index_dir: str):
+        faiss_path = Path(index_dir)
+        if not (faiss_path / "index.faiss").exists():
+            raise FileNotFoundError(f"Índice FAISS não encontrado em: {faiss_path}")
+
+        vectorstore = FAISS.load_local(str(faiss_path), self.embeddings, allow_dangerous_deserialization=True)
+        model_dim = len(self.embeddings.embed_query("dimension check"))
+        if vectorstore.index.d != model_dim:
+            raise ValueError(
+                f"Índice '{name}' tem dimensão {vectorstore.index.d}, mas o modelo {self.model_name} "
+                f"gera vetores de dimensão {model_dim}. Reconstrua o índice com o mesmo modelo."
+            )
+
+        check_embedding_model(faiss_path, self.model_name)
+        self.indexes[name] = vectorstore
+        self.parents[name] = load_parents(faiss_path)
+        self.partitions[name] = build_partitions(vectorstore)
+        self.versions[name] = files_digest(index_files(faiss_path))
+        logger.info(f"Índice '{name}' carregado de {faiss_path} ({vectorstore.index.ntotal} vetores)")
+
+    def search(self, index: str, query: str, k: int = 3, fetch_k: int = 4, search_type: str = "mmr",
+               max_chars: int = 4000, filter: Optional[Dict] = None):
+        if index not in self.indexes:
+            raise KeyError(f"Índice desconhecido: {index}")
+
+        vectorstore = self.indexes[index]
+        query_vector = self.embeddings.embed_query(query)
+
+        if filter:
+            docs_and_scores = filtered_search(
+                vectorstore, query_vector, select_ids(self.partitions[index], filter),
+                k=k, fetch_k=fetch_k, search_type=search_type,
+            )
+        elif search_type == "mmr":
+            docs_and_scores = vectorstore.max_marginal_relevance_search_with_score_by_vector(
+                query_vector, k=k, fetch_k=max(fetch_k, k)
+            )
+        elif search_type == "similarity":
+            docs_and_scores = vectorstore.similarity_search_with_score_by_vector(query_vector, k=k)
+        else:
+            raise ValueError(f"search_type inválido: {search_type}")
+
+        hits = [
+            (doc.page_content, {**doc.metadata, "chunk_id": getattr(doc, "id", None), "score": float(score)})
+            for doc, score in docs_and_scores
+        ]
+        if self.parents.get(index):
+            hits = expand_to_parents(hits, self.parents[index], max_chars)
+        return [{"content": text, "metadata": metadata, "score": metadata["score"]} for text, metadata in hits]
+
+
+# -------------------------
+# HTTP
+# -------------------------
+def make_handler(service: RetrievalService):
+    class RetrievalHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {
+                    "status": "ok",
+                    "model": service.model_name,
+                    "indexes": sorted(service.indexes),
+                    "batching": service.embeddings.stats(),
+                })
+            elif self.path == "/indexes":
+                self._send_json(200, {
+                    name: {
+                        "version": service.versions[name],
+                        "vectors": vs.index.ntotal,
+                        "partitions": partition_summary(service.partitions[name]),
+                    }
+                    for name, vs in service.indexes.items()
+                })
+            else:
+                self._send_json(404, {"error": f"Rota não encontrada: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/search":
+                self._send_json(404, {"error": f"Rota não encontrada: {self.path}"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                query = payload["query"]
+                index = payload["index"]
+            except (ValueError, KeyError) as e:
+                self._send_json(400, {"error": f"Requisição inválida: {e}"})
+                return
+
+            start = time.perf_counter()
+            try:
+                results = service.search(
+                    index=index,
+                    query=query,
+                    k=int(payload.get("k", 3)),
+                    fetch_k=int(payload.get("fetch_k", 4)),
+                    search_type=payload.get("search_type", "mmr"),
+                    max_chars=int(payload.get("max_chars", 4000)),
+                    filter=payload.get("filter"),
+                )
+            except KeyError as e:
+                self._send_json(404, {"error": str(e)})
+                return
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            except Exception as e:
+                logger.error(f"Erro na busca em '{index}': {e}")
+                self._send_json(500, {"error": str(e)})
+                return
+
+            took_ms = (time.perf_counter() - start) * 1000
+            self._send_json(200, {"index": index, "results": results, "took_ms": round(took_ms, 2)})
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return RetrievalHandler
+
+
+def parse_index_specs(specs: List[str]) -> Dict[str, str]:
+    """Converte entradas 'nome=caminho' em dicionário"""
+    indexes = {}
+    for spec in specs:
+        for item in spec.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            name, sep, path = item.partition("=")
+            if not sep or not name or not path:
+                raise ValueError(f"Índice inválido '{item}'. Use o formato nome=caminho")
+            indexes[name.strip()] = path.strip()
+    return indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço local de embeddings + FAISS")
+    parser.add_argument("--index", action="append", default=[], help="Índice no formato nome=caminho (repetível)")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Modelo de embeddings compartilhado")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    indexes = parse_index_specs(args.index or [INDEXES_ENV])
+    if not indexes:
+        parser.error("Nenhum índice configurado. Use --index nome=caminho ou RETRIEVAL_INDEXES")
+
+    service = RetrievalService(args.model)
+    for name, path in indexes.items():
+        service.load_index(name, path)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    logger.info(f"Serviço de recuperação ouvindo em http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Encerrando serviço de recuperação")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Configuração de threads do runtime (torch/OMP/MKL) para o modelo de embeddings
+Em containers, os.cpu_count() enxerga todos os núcleos do host e o torch acaba
+criando mais threads do que a cota de CPU permite; aqui a cota do cgroup define o limite
+"""
+import os
+import math
+import time
+import logging
+import statistics
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Forçar um número fixo de threads (0 = automático pela cota de CPU)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", 0))
+# Rodar encodes curtos com alguns valores de threads e escolher o mais rápido
+EMBED_CALIBRATE = os.getenv("EMBED_CALIBRATE", "0").lower() in ("1", "true", "yes")
+CALIBRATION_QUERY = "Qual sua experiência profissional com projetos de IA e LLMs?"
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+_runtime_config: Optional[Dict] = None
+# Valores definidos pelo operador, lidos antes de o apply_thread_env preencher os ausentes
+_OPERATOR_THREAD_ENV = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+
+
+# -------------------------
+# Detecção de CPU
+# -------------------------
+def cgroup_cpu_limit() -> Optional[float]:
+    """Cota de CPU do cgroup em núcleos (None se não houver limite)"""
+    # cgroup v2: "<quota> <period>" ou "max <period>"
+    cpu_max = Path("/sys/fs/cgroup/cpu.max")
+    try:
+        if cpu_max.exists():
+            quota, period = cpu_max.read_text().split()[:2]
+            if quota != "max":
+                return int(quota) / int(period)
+            return None
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    quota_file = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period_file = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    try:
+        if quota_file.exists() and period_file.exists():
+            quota = int(quota_file.read_text())
+            period = int(period_file.read_text())
+            if quota > 0 and period > 0:
+                return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    """Núcleos realmente utilizáveis: afinidade do processo limitada pela cota do cgroup"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.floor(limit)))
+    return max(1, cpus)
+
+
+def default_threads() -> int:
+    return EMBED_THREADS or available_cpus()
+
+
+# -------------------------
+# Aplicação
+# -------------------------
+def operator_threads() -> Optional[int]:
+    """OMP_NUM_THREADS definido pelo operador (None se ausente ou inválido)"""
+    try:
+        value = int(_OPERATOR_THREAD_ENV["OMP_NUM_THREADS"] or 0)
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+def apply_thread_env(threads: Optional[int] = None, override: bool = False):
+    """
+    Define OMP/MKL/OpenBLAS antes do primeiro import do torch.
+    Valores já definidos no ambiente (pelo operador) são respeitados, exceto com override
+    (configure_cpu_runtime: o ambiente passa a refletir as threads em uso pelo torch, que o
+    set_num_threads também aplica ao OMP/MKL do processo).
+    """
+    threads = threads or default_threads()
+    for var in THREAD_ENV_VARS:
+        if override:
+            os.environ[var] = str(threads)
+        else:
+            os.environ.setdefault(var, str(threads))
+    # Tokenizers paralelos competem com o torch pelas mesmas CPUs
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def set_torch_threads(threads: int):
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        # Só pode ser alterado antes do primeiro trabalho paralelo do processo
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def measure_query_latency(embeddings, repeats: int = 5) -> float:
+    """Mediana da latência de embed_query em milissegundos"""
+    embeddings.embed_query(CALIBRATION_QUERY)  # aquecimento
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embeddings.embed_query(CALIBRATION_QUERY)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def calibrate_threads(embeddings, candidates: List[int], repeats: int = 5) -> Dict[int, float]:
+    """Latência mediana de embed_query para cada número de threads candidato"""
+    results = {}
+    for threads in candidates:
+        set_torch_threads(threads)
+        results[threads] = measure_query_latency(embeddings, repeats)
+        logger.info(f"Calibração de threads: {threads} -> {results[threads]:.1f} ms/query")
+    return results
+
+
+def configure_cpu_runtime(embeddings=None, calibrate: bool = EMBED_CALIBRATE) -> Dict:
+    """
+    Aplica o número de threads do torch pela cota de CPU, opcionalmente calibra com encodes
+    curtos e registra a configuração escolhida com a latência medida de embed_query.
+    """
+    global _runtime_config
+    if _runtime_config is not None and embeddings is None:
+        return _runtime_config
+
+    import torch
+
+    cpus = available_cpus()
+    calibration = {}
+    if EMBED_THREADS:
+        threads, source = EMBED_THREADS, "EMBED_THREADS"
+    elif operator_threads():
+        # O BLAS já foi configurado pelo OMP_NUM_THREADS do operador: o torch segue o mesmo valor
+        threads, source = operator_threads(), "OMP_NUM_THREADS"
+    else:
+        threads, source = cpus, "cota de CPU"
+
+    if calibrate and embeddings is not None and not EMBED_THREADS:
+        candidates = sorted({1, 2, max(1, cpus // 2), cpus} & set(range(1, cpus + 1)))
+        calibration = calibrate_threads(embeddings, candidates)
+        threads, source = min(calibration, key=calibration.get), "calibração"
+
+    set_torch_threads(threads)
+    apply_thread_env(threads, override=True)
+
+    config = {
+        "cgroup_cpu_limit": cgroup_cpu_limit(),
+        "available_cpus": cpus,
+        "torch_threads": torch.get_num_threads(),
+        "torch_interop_threads": torch.get_num_interop_threads(),
+        "omp_num_threads": os.environ.get("OMP_NUM_THREADS"),
+        "mkl_num_threads": os.environ.get("MKL_NUM_THREADS"),
+        "threads_source": source,
+        "calibration_ms": calibration,
+    }
+    if embeddings is not None:
+        config["query_latency_ms"] = calibration.get(threads) or measure_query_latency(embeddings)
+
+    logger.info(
+        "Runtime de CPU: "
+        f"cota={config['cgroup_cpu_limit']} cpus={cpus} torch_threads={config['torch_threads']} ({source}) "
+        f"interop={config['torch_interop_threads']} OMP={config['omp_num_threads']} "
+        f"MKL={config['mkl_num_threads']}"
+        + (f" latência_query={config['query_latency_ms']:.1f} ms" if "query_latency_ms" in config else "")
+    )
+    _runtime_config = config
+    return config
@@ -0,0 +1,73 @@
+"""
+Coalescência de perguntas idênticas em andamento (single-flight)
+A primeira sessão com uma chave executa o pipeline; as que chegam enquanto ela roda
+esperam o mesmo resultado em vez de disparar outra execução completa
+"""
+import re
+import logging
+import threading
+import unicodedata
+from concurrent.futures import Future, TimeoutError
+from typing import Callable, Dict, Hashable, Tuple
+
+from cancellation import check_cancelled
+from tracing import record_cache
+
+logger = logging.getLogger(__name__)
+
+WAIT_POLL_S = 0.25
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sem acentos, espaços colapsados e sem pontuação final"""
+    text = unicodedata.normalize("NFKD", question.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!.… ")
+
+
+def coalesce_key(language: str, question: str, empty_history: bool, index_version: str) -> Tuple:
+    return (language, normalize_question(question), empty_history, index_version)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable):
+        """Executa fn uma vez por chave em andamento; retorna (resultado, compartilhado)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        record_cache("single_flight", hit=not leader)
+
+        if not leader:
+            logger.debug(f"Pergunta idêntica em andamento; aguardando resultado compartilhado: {key[:2]}")
+            # Espera em intervalos curtos para que a sessão que aguarda também possa ser cancelada
+            while True:
+                check_cancelled()
+                try:
+                    return future.result(timeout=WAIT_POLL_S), True
+                except TimeoutError:
+                    continue
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+
+SINGLE_FLIGHT = SingleFlight()
@@ -0,0 +1,361 @@
+"""
+Tracing leve por etapa e métricas em memória no formato texto do Prometheus
+Cada etapa do pipeline roda dentro de um span(); latências viram histogramas,
+tokens/cache/in-flight viram contadores e gauges, expostos em /metrics por uma thread lateral
+
+Uso:
+    with span("reformulation"):
+        ...
+    start_metrics_server(9100)   # ou METRICS_PORT=9100
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in items)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+# -------------------------
+# Tipos de métricas
+# -------------------------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in self._values.items()]
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        """Valor calculado no momento da coleta (ex.: profundidade de uma fila)"""
+        with self._lock:
+            self._functions[_label_key(labels)] = fn
+
+    def value(self, **labels) -> float:
+        key = _label_key(labels)
+        with self._lock:
+            fn = self._functions.get(key)
+            if fn is None:
+                return self._values.get(key, 0.0)
+        return float(fn())
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception as e:
+                logger.debug(f"Gauge {self.name} falhou ao coletar: {e}")
+        return [(self.name, key, None, value) for key, value in values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [contagem por bucket..., +Inf], soma
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def snapshot(self, **labels) -> Dict:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            if series is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": sum(series[0]), "sum": series[1]}
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(key, list(series[0]), series[1]) for key, series in self._series.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                out.append((self.name + "_bucket", key, {"le": f"{bound:g}"}, cumulative))
+            cumulative += counts[-1]
+            out.append((self.name + "_bucket", key, {"le": "+Inf"}, cumulative))
+            out.append((self.name + "_sum", key, None, total))
+            out.append((self.name + "_count", key, None, cumulative))
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        """Exposição no formato texto do Prometheus (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, key, extra, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("rag_stage_seconds", "Latência por etapa do pipeline RAG")
+STAGE_ERRORS = REGISTRY.counter("rag_stage_errors_total", "Exceções por etapa do pipeline RAG")
+STAGE_INFLIGHT = REGISTRY.gauge("rag_stage_inflight", "Execuções em andamento por etapa")
+LLM_TOKENS = REGISTRY.counter("rag_llm_tokens_total", "Tokens enviados/recebidos do LLM por etapa")
+CACHE_REQUESTS = REGISTRY.counter("rag_cache_requests_total", "Consultas a caches por resultado (hit/miss)")
+
+
+# -------------------------
+# Spans
+# -------------------------
+class Trace:
+    """Tempos e tokens acumulados por etapa de uma requisição"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+
+    def add_time(self, stage: str, seconds: float):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def add_tokens(self, stage: str, prompt: int, completion: int):
+        entry = self.tokens.setdefault(stage, {"prompt": 0, "completion": 0})
+        entry["prompt"] += prompt
+        entry["completion"] += completion
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+_current_stage: contextvars.ContextVar = contextvars.ContextVar("rag_stage", default="unknown")
+_usage_sink: contextvars.ContextVar = contextvars.ContextVar("rag_usage_sink", default=None)
+
+
+@contextmanager
+def start_trace():
+    """Abre um Trace para a requisição atual; spans internos registram nele"""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_stage() -> str:
+    return _current_stage.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Mede uma etapa: histograma de latência, erros e execuções em andamento"""
+    stage_token = _current_stage.set(stage)
+    STAGE_INFLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_INFLIGHT.dec(stage=stage)
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_time(stage, elapsed)
+        _current_stage.reset(stage_token)
+
+
+@contextmanager
+def capture_usage():
+    """Acumula em um dict os tokens das chamadas ao LLM feitas dentro do bloco"""
+    usage = {"prompt": 0, "completion": 0}
+    token = _usage_sink.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage_sink.reset(token)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_tokens(prompt: int, completion: int, stage: Optional[str] = None, model: str = ""):
+    stage = stage or current_stage()
+    LLM_TOKENS.inc(prompt, stage=stage, kind="prompt", model=model)
+    LLM_TOKENS.inc(completion, stage=stage, kind="completion", model=model)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_tokens(stage, prompt, completion)
+    usage = _usage_sink.get()
+    if usage is not None:
+        usage["prompt"] += prompt
+        usage["completion"] += completion
+
+
+def token_usage_callback():
+    """Callback LangChain que registra o uso de tokens de cada chamada ao LLM na etapa corrente"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageCallback(BaseCallbackHandler):
+        def on_llm_end(self, response, **kwargs):
+            output = response.llm_output or {}
+            usage = output.get("token_usage") or {}
+            if not usage:
+                # Streaming: o uso vem no usage_metadata da mensagem
+                for generations in response.generations:
+                    for generation in generations:
+                        metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                        usage = {
+                            "prompt_tokens": metadata.get("input_tokens", 0),
+                            "completion_tokens": metadata.get("output_tokens", 0),
+                        }
+            record_tokens(
+                int(usage.get("prompt_tokens", 0) or 0),
+                int(usage.get("completion_tokens", 0) or 0),
+                model=output.get("model_name", ""),
+            )
+
+    return TokenUsageCallback()
+
+
+# -------------------------
+# Endpoint /metrics
+# -------------------------
+_server = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Sobe /metrics em uma thread lateral (uma vez por processo; port 0 desativa)"""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning(f"Endpoint de métricas não iniciado na porta {port}: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+        return _server